@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from .ports import NotifierPort
+
+log = logging.getLogger("digest")
+
+# лимит Telegram — 4096 символов на сообщение, оставляем запас под заголовок
+MAX_MESSAGE_LEN = 4000
+
+def chunk_lines(lines: list[str], max_len: int = MAX_MESSAGE_LEN, header: str = "") -> list[str]:
+    """
+    Склеивает строки в сообщения не длиннее max_len, разрезая только по границам строк.
+    Слишком длинная одиночная строка обрезается.
+    """
+    limit = max_len - (len(header) + 1 if header else 0)
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in lines:
+        if len(line) > limit:
+            line = line[: limit - 1] + "…"
+        if current and size + 1 + len(line) > limit:
+            chunks.append("\n".join([header, *current] if header else current))
+            current, size = [], 0
+        size += len(line) + (1 if current else 0)
+        current.append(line)
+    if current:
+        chunks.append("\n".join([header, *current] if header else current))
+    return chunks
+
+class NotificationDigest:
+    """
+    Дайджест уведомлений: события копятся строками и уходят одним-несколькими сообщениями
+    не чаще раза в window_sec (окно общее для нескольких запусков джобы).
+
+    Отправка идёт фоновой задачей — вызывающий код на Telegram не ждёт.
+    """
+
+    def __init__(self, notifier: NotifierPort, title: str, window_sec: float = 0.0, max_len: int = MAX_MESSAGE_LEN):
+        self._notifier = notifier
+        self._title = title
+        self._window_sec = window_sec
+        self._max_len = max_len
+        self._lines: list[str] = []
+        self._last_sent: float | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._lines)
+
+    def add(self, line: str) -> None:
+        self._lines.append(line)
+
+    def flush_due(self, force: bool = False) -> bool:
+        """
+        Планирует отправку накопленного, если окно прошло (или force). Возвращает True, если отправка запланирована.
+        """
+        if not self._lines:
+            return False
+        now = time.monotonic()
+        if not force and self._last_sent is not None and now - self._last_sent < self._window_sec:
+            return False
+        lines, self._lines = self._lines, []
+        self._last_sent = now
+        task = asyncio.create_task(self._send(chunk_lines(lines, self._max_len, header=self._title)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def drain(self) -> None:
+        """
+        Дождаться уже запланированных отправок (остановка бота, тесты).
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        """
+        Остановка бота: отправить накопленное, не дожидаясь окна, и дождаться отправки.
+        Строки живут только в памяти — без этого события открытого окна терялись бы.
+        """
+        self.flush_due(force=True)
+        await self.drain()
+
+    async def _send(self, messages: list[str]) -> None:
+        for text in messages:
+            try:
+                await self._notifier.notify_admins(text)
+            except Exception as e:
+                log.warning("digest send failed: %s", e)
@@ -1,15 +1,30 @@
-from typing import Protocol, Any
+from typing import Protocol, Any, AsyncIterator
 from datetime import datetime
 
 
+class TransientWbError(Exception):
+    """Временная ошибка WB API (сеть, 429, 5xx) — запрос имеет смысл повторить."""
+
+
 class WbReturnsPort(Protocol):
+    def iter_claims(self, is_archive: bool = False) -> AsyncIterator[list[dict[str, Any]]]: ...
     async def get_open_claims(self) -> list[dict[str, Any]]: ...
     async def answer_claim(self, claim_id: str, action: str, comment: str | None) -> dict[str, Any]: ...
 
-class ClaimsRepoPort(Protocol):
-    async def was_processed(self, claim_id: str) -> bool: ...
+class ClaimsStatusPort(Protocol):
     async def mark_done(self, claim_id: str, action: str, processed_at: datetime) -> None: ...
     async def mark_failed(self, claim_id: str, error: str, processed_at: datetime) -> None: ...
 
+class ClaimsRepoPort(ClaimsStatusPort, Protocol):
+    async def was_processed(self, claim_id: str) -> bool: ...
+    async def processed_ids(self, claim_ids: list[str]) -> set[str]: ...
+
+class ClaimDueRepoPort(Protocol):
+    async def add_many(self, items: list[dict]) -> None: ...
+    async def due(self, now: datetime, limit: int = 500) -> list[dict]: ...
+    async def next_due_at(self) -> datetime | None: ...
+    async def remove(self, claim_ids: list[str]) -> None: ...
+    async def ids(self) -> set[str]: ...
+
 class NotifierPort(Protocol):
     async def notify_admins(self, text: str) -> None: ...
\ No newline at end of file
@@ -1,6 +1,10 @@
+import asyncio
+from collections.abc import Callable
+from contextlib import nullcontext
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from .ports import ClaimsRepoPort, WbReturnsPort, NotifierPort
+from .digest import NotificationDigest
+from .ports import ClaimDueRepoPort, ClaimsRepoPort, ClaimsStatusPort, WbReturnsPort, NotifierPort, TransientWbError
 from app.domain.rules import AutoRejectRule, parse_wb_dt
 import logging
 log = logging.getLogger("returns")
@@ -20,6 +24,12 @@ class ProcessClaimsUseCase:
         default_comment: str,
         enabled: bool,
         notifier: NotifierPort | None = None,   # <-- добавили
+        max_parallel: int = 1,
+        retry_attempts: int = 3,
+        retry_base_sec: float = 1.0,
+        digest: NotificationDigest | None = None,
+        due_repo: ClaimDueRepoPort | None = None,
+        on_next_due: Callable[[datetime], None] | None = None,
     ):
         self._wb = wb
         self._repo = repo
@@ -27,72 +37,157 @@ class ProcessClaimsUseCase:
         self._default_comment = default_comment
         self._enabled = enabled
         self._notifier = notifier
+        # id обработанных заявок, тёплый между запусками: на типичном тике в БД почти не ходим.
+        # После полного прохода обрезается до заявок, которые ещё видны в листинге.
+        self._processed_ids: set[str] = set()
+        # пул обработчиков: сколько заявок отвечаем одновременно (темп держит лимитер returns-api)
+        self._sem = asyncio.Semaphore(max(1, max_parallel))
+        self._retry_attempts = max(1, retry_attempts)
+        self._retry_base_sec = retry_base_sec
+        # digest-режим: вместо сообщения на каждую заявку — строка в дайджест, отправка в фоне
+        self._digest = digest
+        # очередь созревания: заявка отклоняется ровно к dt + delay_days, а не на ближайшем опросе
+        self._due_repo = due_repo
+        self._on_next_due = on_next_due
+        # заявки очереди, которых не было в прошлом снимке листинга: убираем, только если нет и во втором подряд
+        self._absent_once: set[str] = set()
+        # проход листинга и проход очереди не должны отвечать на одну заявку одновременно
+        self._run_lock = asyncio.Lock()
 
     async def _notify(self, text: str) -> None:
         if self._notifier is None:
             return
         await self._notifier.notify_admins(text)
 
+    def set_on_next_due(self, callback: Callable[[datetime], None] | None) -> None:
+        """
+        callback(when) вызывается после каждого прохода со временем созревания ближайшей заявки из очереди.
+        """
+        self._on_next_due = callback
+
     async def run(self) -> ProcessClaimsResult:
+        """
+        Полный проход по листингу открытых заявок. С очередью созревания (due_repo) несозревшие
+        заявки ставятся в неё, а отклоняет их run_due() точно ко времени — листинг можно опрашивать редко.
+        """
         log.info("ProcessClaims job started (enabled=%s, delay_days=%s)", self._enabled, self._rule.delay_days)
         now = datetime.now(timezone.utc)
-        data = await self._wb.get_open_claims()
+        counts = ProcessClaimsResult(0, 0, 0, 0)
 
-        checked = processed = skipped = errors = 0
+        seen: set[str] = set()
+        async with self._run_lock:
+            # сначала весь листинг, потом ответы: отвеченная заявка уходит из листинга,
+            # и offset следующей страницы перескочил бы через оставшиеся
+            pages: list[list[dict]] = []
+            listed = 0
+            async for page in self._wb.iter_claims(is_archive=False):
+                pages.append(page)
+                listed += len(page)
+                seen.update(c["id"] for c in page)
+            # одна заявка на двух страницах — листинг сдвинулся во время чтения, снимок мог быть неполным
+            complete = listed == len(seen)
 
-        for c in data:
-            checked += 1
-            claim_id = c["id"]
-            created_at = parse_wb_dt(c["dt"])
+            # статусы за прогон копятся в unit of work и пишутся пачкой (если репозиторий умеет)
+            async with self._unit_of_work() as store:
+                for page in pages:
+                    outcomes = await self._process_page(page, now, store, counts)
+                    if self._due_repo is not None and self._enabled:
+                        await self._due_repo.add_many([
+                            {**c, "due_at": self._rule.due_at(parse_wb_dt(c["dt"]))}
+                            for c, outcome in zip(page, outcomes)
+                            if outcome is None
+                        ])
 
-            if await self._repo.was_processed(claim_id):
-                skipped += 1
-                continue
+            # обрезаем только по полному снимку: заявка, которой нет в нём, закрыта, а не пропущена
+            if complete:
+                self._processed_ids &= seen
+                if self._due_repo is not None:
+                    await self._drop_closed_from_queue(seen)
+            else:
+                log.warning("claims listing shifted while paging (%s rows, %s unique): prune skipped", listed, len(seen))
+            if self._due_repo is not None:
+                await self._schedule_next_due()
 
-            if not self._enabled or not self._rule.is_due(created_at, now):
-                continue
+        await self._report(counts, now)
+        log.info("ProcessClaims job finished: checked=%s processed=%s skipped=%s errors=%s",
+                 counts.checked, counts.processed, counts.skipped_already_done, counts.errors)
+        return counts
 
-            actions: list[str] = c.get("actions", [])
-            action = self._pick_reject_action(actions)
-            if action is None:
-                msg = f"WB Returns: не удалось обработать заявку {claim_id}: нет reject-action в actions={actions}"
-                await self._repo.mark_failed(claim_id, "No reject action available", now)
-                await self._notify(msg)
-                errors += 1
-                continue
+    async def run_due(self) -> ProcessClaimsResult:
+        """
+        Отклоняет созревшие заявки из очереди, не трогая листинг WB.
+        """
+        now = datetime.now(timezone.utc)
+        counts = ProcessClaimsResult(0, 0, 0, 0)
+        if self._due_repo is None:
+            return counts
 
-            comment = self._default_comment if self._needs_comment(action) else None
+        async with self._run_lock:
+            async with self._unit_of_work() as store:
+                while batch := await self._due_repo.due(now):
+                    await self._process_page(batch, now, store, counts)
+                    # ошибочные тоже убираем: их подберёт следующий проход листинга
+                    await self._due_repo.remove([c["id"] for c in batch])
+            await self._schedule_next_due()
 
-            try:
-                await self._wb.answer_claim(claim_id, action, comment)
-                await self._repo.mark_done(claim_id, action, now)
-
-                await self._notify(
-                    "WB Returns: отклонена/обработана заявка\n"
-                    f"- id: {claim_id}\n"
-                    f"- created: {created_at.isoformat()}\n"
-                    f"- action: {action}\n"
-                    f"- comment: {comment or '-'}\n"
-                    f"- processed_at: {now.isoformat()}"
-                )
-                processed += 1
-
-            except Exception as e:
-                err = f"{type(e).__name__}: {e}"
-                await self._repo.mark_failed(claim_id, err, now)
-
-                await self._notify(
-                    "WB Returns: ошибка при обработке заявки\n"
-                    f"- id: {claim_id}\n"
-                    f"- created: {created_at.isoformat()}\n"
-                    f"- action: {action}\n"
-                    f"- error: {err}\n"
-                    f"- at: {now.isoformat()}"
-                )
-                errors += 1
+        if counts.checked:
+            await self._report(counts, now)
+            log.info("ProcessClaims due run: checked=%s processed=%s errors=%s",
+                     counts.checked, counts.processed, counts.errors)
+        return counts
+
+    async def _drop_closed_from_queue(self, seen: set[str]) -> None:
+        # одного снимка мало: заявка, закрытая во время чтения, сдвигает листинг и прячет соседнюю.
+        # Закрытой считаем заявку, которой нет в двух полных снимках подряд
+        absent = await self._due_repo.ids() - seen
+        closed = absent & self._absent_once
+        self._absent_once = absent - closed
+        if closed:
+            await self._due_repo.remove(list(closed))
 
+    def _unit_of_work(self):
+        if hasattr(self._repo, "unit_of_work"):
+            return self._repo.unit_of_work()
+        return nullcontext(self._repo)
+
+    async def _process_page(
+        self, page: list[dict], now: datetime, store: ClaimsStatusPort, counts: ProcessClaimsResult,
+    ) -> list[str | None]:
+        unknown = [c["id"] for c in page if c["id"] not in self._processed_ids]
+        if unknown:
+            self._processed_ids |= await self._repo.processed_ids(unknown)
+
+        outcomes = await asyncio.gather(*(self._handle_in_pool(c, now, store) for c in page))
+        for outcome in outcomes:
+            counts.checked += 1
+            if outcome == "processed":
+                counts.processed += 1
+            elif outcome == "skipped":
+                counts.skipped_already_done += 1
+            elif outcome == "error":
+                counts.errors += 1
+        return list(outcomes)
+
+    async def _schedule_next_due(self) -> None:
+        if self._on_next_due is None:
+            return
+        when = await self._due_repo.next_due_at()
+        if when is not None:
+            self._on_next_due(when)
+
+    async def _report(self, counts: ProcessClaimsResult, now: datetime) -> None:
+        checked, processed, skipped, errors = (
+            counts.checked, counts.processed, counts.skipped_already_done, counts.errors,
+        )
+        if self._digest is not None:
+            if processed or errors:
+                self._digest.add(
+                    f"итог {now:%d.%m %H:%M}: checked={checked} processed={processed} "
+                    f"skipped={skipped} errors={errors}"
+                )
+            self._digest.flush_due()
         # Итоговый батч-отчёт (по желанию)
-        if processed or errors:
+        elif processed or errors:
             await self._notify(
                 "WB Returns: итог выполнения джобы\n"
                 f"- checked: {checked}\n"
@@ -101,10 +196,85 @@ class ProcessClaimsUseCase:
                 f"- errors: {errors}\n"
                 f"- at: {now.isoformat()}"
             )
-        result = ProcessClaimsResult(checked, processed, skipped, errors)
-        log.info("ProcessClaims job finished: checked=%s processed=%s skipped=%s errors=%s",
-                 result.checked, result.processed, result.skipped_already_done, result.errors)
-        return result
+
+    async def _handle_in_pool(self, c: dict, now: datetime, store: ClaimsStatusPort) -> str | None:
+        async with self._sem:
+            return await self._handle_claim(c, now, store)
+
+    async def _answer_with_retry(self, claim_id: str, action: str, comment: str | None) -> None:
+        for attempt in range(1, self._retry_attempts + 1):
+            try:
+                await self._wb.answer_claim(claim_id, action, comment)
+                return
+            except TransientWbError as e:
+                if attempt >= self._retry_attempts:
+                    raise
+                wait = self._retry_base_sec * (2 ** (attempt - 1))
+                log.warning("answer_claim %s: %s → retry %s in %ss", claim_id, e, attempt, wait)
+                await asyncio.sleep(wait)
+
+    async def _handle_claim(self, c: dict, now: datetime, store: ClaimsStatusPort) -> str | None:
+        """
+        Возвращает "processed" / "skipped" (уже обработана) / "error" или None (ещё не пора).
+        Статус пишется в store — unit of work репозитория или сам репозиторий.
+        """
+        claim_id = c["id"]
+        created_at = parse_wb_dt(c["dt"])
+
+        if claim_id in self._processed_ids:
+            return "skipped"
+
+        if not self._enabled or not self._rule.is_due(created_at, now):
+            return None
+
+        actions: list[str] = c.get("actions", [])
+        action = self._pick_reject_action(actions)
+        if action is None:
+            msg = f"WB Returns: не удалось обработать заявку {claim_id}: нет reject-action в actions={actions}"
+            await store.mark_failed(claim_id, "No reject action available", now)
+            if self._digest is not None:
+                self._digest.add(f"✗ {claim_id}: нет reject-action в actions={actions}")
+            else:
+                await self._notify(msg)
+            return "error"
+
+        comment = self._default_comment if self._needs_comment(action) else None
+
+        try:
+            await self._answer_with_retry(claim_id, action, comment)
+            await store.mark_done(claim_id, action, now)
+            self._processed_ids.add(claim_id)
+
+            if self._digest is not None:
+                self._digest.add(f"✓ {claim_id} ({created_at:%d.%m %H:%M}) → {action}")
+                return "processed"
+            await self._notify(
+                "WB Returns: отклонена/обработана заявка\n"
+                f"- id: {claim_id}\n"
+                f"- created: {created_at.isoformat()}\n"
+                f"- action: {action}\n"
+                f"- comment: {comment or '-'}\n"
+                f"- processed_at: {now.isoformat()}"
+            )
+            return "processed"
+
+        except Exception as e:
+            err = f"{type(e).__name__}: {e}"
+            await store.mark_failed(claim_id, err, now)
+
+            if self._digest is not None:
+                self._digest.add(f"✗ {claim_id} → {action}: {err}")
+                return "error"
+            await self._notify(
+                "WB Returns: ошибка при обработке заявки\n"
+                f"- id: {claim_id}\n"
+                f"- created: {created_at.isoformat()}\n"
+                f"- action: {action}\n"
+                f"- error: {err}\n"
+                f"- at: {now.isoformat()}"
+            )
+            return "error"
+
     def _pick_reject_action(self, actions: list[str]) -> str | None:
         # Стратегия: предпочитаем кастомный reject, иначе любой action содержащий "reject"
         # Можно расширять под ваши правила.
@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+import asyncio
+import logging
+from app.domain.product_card import extract_title_and_color
+
+CATALOG_CURSOR_KEY = "catalog"
+
+@dataclass
+class CatalogSyncResult:
+    pages: int
+    cards: int
+    saved: int
+
+class SyncProductCatalogUseCase:
+    """
+    Выгружает каталог аккаунта из Content API постранично (cursor updatedAt/nmID)
+    и складывает title/color в product_cache. После синка дневная поставка
+    берёт имена из локального индекса без запросов по каждому nmId.
+
+    Если передан sync_state_repo, курсор последней страницы сохраняется,
+    и следующий запуск забирает только карточки, изменённые после него.
+
+    Если передан vendor_code_index, vendorCode карточек засевают индекс суффиксов для клонов;
+    пока индекс пуст, синк идёт полный — иначе дельта не увидела бы старые карточки.
+    """
+
+    def __init__(
+        self,
+        content_client,
+        product_cache_repo,
+        instance_name: str = "default",
+        page_limit: int = 100,
+        sync_state_repo=None,
+        vendor_code_index=None,
+    ):
+        self._content = content_client
+        self._repo = product_cache_repo
+        self._instance_name = instance_name
+        self._page_limit = page_limit
+        self._state = sync_state_repo  # может быть None — тогда всегда полный синк
+        self._vendor_index = vendor_code_index  # может быть None
+        self._lock = asyncio.Lock()  # ручной /catalog_sync, джоба и поставка не должны качать каталог параллельно
+        self._log = logging.getLogger(f"catalog_sync.{self._instance_name}")
+
+    async def run(self, full: bool = False) -> CatalogSyncResult:
+        async with self._lock:
+            cursor = None
+            if self._vendor_index is not None and await self._vendor_index.is_empty():
+                full = True
+            if self._state is not None and not full:
+                cursor = await self._state.get(CATALOG_CURSOR_KEY)
+
+            pages = cards_total = saved = 0
+            async for cards, next_cursor in self._content.iter_cards(cursor, limit=self._page_limit):
+                pages += 1
+                cards_total += len(cards)
+                rows: list[tuple[int, str | None, str | None]] = []
+                for c in cards:
+                    try:
+                        nm_id = int(c.get("nmID") or 0)
+                    except Exception:
+                        continue
+                    title, color = extract_title_and_color(c)
+                    if nm_id and title:
+                        rows.append((nm_id, title, color))
+                await self._repo.set_many(rows)
+                saved += len(rows)
+                if self._vendor_index is not None:
+                    await self._vendor_index.observe_many([c.get("vendorCode") for c in cards])
+
+                # курсор двигаем только после записи страницы — при падении продолжим с неё же
+                if self._state is not None and cards:
+                    await self._state.set(CATALOG_CURSOR_KEY, next_cursor)
+
+            self._log.info(
+                "Catalog sync finished (%s): pages=%s cards=%s saved=%s",
+                "full" if cursor is None else "delta", pages, cards_total, saved,
+            )
+            return CatalogSyncResult(pages, cards_total, saved)
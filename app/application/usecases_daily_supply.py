@@ -6,6 +6,7 @@ from zoneinfo import ZoneInfo
 from collections import defaultdict
 import asyncio
 from app.domain.title_normalizer import normalize_phone_title
+from app.domain.product_card import extract_title_and_color
 @dataclass
 class DailySupplyResult:
     supply_id: str | None
@@ -41,6 +42,13 @@ def _short_color_name(color: str) -> str:
     }
     return mapping.get(c, color)
 
+def _failed_orders_note(failed_orders: dict[int, str]) -> list[str]:
+    if not failed_orders:
+        return []
+    ids = ", ".join(str(i) for i in sorted(failed_orders)[:20])
+    more = f" и ещё {len(failed_orders) - 20}" if len(failed_orders) > 20 else ""
+    return ["", f"⚠️ Не добавлены в поставку: {len(failed_orders)} заказ(ов): {ids}{more}"]
+
 class CreateDailySupplyUseCase:
     def __init__(
         self,
@@ -51,10 +59,9 @@ class CreateDailySupplyUseCase:
         tz: str,
         enabled: bool,
         product_cache_repo=None,   # ← СТАЛ НЕОБЯЗАТЕЛЬНЫМ
-        batch_size: int = 10,
-        batch_pause_sec: int = 8,
-        cards_limit: int = 150,
-        instance_name: str = "default"
+        instance_name: str = "default",
+        local_catalog: bool = False,
+        outbox: bool = False,
     ):
         self._mp = marketplace_client
         self._content = content_client
@@ -62,13 +69,14 @@ class CreateDailySupplyUseCase:
         self._notifier = notifier
         self._tz = tz
         self._enabled = enabled
-        self._cache: dict[int, tuple[str, str]] = {}
-        self._product_cache_repo = product_cache_repo  # может быть None
-        self._content_sem = asyncio.Semaphore(3)
-        self._batch_size = batch_size
-        self._batch_pause_sec = batch_pause_sec
-        self._cards_limit = cards_limit
+        # может быть None; в проде — CachedProductCacheRepo (LRU/TTL в памяти, общий на аккаунт)
+        self._product_cache_repo = product_cache_repo
         self._instance_name = instance_name
+        # local_catalog: имена только из product_cache, который наполняет джоба синка каталога
+        # (и /catalog_sync); сама поставка в Content API не ходит
+        self._local_catalog = local_catalog
+        # outbox: уведомление пишется в БД вместе с отчётом, доставляет DispatchOutboxUseCase
+        self._outbox = outbox
         self._log = logging.getLogger(f"daily_supply.{self._instance_name}")
 
     async def run(self) -> DailySupplyResult:
@@ -105,14 +113,7 @@ class CreateDailySupplyUseCase:
 
             if not orders:
                 text = f"WB Supply {day_key}: новых заказов нет."
-                try:
-                    await self._repo.mark_ok(day_key, supply_id="", created_at=now, order_count=0, report_text=text)
-                except Exception:
-                    self._log and self._log.debug("mark_ok failed for empty orders")
-                try:
-                    await self._notifier.notify_admins(text)
-                except Exception:
-                    self._log and self._log.debug("notify_admins failed for empty orders")
+                await self._save_report(day_key, "", now, 0, text)
                 return DailySupplyResult("", 0, ["Новых заказов нет."])
 
             # 2) create supply
@@ -124,41 +125,67 @@ class CreateDailySupplyUseCase:
             if not supply_id:
                 raise RuntimeError(f"Не удалось получить supply_id из ответа: {created}")
 
-            await self._mp.add_orders_to_supply(supply_id, order_ids)
+            assigned = await self._mp.add_orders_to_supply(supply_id, order_ids)
+            failed_orders: dict[int, str] = dict(getattr(assigned, "failed", None) or {})
+            if failed_orders:
+                self._log.warning("%s orders were not attached to supply %s", len(failed_orders), supply_id)
+                # в отчёт и order_count попадает только то, что реально прикрепилось к поставке
+                orders = [o for o in orders if int(o["id"]) not in failed_orders]
+                order_ids = [i for i in order_ids if i not in failed_orders]
+                if not orders:
+                    raise RuntimeError(f"Ни один заказ не добавлен в поставку {supply_id}: {next(iter(failed_orders.values()))}")
 
             # 3) prepare fallback names per nmId from orders
             nm_ids_needed = []
             order_fallback_by_nm: dict[int, str] = {}
             for o in orders:
                 nm_id = int(o["nmId"])
+                if nm_id in order_fallback_by_nm:
+                    continue
                 fb = (o.get("offerName") or o.get("subjectName") or o.get("vendorCode") or "").strip()
-                order_fallback_by_nm.setdefault(nm_id, fb)
-                if nm_id not in self._cache:
-                    nm_ids_needed.append(nm_id)
+                order_fallback_by_nm[nm_id] = fb
+                nm_ids_needed.append(nm_id)
+
+            # 4) persistent cache: один запрос на все nmId, а не get() на каждый
+            cached = await self._load_cached(nm_ids_needed)
 
-            # 4) batch resolve via Content API with pauses; store into self._cache
+            # локальный каталог: чего в нём нет — берём из полей заказа, без Content API
+            use_content = not self._local_catalog
+
+            names: dict[int, tuple[str, str]] = dict(cached)
+
+            # 5) resolve the rest into names, новые имена — одним set_many в конце
             cards_errors = 0
+            cache_writes: list[tuple[int, str, str]] = []
 
             async def resolve_one(nm_id: int):
                 fallback_name = order_fallback_by_nm.get(nm_id, "")
                 try:
-                    title, color = await self._get_title_and_color(nm_id, fallback_name)
+                    title, color = await self._get_title_and_color(
+                        nm_id, fallback_name, use_content=use_content, writes=cache_writes
+                    )
                     if not title:
                         title = fallback_name or f"nmId {nm_id}"
-                    self._cache[nm_id] = (title, color or "")
+                    names[nm_id] = (title, color or "")
                 except Exception as ex:
                     self._log.debug("resolve nmId %s failed: %s", nm_id, ex)
                     fb = fallback_name or f"nmId {nm_id}"
-                    self._cache[nm_id] = (fb, "")
+                    names[nm_id] = (fb, "")
 
             tasks = []
             for nm_id in nm_ids_needed:
-                tasks.append(resolve_one(nm_id))
+                if nm_id not in cached:
+                    tasks.append(resolve_one(nm_id))
 
-            # выполняем параллельно, но semaphore внутри ограничит нагрузку
+            # выполняем параллельно, окно параллелизма держит WbContentClient
             await asyncio.gather(*tasks)
+            await self._save_cached(cache_writes)
+            if hasattr(self._product_cache_repo, "stats"):
+                self._log.info("product cache stats: %s", self._product_cache_repo.stats())
+            if tasks and hasattr(self._content, "concurrency_stats"):
+                self._log.info("content concurrency: %s", self._content.concurrency_stats())
 
-            # 5) aggregate by normalized short name
+            # 6) aggregate by normalized short name
             agg: dict[str, int] = defaultdict(int)
             total = 0
             for o in orders:
@@ -166,7 +193,7 @@ class CreateDailySupplyUseCase:
                 qty = int(o.get("quantity", 1))
                 total += qty
 
-                title, color = self._cache.get(
+                title, color = names.get(
                     nm_id,
                     (o.get("offerName") or o.get("subjectName") or f"nmId {nm_id}", "")
                 )
@@ -175,7 +202,7 @@ class CreateDailySupplyUseCase:
                 key = normalize_phone_title(full_title)
                 agg[key] += qty
 
-            # 6) if nothing matched (very unlikely), fallback to short names from orders
+            # 7) if nothing matched (very unlikely), fallback to short names from orders
             lines: list[str]
             if not agg:
                 fallback_map: dict[str, int] = {}
@@ -187,19 +214,12 @@ class CreateDailySupplyUseCase:
                 lines = [f"{sum(fallback_map.values())} шт"]
                 for k, v in sorted(fallback_map.items(), key=lambda x: (-x[1], x[0])):
                     lines.append(f"{k} — {v}")
+                lines.extend(_failed_orders_note(failed_orders))
                 text = f"WB Supply {day_key}\nСоздана поставка: {supply_id}\n\n" + "\n".join(lines)
-                try:
-                    await self._notifier.notify_admins(text)
-                except Exception:
-                    self._log and self._log.debug("notify_admins failed for fallback list")
-                try:
-                    await self._repo.mark_ok(day_key, supply_id=supply_id, created_at=now, order_count=len(order_ids),
-                                             report_text=text)
-                except Exception:
-                    self._log and self._log.debug("mark_ok failed for fallback list")
+                await self._save_report(day_key, supply_id, now, len(order_ids), text)
                 return DailySupplyResult(supply_id, total, lines)
 
-            # 7) build final readable lines
+            # 8) build final readable lines
             lines = [f"{total} шт"]
             for name, qty in sorted(agg.items(), key=lambda x: (-x[1], x[0])):
                 lines.append(f"{name} — {qty}")
@@ -208,20 +228,12 @@ class CreateDailySupplyUseCase:
                 lines.append("")
                 lines.append(
                     f"Примечание: были ошибки Content API при получении карточек: {cards_errors}. (часть имён взяты из полей заказов)")
+            lines.extend(_failed_orders_note(failed_orders))
 
             text = f"WB Supply {day_key}\nСоздана поставка: {supply_id}\n\n" + "\n".join(lines)
 
-            # 8) notify and persist (best-effort, do not raise)
-            try:
-                await self._notifier.notify_admins(text)
-            except Exception:
-                self._log and self._log.exception("notify_admins failed")
-
-            try:
-                await self._repo.mark_ok(day_key, supply_id=supply_id, created_at=now, order_count=len(order_ids),
-                                         report_text=text)
-            except Exception:
-                self._log and self._log.exception("mark_ok failed")
+            # 9) notify and persist (best-effort, do not raise)
+            await self._save_report(day_key, supply_id, now, len(order_ids), text)
 
             # debug print (visible in tests with -s)
             self._log and self._log.debug("Daily supply report:\n%s", text)
@@ -234,42 +246,98 @@ class CreateDailySupplyUseCase:
             self._log and self._log.exception("Unhandled exception in CreateDailySupplyUseCase.run: %s", e)
 
             # try to persist failure without raising
+            text = f"❌ WB Supply {day_key}: ошибка\n{err}"
+            queued = False
             try:
                 if hasattr(self._repo, "mark_failed"):
-                    await self._repo.mark_failed(day_key, created_at=now, error=err)
+                    if self._outbox:
+                        await self._repo.mark_failed(day_key, created_at=now, error=err, notify_text=text)
+                        queued = True
+                    else:
+                        await self._repo.mark_failed(day_key, created_at=now, error=err)
             except Exception:
                 self._log and self._log.debug("mark_failed failed")
 
-            try:
-                await self._notifier.notify_admins(f"❌ WB Supply {day_key}: ошибка\n{err}")
-            except Exception:
-                self._log and self._log.debug("notify_admins failed in exception handler")
+            if not queued:
+                await self._notify_safe(text)
 
             return DailySupplyResult(None, 0, [err])
 
-    async def _get_title_and_color(self, nm_id: int, fallback_name: str = "") -> tuple[str, str]:
+    async def _save_report(self, day_key: str, supply_id: str, now: datetime, order_count: int, text: str) -> None:
         """
-        Устойчивый резолв карточки:
-        1) persistent cache
-        2) Content API (с semaphore + retry 429)
-        3) fallback из заказа
-        4) nmId
+        Сохранить отчёт и уведомить админов (best-effort, не бросает).
+        С outbox уведомление ставится в очередь той же транзакцией; если запись не удалась — шлём напрямую.
         """
+        if self._outbox:
+            try:
+                await self._repo.mark_ok(day_key, supply_id=supply_id, created_at=now, order_count=order_count,
+                                         report_text=text, notify_text=text)
+                return
+            except Exception:
+                self._log and self._log.exception("mark_ok with outbox failed, notifying directly")
+                await self._notify_safe(text)
+                return
 
-        # ---------- 1. ПЕРСИСТЕНТНЫЙ КЭШ ----------
+        await self._notify_safe(text)
         try:
-            if self._product_cache_repo:
-                cached = await self._product_cache_repo.get(nm_id)
-                if cached and cached.title:
-                    return cached.title, (cached.color or "")
+            await self._repo.mark_ok(day_key, supply_id=supply_id, created_at=now, order_count=order_count,
+                                     report_text=text)
+        except Exception:
+            self._log and self._log.exception("mark_ok failed")
+
+    async def _notify_safe(self, text: str) -> None:
+        try:
+            await self._notifier.notify_admins(text)
+        except Exception:
+            self._log and self._log.exception("notify_admins failed")
+
+    async def _load_cached(self, nm_ids: list[int]) -> dict[int, tuple[str, str]]:
+        if not self._product_cache_repo or not nm_ids:
+            return {}
+        try:
+            if hasattr(self._product_cache_repo, "get_many"):
+                rows = await self._product_cache_repo.get_many(nm_ids)
+            else:
+                rows = {nm_id: await self._product_cache_repo.get(nm_id) for nm_id in nm_ids}
         except Exception as e:
-            self._log.debug("Cache read error nmId %s: %s", nm_id, e)
+            self._log.debug("Cache read error: %s", e)
+            return {}
+        return {nm_id: (row.title, row.color or "") for nm_id, row in rows.items() if row and row.title}
+
+    async def _save_cached(self, rows: list[tuple[int, str, str]]) -> None:
+        if not self._product_cache_repo or not rows:
+            return
+        try:
+            if hasattr(self._product_cache_repo, "set_many"):
+                await self._product_cache_repo.set_many(rows)
+            else:
+                for nm_id, title, color in rows:
+                    await self._product_cache_repo.set(nm_id, title, color)
+        except Exception as e:
+            self._log.debug("Cache write error: %s", e)
+
+    async def _get_title_and_color(
+        self,
+        nm_id: int,
+        fallback_name: str = "",
+        use_content: bool = True,
+        writes: list[tuple[int, str, str]] | None = None,
+    ) -> tuple[str, str]:
+        """
+        Устойчивый резолв карточки, которой нет в persistent cache (его run читает заранее):
+        1) Content API (retry 429) — если use_content
+        2) fallback из заказа
+        3) nmId
+        Что нужно закэшировать, складывается в writes — run пишет всё одним set_many.
+        """
+        if writes is None:
+            writes = []
 
-        # ---------- 2. CONTENT API С ОГРАНИЧЕНИЕМ И RETRY ----------
-        for attempt in range(5):  # до 5 попыток
+        # ---------- 1. CONTENT API С ОГРАНИЧЕНИЕМ И RETRY ----------
+        for attempt in range(5 if use_content else 0):  # до 5 попыток
             try:
-                async with self._content_sem:  # ограничиваем параллелизм
-                    data = await self._content.find_card_by_text(str(nm_id), locale="ru")
+                # параллелизм и темп ограничивает сам клиент (AIMD-окно + лимитер токена)
+                data = await self._content.find_card_by_text(str(nm_id), locale="ru")
 
                 cards = data.get("cards") or []
                 for c in cards:
@@ -279,24 +347,10 @@ class CreateDailySupplyUseCase:
                     except Exception:
                         continue
 
-                    title = c.get("title")
-                    color = ""
-                    for ch in c.get("characteristics") or []:
-                        if (ch.get("name") or "").strip().lower() == "цвет":
-                            val = ch.get("value")
-                            if isinstance(val, list) and val:
-                                color = str(val[0])
-                            elif isinstance(val, str):
-                                color = val
-                            break
+                    title, color = extract_title_and_color(c)
 
                     if title:
-                        try:
-                            if self._product_cache_repo:
-                                await self._product_cache_repo.set(nm_id, title, color)
-                        except Exception:
-                            self._log.debug("Cache write fail nmId %s", nm_id)
-
+                        writes.append((nm_id, title, color))
                         return title, color
 
                 # карточки пришли, но нужной нет — дальше retry не нужен
@@ -314,21 +368,17 @@ class CreateDailySupplyUseCase:
                 self._log.debug("Content API error nmId %s: %s", nm_id, e)
                 break
 
-        # ---------- 3. FALLBACK ИЗ ЗАКАЗА ----------
+        # при полном каталоге заглушку не пишем — иначе она перекроет карточку после следующего синка
+
+        # ---------- 2. FALLBACK ИЗ ЗАКАЗА ----------
         if fallback_name:
-            try:
-                if self._product_cache_repo:
-                    await self._product_cache_repo.set(nm_id, fallback_name, "")
-            except Exception:
-                pass
+            if use_content:
+                writes.append((nm_id, fallback_name, ""))
             return fallback_name, ""
 
-        # ---------- 4. ПОСЛЕДНИЙ FALLBACK ----------
+        # ---------- 3. ПОСЛЕДНИЙ FALLBACK ----------
         fallback = f"nmId {nm_id}"
-        try:
-            if self._product_cache_repo:
-                await self._product_cache_repo.set(nm_id, fallback, "")
-        except Exception:
-            pass
+        if use_content:
+            writes.append((nm_id, fallback, ""))
 
         return fallback, ""
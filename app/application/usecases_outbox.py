@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from datetime import datetime
+import asyncio
+import logging
+
+@dataclass
+class OutboxDispatchResult:
+    sent: int
+    failed: int
+
+class DispatchOutboxUseCase:
+    """
+    Доставляет уведомления из outbox пачками. Недоставленное остаётся в таблице
+    и повторяется с экспоненциальной задержкой — отчёт не теряется, если Telegram лежит.
+
+    notifier.deliver(text, skip) шлёт админам, кроме skip, и возвращает {chat_id: True/False/None}.
+    Повтор идёт только тем, у кого False: кому доставлено — второй раз не шлётся, None (бот заблокирован,
+    чата нет) — постоянная ошибка, такого админа больше не пробуем. Исключение — повтор всем оставшимся.
+    """
+
+    def __init__(
+        self,
+        outbox_repo,
+        notifier,
+        instance_name: str = "default",
+        batch_size: int = 50,
+        max_attempts: int = 20,
+        retry_base_sec: float = 30.0,
+        retry_max_sec: float = 3600.0,
+    ):
+        self._repo = outbox_repo
+        self._notifier = notifier
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._retry_base_sec = retry_base_sec
+        self._retry_max_sec = retry_max_sec
+        self._lock = asyncio.Lock()
+        self._log = logging.getLogger(f"outbox.{instance_name}")
+
+    async def run(self) -> OutboxDispatchResult:
+        sent = failed = 0
+        async with self._lock:
+            while True:
+                now = datetime.utcnow()
+                batch = await self._repo.pending(now, limit=self._batch_size, max_attempts=self._max_attempts)
+                if not batch:
+                    break
+                ok_ids: list[int] = []
+                for msg in batch:
+                    done = set(msg.done_chats)
+                    delay = min(self._retry_max_sec, self._retry_base_sec * (2 ** msg.attempts))
+                    try:
+                        report = await self._notifier.deliver(msg.text, skip=done) or {}
+                    except Exception as e:
+                        failed += 1
+                        self._log.warning("outbox #%s (%s) not delivered, retry in %ss: %s", msg.id, msg.kind, delay, e)
+                        await self._repo.mark_retry(msg.id, f"{type(e).__name__}: {e}", delay, now)
+                        continue
+                    blocked = sorted(chat for chat, ok in report.items() if ok is None)
+                    if blocked:
+                        self._log.warning("outbox #%s (%s): chats %s unreachable, not retrying them", msg.id, msg.kind, blocked)
+                    done |= {chat for chat, ok in report.items() if ok is not False}
+                    pending = sorted(chat for chat, ok in report.items() if ok is False)
+                    if not pending:
+                        ok_ids.append(msg.id)
+                        continue
+                    failed += 1
+                    self._log.warning("outbox #%s (%s) not delivered to %s, retry in %ss", msg.id, msg.kind, pending, delay)
+                    await self._repo.mark_retry(msg.id, f"not delivered to {pending}", delay, now, done_chats=done)
+                await self._repo.mark_sent(ok_ids, datetime.utcnow())
+                sent += len(ok_ids)
+                if len(batch) < self._batch_size:
+                    break
+        if sent or failed:
+            self._log.info("outbox dispatched: sent=%s failed=%s", sent, failed)
+        return OutboxDispatchResult(sent, failed)
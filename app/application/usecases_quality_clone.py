@@ -1,6 +1,11 @@
+import asyncio
+import logging
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
-from app.domain.vendorcode import next_vendor_code
+from app.domain.vendorcode import next_vendor_code, split_vendor_code
+from app.domain.product_card import extract_title_and_color
+
+FEEDBACKS_CURSOR_KEY = "feedbacks"
 
 @dataclass
 class CloneRunResult:
@@ -9,29 +14,145 @@ class CloneRunResult:
     cloned: int
     errors: int
 
+def _created_at(fb: dict) -> datetime | None:
+    raw = fb.get("createdDate")
+    if not raw:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
 class CloneOnOneStarFeedbackUseCase:
-    def __init__(self, feedbacks, cards_reader, cards_writer, clone_repo, notifier, enabled: bool):
+    """
+    Клонирует карточку по свежему 1⭐ отзыву.
+
+    Отзывы читаются постранично от старых к новым. После каждой страницы сохраняется водяная метка
+    (createdDate + id последнего отзыва) — в sync_state_repo, если передан, иначе в памяти, — и следующий
+    запуск запрашивает только отзывы с этой даты. Первый запуск историю не разбирает: метка ставится
+    на now - initial_lookback_hours.
+
+    Клоны страницы идут параллельно (до max_parallel). Следующий суффикс (n) берётся из индекса
+    vendor_code_index за O(1); корень, которого в индексе ещё нет, и режим без индекса — поиском
+    по Content API под lock корня vendorCode, чтобы два клона не получили одно (n).
+    """
+
+    def __init__(
+        self,
+        feedbacks,
+        cards_reader,
+        cards_writer,
+        clone_repo,
+        notifier,
+        enabled: bool,
+        product_cache=None,
+        sync_state_repo=None,
+        page_size: int = 500,
+        max_parallel: int = 1,
+        vendor_code_index=None,
+        initial_lookback_hours: int = 0,
+    ):
         self._feedbacks = feedbacks
         self._cards_reader = cards_reader
         self._cards_writer = cards_writer
         self._clone_repo = clone_repo
         self._notifier = notifier
         self._enabled = enabled
+        self._product_cache = product_cache  # общий с поставкой кэш названий аккаунта (может быть None)
+        self._state = sync_state_repo  # может быть None — тогда метка живёт только в памяти
+        self._mark: dict | None = None
+        self._initial_lookback_hours = max(0, initial_lookback_hours)
+        self._page_size = page_size
+        self._lock = asyncio.Lock()  # джоба и ручной запуск не должны двигать метку параллельно
+        self._sem = asyncio.Semaphore(max(1, max_parallel))
+        self._root_locks: dict[str, asyncio.Lock] = {}
+        # выданные этим процессом vendorCode по корню: поиск WB видит новую карточку не сразу
+        self._issued: dict[str, set[str]] = {}
+        # индекс суффиксов: следующий (n) без поиска по Content API (может быть None)
+        self._vendor_index = vendor_code_index
+        self._log = logging.getLogger("quality_clone")
 
     async def run(self) -> CloneRunResult:
+        result = CloneRunResult(0, 0, 0, 0)
         if not self._enabled:
-            return CloneRunResult(0, 0, 0, 0)
+            return result
+
+        async with self._lock:
+            now = datetime.now(timezone.utc)
+            mark = await self._load_mark()
+            if mark is None:
+                # первый запуск после включения: старые 1⭐ не клонируем пачкой — только окно назад от now
+                since = now - timedelta(hours=self._initial_lookback_hours)
+                mark = {"createdDate": since.isoformat(), "id": None}
+                await self._save_mark(mark)
+
+            async for page in self._iter_feedbacks(mark):
+                fresh = [fb for fb in page if self._is_new(fb, mark)]
+                await self._process_page(fresh, now, result)
+                # метку двигаем только после обработки страницы — при падении продолжим с неё же
+                new_mark = self._advance(mark, page)
+                if new_mark != mark:
+                    await self._save_mark(new_mark)
+                mark = new_mark
+
+            self._log.info(
+                "Quality clone finished: checked=%s triggered=%s cloned=%s errors=%s",
+                result.checked, result.triggered, result.cloned, result.errors,
+            )
+            return result
+
+    async def _load_mark(self) -> dict | None:
+        if self._state is not None:
+            return await self._state.get(FEEDBACKS_CURSOR_KEY)
+        return self._mark
+
+    async def _save_mark(self, mark: dict) -> None:
+        if self._state is not None:
+            await self._state.set(FEEDBACKS_CURSOR_KEY, mark)
+        else:
+            self._mark = mark
 
-        now = datetime.now(timezone.utc)
+    async def _iter_feedbacks(self, mark: dict | None):
+        if hasattr(self._feedbacks, "iter_feedbacks"):
+            date_from = None
+            if mark and mark.get("createdDate"):
+                date_from = int(datetime.fromisoformat(mark["createdDate"]).timestamp())
+            async for page in self._feedbacks.iter_feedbacks(
+                is_answered=False, date_from=date_from, take=self._page_size,
+            ):
+                yield page
+            return
+        # клиент без пагинации — одна страница, как раньше
+        data = await self._feedbacks.list_feedbacks(is_answered=False, take=self._page_size, skip=0)
+        yield data.get("feedbacks", []) or data.get("data", []) or []
 
-        checked = triggered = cloned = errors = 0
+    @staticmethod
+    def _is_new(fb: dict, mark: dict | None) -> bool:
+        if not mark:
+            return True
+        if str(fb.get("id")) == mark.get("id"):
+            return False  # последний отзыв прошлого запуска: dateFrom включительный
+        created = _created_at(fb)
+        return created is None or created >= datetime.fromisoformat(mark["createdDate"])
 
-        # 1) получаем отзывы (простая версия, без lookback-фильтра — можно добавить по дате, если поле есть)
-        data = await self._feedbacks.list_feedbacks(is_answered=False, take=500, skip=0)
-        feedbacks = data.get("feedbacks", []) or data.get("data", []) or []
+    @staticmethod
+    def _advance(mark: dict | None, page: list[dict]) -> dict | None:
+        latest = None
+        for fb in page:
+            created = _created_at(fb)
+            if created is not None and (latest is None or created >= latest[0]):
+                latest = (created, str(fb.get("id")))
+        if latest is None:
+            return mark
+        if mark and datetime.fromisoformat(mark["createdDate"]) > latest[0]:
+            return mark
+        return {"createdDate": latest[0].isoformat(), "id": latest[1]}
 
-        for fb in feedbacks:
-            checked += 1
+    async def _process_page(self, page: list[dict], now: datetime, result: CloneRunResult) -> None:
+        candidates: list[tuple[str, int]] = []
+        for fb in page:
+            result.checked += 1
             rating = fb.get("productValuation") or fb.get("valuation") or fb.get("rating")
             if int(rating or 0) != 1:
                 continue
@@ -40,56 +161,103 @@ class CloneOnOneStarFeedbackUseCase:
             nm_id = int(((fb.get("productDetails") or {}).get("nmId")) or fb.get("nmId") or 0)
             if not feedback_id or nm_id == 0:
                 continue
+            candidates.append((feedback_id, nm_id))
 
-            if await self._clone_repo.was_processed(feedback_id):
+        # уже обработанные — одним запросом на страницу, а не по строке на отзыв
+        processed = await self._processed_ids([fid for fid, _ in candidates])
+        todo: list[tuple[str, int]] = []
+        for feedback_id, nm_id in candidates:
+            if feedback_id in processed:
                 continue
+            processed.add(feedback_id)
+            todo.append((feedback_id, nm_id))
+        result.triggered += len(todo)
+        await asyncio.gather(*(self._clone_in_pool(fid, nm_id, now, result) for fid, nm_id in todo))
+
+    async def _next_vendor_code(self, vendor_code: str) -> str:
+        root, _ = split_vendor_code(vendor_code)
+        if self._vendor_index is not None:
+            if not await self._vendor_index.knows(root):
+                # корня нет в индексе (синк каталога не прошёл или не дошёл до карточки) —
+                # один раз ищем существующие коды через Content API и засеваем индекс ими
+                async with self._root_locks.setdefault(root, asyncio.Lock()):
+                    if not await self._vendor_index.knows(root):
+                        existing = await self._cards_reader.find_vendor_codes_like(vendor_code)
+                        await self._vendor_index.observe_many([vendor_code, *existing])
+            # O(1) по индексу суффиксов, без запроса к WB
+            return await self._vendor_index.reserve(vendor_code)
+        # без индекса — поиск по Content API под lock корня; пропущенный суффикс безвреден, повторный — нет
+        async with self._root_locks.setdefault(root, asyncio.Lock()):
+            existing = await self._cards_reader.find_vendor_codes_like(vendor_code)
+            issued = self._issued.setdefault(root, set())
+            new_vendor_code = next_vendor_code(vendor_code, set(existing) | issued)
+            issued.add(new_vendor_code)
+            return new_vendor_code
+
+    async def _processed_ids(self, feedback_ids: list[str]) -> set[str]:
+        if not feedback_ids:
+            return set()
+        if hasattr(self._clone_repo, "processed_ids"):
+            return set(await self._clone_repo.processed_ids(feedback_ids))
+        return {fid for fid in feedback_ids if await self._clone_repo.was_processed(fid)}
+
+    async def _clone_in_pool(self, feedback_id: str, nm_id: int, now: datetime, result: CloneRunResult) -> None:
+        async with self._sem:
+            await self._clone(feedback_id, nm_id, now, result)
+
+    async def _clone(self, feedback_id: str, nm_id: int, now: datetime, result: CloneRunResult) -> None:
+        try:
+            # 2) читаем исходную карточку
+            card = await self._cards_reader.get_card_by_nm_id(nm_id)
+            vendor_code = card["vendorCode"]
+            subject_id = card["subjectID"]
+            characteristics = card.get("characteristics", [])
+            title = card.get("title")
+            description = card.get("description")
+
+            # карточку только что прочитали — освежим общий кэш названий
+            if self._product_cache is not None:
+                try:
+                    _, color = extract_title_and_color(card)
+                    await self._product_cache.set(nm_id, title, color)
+                except Exception:
+                    pass
+
+            # 3) следующий (1),(2)... — код занимается сразу, до создания карточки
+            new_vendor_code = await self._next_vendor_code(vendor_code)
+
+            # 4) создаём новую карточку
+            new_payload = {
+                "subjectID": subject_id,
+                "vendorCode": new_vendor_code,
+                "title": title,
+                "description": description,
+                "characteristics": characteristics,
+                # медиа и цены подключим отдельными шагами/портами
+            }
+            new_nm_id = await self._cards_writer.create_card(new_payload)
+
+            # nmID у новой карточки может ещё не быть — WB создаёт её асинхронно
+            await self._clone_repo.mark_cloned(
+                feedback_id, nm_id, str(new_nm_id) if new_nm_id is not None else None, now,
+            )
+            result.cloned += 1
+
+            await self._notifier.notify_admins(
+                "WB Quality Clone: создан клон карточки из-за 1⭐ отзыва\n"
+                f"- feedback_id: {feedback_id}\n"
+                f"- nmId: {nm_id}\n"
+                f"- new_vendorCode: {new_vendor_code}\n"
+                f"- new_nmId: {new_nm_id}"
+            )
 
-            triggered += 1
-
-            try:
-                # 2) читаем исходную карточку
-                card = await self._cards_reader.get_card_by_nm_id(nm_id)
-                vendor_code = card["vendorCode"]
-                subject_id = card["subjectID"]
-                characteristics = card.get("characteristics", [])
-                title = card.get("title")
-                description = card.get("description")
-
-                # 3) найдём существующие vendorCode, чтобы выбрать следующий (1),(2)...
-                existing = await self._cards_reader.find_vendor_codes_like(vendor_code)
-                new_vendor_code = next_vendor_code(vendor_code, existing)
-
-                # 4) создаём новую карточку
-                new_payload = {
-                    "subjectID": subject_id,
-                    "vendorCode": new_vendor_code,
-                    "title": title,
-                    "description": description,
-                    "characteristics": characteristics,
-                    # медиа и цены подключим отдельными шагами/портами
-                }
-                new_nm_id = await self._cards_writer.create_card(new_payload)
-
-                await self._clone_repo.mark_cloned(feedback_id, nm_id, str(new_nm_id), now)
-                cloned += 1
-
-                await self._notifier.notify_admins(
-                    "WB Quality Clone: создан клон карточки из-за 1⭐ отзыва\n"
-                    f"- feedback_id: {feedback_id}\n"
-                    f"- nmId: {nm_id}\n"
-                    f"- new_vendorCode: {new_vendor_code}\n"
-                    f"- new_nmId: {new_nm_id}"
-                )
-
-            except Exception as e:
-                errors += 1
-                err = f"{type(e).__name__}: {e}"
-                await self._clone_repo.mark_failed(feedback_id, nm_id, now, err)
-                await self._notifier.notify_admins(
-                    "WB Quality Clone: ошибка при клонировании\n"
-                    f"- feedback_id: {feedback_id}\n"
-                    f"- nmId: {nm_id}\n"
-                    f"- error: {err}"
-                )
-
-        return CloneRunResult(checked, triggered, cloned, errors)
+        except Exception as e:
+            result.errors += 1
+            err = f"{type(e).__name__}: {e}"
+            await self._clone_repo.mark_failed(feedback_id, nm_id, now, err)
+            await self._notifier.notify_admins(
+                "WB Quality Clone: ошибка при клонировании\n"
+                f"- feedback_id: {feedback_id}\n"
+                f"- nmId: {nm_id}\n"
+                f"- error: {err}"
+            )
@@ -0,0 +1,16 @@
+def extract_title_and_color(card: dict) -> tuple[str | None, str]:
+    """
+    Достаёт из карточки Content API название и цвет (характеристика "Цвет").
+    Цвет может прийти строкой или списком — берём первое значение.
+    """
+    title = card.get("title")
+    color = ""
+    for ch in card.get("characteristics") or []:
+        if (ch.get("name") or "").strip().lower() == "цвет":
+            val = ch.get("value")
+            if isinstance(val, list) and val:
+                color = str(val[0])
+            elif isinstance(val, str):
+                color = val
+            break
+    return title, color
@@ -5,8 +5,11 @@ from datetime import datetime, timedelta, timezone
 class AutoRejectRule:
     delay_days: int
 
+    def due_at(self, created_at: datetime) -> datetime:
+        return created_at + timedelta(days=self.delay_days)
+
     def is_due(self, created_at: datetime, now: datetime) -> bool:
-        return now >= created_at + timedelta(days=self.delay_days)
+        return now >= self.due_at(created_at)
 
 def parse_wb_dt(dt_str: str) -> datetime:
     # WB отдаёт dt в формате "YYYY-MM-DDTHH:MM:SS.ffffff" (без timezone). :contentReference[oaicite:11]{index=11}
@@ -2,17 +2,24 @@ import re
 
 _SUFFIX_RE = re.compile(r"^(.*)\s\((\d+)\)$")
 
+def split_vendor_code(code: str) -> tuple[str, int | None]:
+    """
+    "Redmi 12 (3)" → ("Redmi 12", 3); "Redmi 12" → ("Redmi 12", None).
+    Корень — общий ключ для всех клонов одной карточки.
+    """
+    code = code.strip()
+    m = _SUFFIX_RE.match(code)
+    if m:
+        return m.group(1).strip(), int(m.group(2))
+    return code, None
+
 def next_vendor_code(base: str, existing: set[str]) -> str:
     """
     base: исходный vendorCode
     existing: множество уже существующих vendorCode (можно получить через cards/list по textSearch=base)
     """
     # Считаем, что base без суффикса (если с суффиксом — тоже обработаем)
-    m = _SUFFIX_RE.match(base.strip())
-    if m:
-        base_root = m.group(1).strip()
-    else:
-        base_root = base.strip()
+    base_root, _ = split_vendor_code(base)
 
     # Если base_root свободен и его нет в existing — можно использовать base_root (но вы хотите именно (1)+)
     # По требованию: всегда добавлять (1) и дальше
@@ -22,3 +29,36 @@ def next_vendor_code(base: str, existing: set[str]) -> str:
         if cand not in existing:
             return cand
         n += 1
+
+class VendorCodeIndex:
+    """
+    Корень vendorCode → наибольший занятый суффикс (n). Каждый код разбирается регуляркой
+    один раз — при observe; выбор следующего кода — поиск в словаре, без запросов к WB.
+    Исходный код без суффикса считается (0): клоны всё равно начинаются с (1).
+    """
+
+    def __init__(self, max_suffix: dict[str, int] | None = None):
+        self._max: dict[str, int] = dict(max_suffix or {})
+
+    def __len__(self) -> int:
+        return len(self._max)
+
+    def max_suffix(self, root: str) -> int | None:
+        return self._max.get(root)
+
+    def observe(self, code: str) -> str | None:
+        """Учитывает существующий код; возвращает корень, если его максимум вырос (или корень новый)."""
+        root, n = split_vendor_code(code)
+        n = n or 0
+        current = self._max.get(root)
+        if current is not None and current >= n:
+            return None
+        self._max[root] = n
+        return root
+
+    def reserve(self, base: str) -> tuple[str, str]:
+        """Следующий свободный код для base, сразу занятый: (корень, код)."""
+        root, _ = split_vendor_code(base)
+        n = self._max.get(root, 0) + 1
+        self._max[root] = n
+        return root, f"{root} ({n})"
@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+class TtlLruCache:
+    """
+    In-memory кэш с ограничением размера (LRU-вытеснение) и TTL на запись.
+
+    Запись старше ttl_sec считается устаревшей: её ещё можно отдать (stale-while-revalidate),
+    пока она моложе stale_ttl_sec, после чего она удаляется как промах.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl_sec: float = 3600, stale_ttl_sec: float = 86400):
+        self._max_size = max_size
+        self._ttl = ttl_sec
+        self._stale_ttl = max(stale_ttl_sec, ttl_sec)
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> tuple[Any, bool] | None:
+        """
+        (value, is_stale) или None, если записи нет / она слишком старая.
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        value, stored_at = item
+        age = time.monotonic() - stored_at
+        if age >= self._stale_ttl:
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        if age >= self._ttl:
+            self.stale_hits += 1
+            return value, True
+        self.hits += 1
+        return value, False
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -15,6 +15,16 @@ class AccountConfig:
 class Settings:
     accounts: List[AccountConfig]
     db_url: str
+    db_sqlite_wal: bool
+    db_sqlite_synchronous: str
+    db_sqlite_busy_timeout_ms: int
+    db_sqlite_cache_size_kib: int
+    db_sqlite_mmap_size_mb: int
+    db_sqlite_convert_incremental_vacuum: bool
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout_sec: int
+    db_pool_recycle_sec: int
     daily_supply_tz: str
     timezone: str
     interval_minutes: int
@@ -22,7 +32,34 @@ class Settings:
     daily_supply_hour: int
     daily_supply_minute: int
     wb_content_max_parallel: int
+    catalog_sync_interval_minutes: int
+    product_cache_max_size: int
+    product_cache_ttl_sec: int
+    product_cache_stale_sec: int
     default_reject_comment: str
+    returns_max_parallel: int
+    claims_flush_max_pending: int
+    claims_flush_interval_sec: int
+    returns_notify_digest: bool
+    returns_digest_window_sec: int
+    claims_due_queue: bool
+    claims_poll_interval_minutes: int
+    outbox_enabled: bool
+    outbox_interval_sec: int
+    outbox_max_attempts: int
+    retention_enabled: bool
+    retention_interval_hours: int
+    retention_claims_days: int
+    retention_orders_days: int
+    retention_supply_runs_days: int
+    retention_supply_report_text_days: int
+    retention_feedback_clone_days: int
+    retention_outbox_days: int
+    retention_batch_size: int
+    quality_clone_enabled: bool
+    quality_clone_interval_minutes: int
+    quality_clone_max_parallel: int
+    quality_clone_initial_lookback_hours: int
     enabled: bool
 
 def _parse_accounts(raw: Optional[str]) -> List[AccountConfig]:
@@ -95,14 +132,61 @@ def load_settings(env_file: str = ".env") -> Settings:
     s = Settings(
         accounts=accounts,
         db_url=gstr("DB_URL", "sqlite+aiosqlite:///./data/data.db"),
+        # SQLite: WAL + synchronous=NORMAL — читатели не ждут писателя, busy_timeout вместо «database is locked»
+        db_sqlite_wal=gbool("DB_SQLITE_WAL", True),
+        db_sqlite_synchronous=gstr("DB_SQLITE_SYNCHRONOUS", "NORMAL"),
+        db_sqlite_busy_timeout_ms=gint("DB_SQLITE_BUSY_TIMEOUT_MS", 5000),
+        db_sqlite_cache_size_kib=gint("DB_SQLITE_CACHE_SIZE_KIB", 16384),
+        db_sqlite_mmap_size_mb=gint("DB_SQLITE_MMAP_SIZE_MB", 128),
+        # разовый перевод старой базы на auto_vacuum=INCREMENTAL (полный VACUUM при старте, база заблокирована)
+        db_sqlite_convert_incremental_vacuum=gbool("DB_SQLITE_CONVERT_INCREMENTAL_VACUUM", False),
+        db_pool_size=gint("DB_POOL_SIZE", 5),
+        db_max_overflow=gint("DB_MAX_OVERFLOW", 10),
+        db_pool_timeout_sec=gint("DB_POOL_TIMEOUT_SEC", 30),
+        db_pool_recycle_sec=gint("DB_POOL_RECYCLE_SEC", 1800),
         daily_supply_tz=gstr("DAILY_SUPPLY_TZ", "Europe/Moscow"),
         timezone=gstr("TIMEZONE", gstr("DAILY_SUPPLY_TZ", "Europe/Moscow")),
         interval_minutes=gint("INTERVAL_MINUTES", 1),
         delay_days=gint("DELAY_DAYS", 3),
         daily_supply_hour=gint("DAILY_SUPPLY_HOUR", 10),
         daily_supply_minute=gint("DAILY_SUPPLY_MINUTE", 0),
-        wb_content_max_parallel=gint("WB_CONTENT_MAX_PARALLEL", 3),
+        # потолок адаптивного окна параллельных запросов к Content API
+        wb_content_max_parallel=gint("WB_CONTENT_MAX_PARALLEL", 6),
+        catalog_sync_interval_minutes=gint("CATALOG_SYNC_INTERVAL_MINUTES", 60),
+        product_cache_max_size=gint("PRODUCT_CACHE_MAX_SIZE", 20000),
+        product_cache_ttl_sec=gint("PRODUCT_CACHE_TTL_SEC", 3600),
+        product_cache_stale_sec=gint("PRODUCT_CACHE_STALE_SEC", 86400),
         default_reject_comment=gstr("DEFAULT_REJECT_COMMENT", "Пришлось отклонить заявку — нужно чуть больше информации."),
+        returns_max_parallel=gint("RETURNS_MAX_PARALLEL", 4),
+        # статусы заявок пишутся пачкой: не больше N записей / T секунд в буфере
+        claims_flush_max_pending=gint("CLAIMS_FLUSH_MAX_PENDING", 100),
+        claims_flush_interval_sec=gint("CLAIMS_FLUSH_INTERVAL_SEC", 5),
+        # уведомления по заявкам — дайджестом раз в окно, а не сообщением на каждую
+        returns_notify_digest=gbool("RETURNS_NOTIFY_DIGEST", True),
+        returns_digest_window_sec=gint("RETURNS_DIGEST_WINDOW_SEC", 300),
+        # очередь созревания заявок: отклонение точно к сроку, листинг — редким опросом
+        claims_due_queue=gbool("CLAIMS_DUE_QUEUE", True),
+        claims_poll_interval_minutes=gint("CLAIMS_POLL_INTERVAL_MINUTES", 15),
+        # отчёты поставки — через outbox в БД, доставка фоновым диспетчером с повторами
+        outbox_enabled=gbool("OUTBOX_ENABLED", True),
+        outbox_interval_sec=gint("OUTBOX_INTERVAL_SEC", 15),
+        outbox_max_attempts=gint("OUTBOX_MAX_ATTEMPTS", 20),
+        # retention: сроки хранения истории в днях (0 — хранить всегда), чистка пачками
+        retention_enabled=gbool("RETENTION_ENABLED", True),
+        retention_interval_hours=gint("RETENTION_INTERVAL_HOURS", 24),
+        retention_claims_days=gint("RETENTION_CLAIMS_DAYS", 90),
+        retention_orders_days=gint("RETENTION_ORDERS_DAYS", 60),
+        retention_supply_runs_days=gint("RETENTION_SUPPLY_RUNS_DAYS", 365),
+        retention_supply_report_text_days=gint("RETENTION_SUPPLY_REPORT_TEXT_DAYS", 30),
+        retention_feedback_clone_days=gint("RETENTION_FEEDBACK_CLONE_DAYS", 365),
+        retention_outbox_days=gint("RETENTION_OUTBOX_DAYS", 14),
+        retention_batch_size=gint("RETENTION_BATCH_SIZE", 500),
+        # клон карточки по 1⭐ отзыву: выключен по умолчанию, клоны разных корней vendorCode — параллельно
+        quality_clone_enabled=gbool("QUALITY_CLONE_ENABLED", False),
+        quality_clone_interval_minutes=gint("QUALITY_CLONE_INTERVAL_MINUTES", 30),
+        quality_clone_max_parallel=gint("QUALITY_CLONE_MAX_PARALLEL", 4),
+        # первый запуск без водяной метки: отзывы не старше N часов (0 — только новые с момента включения)
+        quality_clone_initial_lookback_hours=gint("QUALITY_CLONE_INITIAL_LOOKBACK_HOURS", 0),
         enabled=gbool("DAILY_SUPPLY_ENABLED", True),
     )
     return s
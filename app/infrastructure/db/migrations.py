@@ -0,0 +1,146 @@
+import logging
+from datetime import datetime
+from sqlalchemy import Column, MetaData, Table, delete, func, inspect, insert, literal, select, text, tuple_
+from sqlalchemy.engine import Connection
+from .models import ClaimProcessing, DailySupplyRun, FeedbackClone, Order, Outbox, SchemaVersion
+from .upsert import chunked
+
+log = logging.getLogger("db.migrations")
+
+def _pk_columns(conn: Connection, table_name: str) -> list[str]:
+    return list(inspect(conn).get_pk_constraint(table_name).get("constrained_columns") or [])
+
+def _rebuild_with_model_pk(conn: Connection, table: Table, defaults: dict | None = None) -> None:
+    """
+    Пересоздаёт таблицу под текущую модель (в SQLite первичный ключ иначе не поменять):
+    новая таблица → копия строк → DROP старой → RENAME. Индексы создаются заново после шага.
+
+    Идемпотентно: если таблицы нет (создаст create_all) или PK уже как в модели — ничего не делает.
+    defaults — значения для колонок, которых в старой таблице не было (например, instance_name).
+    """
+    insp = inspect(conn)
+    if not insp.has_table(table.name):
+        return
+    want_pk = [c.name for c in table.primary_key.columns]
+    if set(_pk_columns(conn, table.name)) == set(want_pk):
+        return
+
+    defaults = defaults or {}
+    old_cols = {c["name"] for c in insp.get_columns(table.name)}
+    tmp_name = f"{table.name}__new"
+    if insp.has_table(tmp_name):
+        # остаток прерванного прогона
+        conn.execute(text(f'DROP TABLE "{tmp_name}"'))
+
+    # колонки без index=True: индексы с именами новой таблицы после RENAME были бы «чужими»
+    tmp = Table(
+        tmp_name,
+        MetaData(),
+        *[Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in table.columns],
+    )
+    tmp.create(conn)
+
+    src = Table(table.name, MetaData(), autoload_with=conn)
+    cols, exprs = [], []
+    for c in table.columns:
+        if c.name in old_cols:
+            expr = src.c[c.name]
+            if c.name in defaults:
+                expr = func.coalesce(expr, literal(defaults[c.name]))
+        elif c.name in defaults:
+            expr = literal(defaults[c.name])
+        else:
+            continue
+        cols.append(c.name)
+        exprs.append(expr.label(c.name))
+    conn.execute(insert(tmp).from_select(cols, select(*exprs)))
+
+    conn.execute(text(f'DROP TABLE "{table.name}"'))
+    conn.execute(text(f'ALTER TABLE "{tmp_name}" RENAME TO "{table.name}"'))
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+    log.info("table %s rebuilt with primary key (%s)", table.name, ", ".join(want_pk))
+
+def _claims_composite_pk(conn: Connection) -> None:
+    _rebuild_with_model_pk(conn, ClaimProcessing.__table__, {"instance_name": "default"})
+
+def _daily_supply_composite_pk(conn: Connection) -> None:
+    _rebuild_with_model_pk(conn, DailySupplyRun.__table__, {"instance_name": "default"})
+
+def _feedback_clone_instance(conn: Connection) -> None:
+    # старые записи — без аккаунта, относим их к "default"
+    _rebuild_with_model_pk(conn, FeedbackClone.__table__, {"instance_name": "default"})
+
+def _orders_unique_order(conn: Connection) -> None:
+    """
+    Дубли (order_id, instance_name) из старых версий мешают уникальному индексу — цели ON CONFLICT
+    в upsert_order. Из группы оставляем строку, уже назначенную в поставку, иначе самую позднюю.
+    Индекс создаётся здесь же: не получилось — миграция падает, а не тихо ломает upsert.
+    """
+    if not inspect(conn).has_table(Order.__table__.name):
+        return
+    t = Order.__table__
+    dup_keys = (
+        select(t.c.order_id, t.c.instance_name)
+        .group_by(t.c.order_id, t.c.instance_name)
+        .having(func.count() > 1)
+    )
+    rows = conn.execute(
+        select(t.c.id, t.c.order_id, t.c.instance_name, t.c.supply_id)
+        .where(tuple_(t.c.order_id, t.c.instance_name).in_(dup_keys))
+        .order_by(t.c.id)
+    ).all()
+    keep: dict[tuple, int] = {}
+    assigned: dict[tuple, bool] = {}
+    for r in rows:
+        key = (r.order_id, r.instance_name)
+        if key not in keep or r.supply_id is not None or not assigned[key]:
+            keep[key] = r.id
+            assigned[key] = r.supply_id is not None
+    drop = [r.id for r in rows if keep[(r.order_id, r.instance_name)] != r.id]
+    for part in chunked(drop):
+        conn.execute(delete(t).where(t.c.id.in_(part)))
+    if drop:
+        log.warning("orders: removed %s duplicate rows before unique index", len(drop))
+    for index in t.indexes:
+        if index.unique:
+            index.create(conn, checkfirst=True)
+
+def _outbox_done_chat_ids(conn: Connection) -> None:
+    # колонку без значения добавляет и SQLite, и PostgreSQL — пересборка не нужна
+    insp = inspect(conn)
+    if not insp.has_table(Outbox.__table__.name):
+        return
+    if "done_chat_ids" in {c["name"] for c in insp.get_columns(Outbox.__table__.name)}:
+        return
+    conn.execute(text('ALTER TABLE "outbox" ADD COLUMN done_chat_ids TEXT'))
+
+# (версия, описание, шаг). Шаги идемпотентны: свежая база уже создана create_all по моделям.
+MIGRATIONS = [
+    (1, "claim_processing: PK (claim_id, instance_name)", _claims_composite_pk),
+    (2, "daily_supply_run: PK (day_key, instance_name)", _daily_supply_composite_pk),
+    (3, "feedback_clone: instance_name, PK (feedback_id, instance_name)", _feedback_clone_instance),
+    (4, "orders: dedupe (order_id, instance_name), unique index", _orders_unique_order),
+    (5, "outbox: done_chat_ids (per-recipient delivery)", _outbox_done_chat_ids),
+]
+
+def current_version(conn: Connection) -> int:
+    res = conn.execute(select(SchemaVersion.version).order_by(SchemaVersion.version.desc()).limit(1))
+    return res.scalar_one_or_none() or 0
+
+def run_migrations(conn: Connection) -> list[int]:
+    """
+    Применяет миграции новее записанной версии, по одной, с записью в schema_version.
+    Вызывается из init_db после create_all (таблица schema_version к этому моменту есть).
+    """
+    SchemaVersion.__table__.create(conn, checkfirst=True)
+    applied: list[int] = []
+    version = current_version(conn)
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+        log.info("applying migration %s: %s", number, description)
+        step(conn)
+        conn.execute(insert(SchemaVersion).values(version=number, description=description, applied_at=datetime.utcnow()))
+        applied.append(number)
+    return applied
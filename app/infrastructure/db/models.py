@@ -1,14 +1,15 @@
 from sqlalchemy.orm import DeclarativeBase, mapped_column
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import Integer, String, DateTime, Column, Text, Boolean
+from sqlalchemy import BigInteger, Integer, String, DateTime, Column, Text, Boolean, Index
 from datetime import datetime
 class Base(DeclarativeBase):
     pass
 
 class ClaimProcessing(Base):
     __tablename__ = "claim_processing"
+    # PK (claim_id, instance_name): у каждого аккаунта свои заявки, поиск — по обоим полям
     claim_id: Mapped[str] = mapped_column(String, primary_key=True)
-    instance_name = Column(String, nullable=False, index=True, default="default")
+    instance_name = Column(String, primary_key=True, default="default")
     processed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     action: Mapped[str | None] = mapped_column(String, nullable=True)
     processed_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -16,18 +17,24 @@ class ClaimProcessing(Base):
 
 class DailySupplyRun(Base):
     __tablename__ = "daily_supply_run"
-    day_key: Mapped[str] = mapped_column(String, primary_key=True)  # "YYYY-MM-DD"
+    day_key: Mapped[str] = mapped_column(String, primary_key=True)  # "YYYY-MM-DD", PK вместе с instance_name
     supply_id: Mapped[str | None] = mapped_column(String, nullable=True)
     created_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
     order_count: Mapped[int] = mapped_column(default=0, nullable=False)
     report_text: Mapped[str | None] = mapped_column(Text, nullable=True)
     error: Mapped[str | None] = mapped_column(Text, nullable=True)
-    instance_name = Column(String, index=True, nullable=False, default="default")
+    instance_name = Column(String, primary_key=True, default="default")
+
+    __table_args__ = (
+        # get_last_report: WHERE instance_name = ? ORDER BY created_at DESC LIMIT 1
+        Index("ix_daily_supply_run_instance_created", "instance_name", "created_at"),
+    )
 
 class FeedbackClone(Base):
     __tablename__ = "feedback_clone"
     feedback_id: Mapped[str] = mapped_column(String, primary_key=True)
-    nm_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    instance_name = Column(String, primary_key=True, default="default")
+    nm_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     created_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
     status: Mapped[str] = mapped_column(String, nullable=False)  # CLONED / FAILED
     new_nm_id: Mapped[str | None] = mapped_column(String, nullable=True)
@@ -36,8 +43,9 @@ class FeedbackClone(Base):
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    order_id = Column(Integer, index=True, nullable=False)  # id из WB
-    nm_id = Column(Integer, index=True, nullable=False)
+    # id заказов и nmId WB выходят за int32 — в PostgreSQL нужен BIGINT
+    order_id = Column(BigInteger, index=True, nullable=False)  # id из WB
+    nm_id = Column(BigInteger, index=True, nullable=False)
     quantity = Column(Integer, default=1)
     offer_name = Column(String, nullable=True)
     vendor_code = Column(String, nullable=True)
@@ -46,10 +54,83 @@ class Order(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     instance_name = Column(String, index=True, nullable=False, default="default")
 
+    __table_args__ = (
+        # цель ON CONFLICT для upsert_order: один заказ WB — одна строка на аккаунт
+        Index("ux_orders_order_instance", "order_id", "instance_name", unique=True),
+        Index("ix_orders_instance_supply", "instance_name", "supply_id"),
+    )
+
 class ProductCache(Base):
     __tablename__ = "product_cache"
-    nm_id = Column(Integer, primary_key=True)
+    nm_id = Column(BigInteger, primary_key=True)
     title = Column(String, nullable=True)
     color = Column(String, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    instance_name = Column(String, index=True, nullable=False, primary_key = True,default="default")
\ No newline at end of file
+    instance_name = Column(String, index=True, nullable=False, primary_key = True,default="default")
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    instance_name = Column(String, primary_key=True, default="default")
+    key = Column(String, primary_key=True)  # "catalog", ...
+    cursor = Column(Text, nullable=True)  # JSON курсора/водяной метки
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ClaimDue(Base):
+    """
+    Очередь ещё не созревших заявок: когда заявку можно отклонять, известно сразу (dt + delay_days).
+    """
+    __tablename__ = "claim_due"
+    instance_name = Column(String, primary_key=True, default="default")
+    claim_id = Column(String, primary_key=True)
+    due_at = Column(DateTime, nullable=False)  # UTC, naive
+    dt = Column(String, nullable=False)  # исходный dt заявки из WB
+    actions = Column(Text, nullable=True)  # JSON-список actions на момент постановки
+
+    __table_args__ = (
+        Index("ix_claim_due_instance_due", "instance_name", "due_at"),
+    )
+
+class Outbox(Base):
+    """
+    Исходящие уведомления: пишутся в одной транзакции с изменением состояния,
+    доставляются фоновым диспетчером (at-least-once).
+    """
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    instance_name = Column(String, nullable=False, index=True, default="default")
+    kind = Column(String, nullable=False, default="message")  # "supply_report", "supply_error", ...
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    # админы, с которыми уже всё решено (доставлено или бот заблокирован): "1,2,3"; повтор им не шлёт
+    done_chat_ids = Column(Text, nullable=True)
+
+    @property
+    def done_chats(self) -> set[int]:
+        return {int(x) for x in (self.done_chat_ids or "").split(",") if x}
+
+    __table_args__ = (
+        # pending(): WHERE instance_name = ? AND sent_at IS NULL AND next_attempt_at <= ?
+        Index("ix_outbox_instance_pending", "instance_name", "sent_at", "next_attempt_at"),
+    )
+
+class VendorCodeSuffix(Base):
+    """
+    Индекс артикулов: корень vendorCode → наибольший занятый суффикс (n) по аккаунту.
+    """
+    __tablename__ = "vendor_code_suffix"
+    instance_name = Column(String, primary_key=True, default="default")
+    root = Column(String, primary_key=True)
+    max_suffix = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchemaVersion(Base):
+    """
+    Применённые миграции схемы (см. migrations.py).
+    """
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False, default=datetime.utcnow)
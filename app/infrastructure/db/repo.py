@@ -1,18 +1,148 @@
+import asyncio
+import logging
+from collections.abc import Callable
 from datetime import datetime
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from app.application.ports import ClaimsRepoPort
 from .models import ClaimProcessing
+from .upsert import chunked, upsert_stmt
 
-# app/infrastructure/db/repo_claims.py (или где у тебя ClaimsRepo)
-from sqlalchemy import select, update
-from datetime import datetime
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+log = logging.getLogger("claims_repo")
+
+_CONFLICT_COLS = ["claim_id", "instance_name"]
+_DONE_COLS = ["processed", "action", "processed_at", "error"]
+# у failed action не трогаем — остаётся прежний
+_FAILED_COLS = ["processed", "processed_at", "error"]
+
+async def _upsert_statuses(s: AsyncSession, done: list[dict], failed: list[dict]) -> None:
+    for part in chunked(done):
+        await s.execute(upsert_stmt(s, ClaimProcessing, part, conflict_cols=_CONFLICT_COLS, update_cols=_DONE_COLS))
+    for part in chunked(failed):
+        await s.execute(upsert_stmt(s, ClaimProcessing, part, conflict_cols=_CONFLICT_COLS, update_cols=_FAILED_COLS))
+
+class ClaimsUnitOfWork:
+    """
+    Буфер статусов заявок за один прогон: mark_done / mark_failed копятся в памяти
+    и пишутся одним многострочным INSERT ... ON CONFLICT DO UPDATE в одной транзакции.
+
+    Сброс — при выходе из контекста, при max_pending записях в буфере и по таймеру
+    раз в flush_interval_sec: при падении процесса теряется не больше этого.
+    Если и финальный сброс не удался, выход из контекста не падает: остаток отдаётся в on_leftover
+    (репозиторий подложит его в следующий unit of work).
+    """
+
+    def __init__(
+        self,
+        sf: async_sessionmaker[AsyncSession],
+        instance_name: str,
+        max_pending: int,
+        flush_interval_sec: float,
+        pending: dict[str, dict] | None = None,
+        on_leftover: Callable[[dict[str, dict]], None] | None = None,
+        final_flush_attempts: int = 3,
+        final_flush_pause_sec: float = 0.5,
+    ):
+        self._sf = sf
+        self._instance_name = instance_name
+        self._max_pending = max(1, max_pending)
+        self._flush_interval_sec = flush_interval_sec
+        self._pending: dict[str, dict] = dict(pending or {})
+        self._on_leftover = on_leftover
+        self._final_flush_attempts = max(1, final_flush_attempts)
+        self._final_flush_pause_sec = final_flush_pause_sec
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    async def __aenter__(self):
+        if self._flush_interval_sec > 0:
+            self._timer = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._timer is not None:
+            self._timer.cancel()
+            # дожидаемся таймера: отменённый посреди записи сброс возвращает свою пачку в буфер
+            await asyncio.wait([self._timer])
+        for attempt in range(1, self._final_flush_attempts + 1):
+            try:
+                await self.flush()
+                break
+            except Exception as e:
+                log.warning("final claims flush failed (attempt %s): %s", attempt, e)
+                if attempt < self._final_flush_attempts:
+                    await asyncio.sleep(self._final_flush_pause_sec * attempt)
+        if self._pending:
+            log.error("claims flush: %s statuses not written, kept for the next run", len(self._pending))
+            if self._on_leftover is not None:
+                self._on_leftover(self._pending)
+            self._pending = {}
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval_sec)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning("claims flush failed, will retry: %s", e)
+
+    async def mark_done(self, claim_id: str, action: str, processed_at: datetime) -> None:
+        await self._add(claim_id, {"processed": True, "action": action, "processed_at": processed_at, "error": None})
+
+    async def mark_failed(self, claim_id: str, error: str, processed_at: datetime) -> None:
+        await self._add(claim_id, {"processed": False, "processed_at": processed_at, "error": error})
+
+    async def _add(self, claim_id: str, values: dict) -> None:
+        self._pending[claim_id] = {"claim_id": claim_id, "instance_name": self._instance_name, **values}
+        if len(self._pending) >= self._max_pending:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            done = [v for v in batch.values() if v["processed"]]
+            failed = [v for v in batch.values() if not v["processed"]]
+            try:
+                async with self._sf() as s:
+                    await _upsert_statuses(s, done, failed)
+                    await s.commit()
+            except BaseException:
+                # и при отмене (таймер на выходе из контекста) — вернём в буфер то,
+                # что не успели перезаписать более свежим статусом
+                for claim_id, v in batch.items():
+                    self._pending.setdefault(claim_id, v)
+                raise
 
 class ClaimsRepo(ClaimsRepoPort):
-    def __init__(self, sf: async_sessionmaker[AsyncSession], instance_name: str = "default"):
+    def __init__(
+        self,
+        sf: async_sessionmaker[AsyncSession],
+        instance_name: str = "default",
+        flush_max_pending: int = 100,
+        flush_interval_sec: float = 5.0,
+    ):
         self._sf = sf
         self._instance_name = instance_name
+        self._flush_max_pending = flush_max_pending
+        self._flush_interval_sec = flush_interval_sec
+        # статусы, которые прошлый unit of work так и не записал — уйдут со следующим
+        self._leftover: dict[str, dict] = {}
+
+    def unit_of_work(self) -> ClaimsUnitOfWork:
+        pending, self._leftover = self._leftover, {}
+        return ClaimsUnitOfWork(
+            self._sf,
+            self._instance_name,
+            self._flush_max_pending,
+            self._flush_interval_sec,
+            pending=pending,
+            on_leftover=self._keep_leftover,
+        )
+
+    def _keep_leftover(self, pending: dict[str, dict]) -> None:
+        self._leftover.update(pending)
 
     async def was_processed(self, claim_id: str) -> bool:
         async with self._sf() as s:
@@ -24,37 +154,38 @@ class ClaimsRepo(ClaimsRepoPort):
             row = res.scalar_one_or_none()
             return bool(row and row.processed)
 
+    async def processed_ids(self, claim_ids: list[str]) -> set[str]:
+        """
+        Какие из claim_ids уже обработаны — один SELECT ... IN (...) на пачку.
+        """
+        result: set[str] = set()
+        if not claim_ids:
+            return result
+        async with self._sf() as s:
+            for part in chunked(list(claim_ids)):
+                stmt = select(ClaimProcessing.claim_id).where(
+                    ClaimProcessing.instance_name == self._instance_name,
+                    ClaimProcessing.processed.is_(True),
+                    ClaimProcessing.claim_id.in_(part),
+                )
+                res = await s.execute(stmt)
+                result.update(res.scalars())
+        return result
+
     async def mark_done(self, claim_id: str, action: str, processed_at: datetime) -> None:
+        row = {
+            "claim_id": claim_id, "instance_name": self._instance_name,
+            "processed": True, "action": action, "processed_at": processed_at, "error": None,
+        }
         async with self._sf() as s:
-            stmt = select(ClaimProcessing).where(
-                ClaimProcessing.claim_id == claim_id,
-                ClaimProcessing.instance_name == self._instance_name,
-            )
-            res = await s.execute(stmt)
-            row = res.scalar_one_or_none()
-            if not row:
-                row = ClaimProcessing(claim_id=claim_id, instance_name=self._instance_name)
-            row.processed = True
-            row.action = action
-            row.processed_at = processed_at
-            row.error = None
-            s.add(row)
+            await _upsert_statuses(s, [row], [])
             await s.commit()
 
     async def mark_failed(self, claim_id: str, error: str, processed_at: datetime) -> None:
+        row = {
+            "claim_id": claim_id, "instance_name": self._instance_name,
+            "processed": False, "processed_at": processed_at, "error": error,
+        }
         async with self._sf() as s:
-            stmt = select(ClaimProcessing).where(
-                ClaimProcessing.claim_id == claim_id,
-                ClaimProcessing.instance_name == self._instance_name,
-            )
-            res = await s.execute(stmt)
-            row = res.scalar_one_or_none()
-            if not row:
-                row = ClaimProcessing(claim_id=claim_id, instance_name=self._instance_name)
-            row.processed = False
-            # row.action оставляем как было (не перезаписываем)
-            row.processed_at = processed_at
-            row.error = error
-            s.add(row)
+            await _upsert_statuses(s, [], [row])
             await s.commit()
-
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime, timezone
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from .models import ClaimDue
+from .upsert import chunked, upsert_stmt
+
+def _to_db(dt: datetime) -> datetime:
+    # в БД — naive UTC: одинаково сравнивается и в sqlite, и в postgres
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def _from_db(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc)
+
+class ClaimDueRepo:
+    """
+    Персистентная очередь заявок по времени созревания (due_at) для instance_name.
+    """
+    def __init__(self, sf: async_sessionmaker[AsyncSession], instance_name: str = "default"):
+        self._sf = sf
+        self._instance_name = instance_name
+
+    async def add_many(self, items: list[dict]) -> None:
+        """
+        items: [{"id", "dt", "actions", "due_at"}]. Повторная постановка обновляет actions/due_at.
+        """
+        if not items:
+            return
+        rows = [
+            {
+                "instance_name": self._instance_name,
+                "claim_id": c["id"],
+                "due_at": _to_db(c["due_at"]),
+                "dt": c["dt"],
+                "actions": json.dumps(c.get("actions") or []),
+            }
+            for c in {c["id"]: c for c in items}.values()
+        ]
+        async with self._sf() as s:
+            for part in chunked(rows):
+                await s.execute(upsert_stmt(
+                    s, ClaimDue, part,
+                    conflict_cols=["instance_name", "claim_id"],
+                    update_cols=["due_at", "dt", "actions"],
+                ))
+            await s.commit()
+
+    async def due(self, now: datetime, limit: int = 500) -> list[dict]:
+        """
+        Созревшие заявки в формате листинга WB: {"id", "dt", "actions"}.
+        """
+        async with self._sf() as s:
+            stmt = (
+                select(ClaimDue)
+                .where(ClaimDue.instance_name == self._instance_name, ClaimDue.due_at <= _to_db(now))
+                .order_by(ClaimDue.due_at)
+                .limit(limit)
+            )
+            res = await s.execute(stmt)
+            return [
+                {"id": r.claim_id, "dt": r.dt, "actions": json.loads(r.actions or "[]")}
+                for r in res.scalars()
+            ]
+
+    async def next_due_at(self) -> datetime | None:
+        async with self._sf() as s:
+            stmt = select(func.min(ClaimDue.due_at)).where(ClaimDue.instance_name == self._instance_name)
+            res = await s.execute(stmt)
+            value = res.scalar_one_or_none()
+            return _from_db(value) if value is not None else None
+
+    async def remove(self, claim_ids: list[str]) -> None:
+        if not claim_ids:
+            return
+        async with self._sf() as s:
+            for part in chunked(list(claim_ids)):
+                await s.execute(delete(ClaimDue).where(
+                    ClaimDue.instance_name == self._instance_name,
+                    ClaimDue.claim_id.in_(part),
+                ))
+            await s.commit()
+
+    async def ids(self) -> set[str]:
+        """
+        id всех заявок в очереди аккаунта. Очередь мала (только несозревшие), поэтому читаем целиком.
+        """
+        async with self._sf() as s:
+            res = await s.execute(select(ClaimDue.claim_id).where(ClaimDue.instance_name == self._instance_name))
+            return set(res.scalars())
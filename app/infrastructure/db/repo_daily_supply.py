@@ -2,6 +2,8 @@ from datetime import datetime
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from sqlalchemy import select, desc
 from .models import DailySupplyRun
+from .repo_outbox import add_to_outbox
+from .upsert import upsert_stmt
 
 class DailySupplyRepo:
     def __init__(self, sf: async_sessionmaker[AsyncSession], instance_name: str = "default"):
@@ -18,37 +20,48 @@ class DailySupplyRepo:
             row = res.scalar_one_or_none()
             return row is not None and row.supply_id is not None and row.error is None
 
-    async def mark_ok(self, day_key: str, supply_id: str, created_at: datetime, order_count: int, report_text: str) -> None:
+    async def mark_ok(
+        self,
+        day_key: str,
+        supply_id: str,
+        created_at: datetime,
+        order_count: int,
+        report_text: str,
+        notify_text: str | None = None,
+    ) -> None:
+        """
+        notify_text — уведомление в outbox в той же транзакции, что и отчёт.
+        """
+        row = {
+            "day_key": day_key,
+            "instance_name": self._instance_name,
+            "supply_id": supply_id,
+            "created_at": created_at,
+            "order_count": order_count,
+            "report_text": report_text,
+            "error": None,
+        }
         async with self._sf() as s:
-            stmt = select(DailySupplyRun).where(
-                DailySupplyRun.day_key == day_key,
-                DailySupplyRun.instance_name == self._instance_name,
-            )
-            res = await s.execute(stmt)
-            row = res.scalar_one_or_none()
-            if not row:
-                row = DailySupplyRun(day_key=day_key, instance_name=self._instance_name)
-            row.supply_id = supply_id
-            row.created_at = created_at
-            row.order_count = order_count
-            row.error = None
-            row.report_text = report_text
-            s.add(row)
+            await s.execute(upsert_stmt(
+                s, DailySupplyRun, [row],
+                conflict_cols=["day_key", "instance_name"],
+                update_cols=[c for c in row if c not in ("day_key", "instance_name")],
+            ))
+            if notify_text is not None:
+                add_to_outbox(s, self._instance_name, notify_text, kind="supply_report")
             await s.commit()
 
-    async def mark_failed(self, day_key: str, created_at: datetime, error: str) -> None:
+    async def mark_failed(self, day_key: str, created_at: datetime, error: str, notify_text: str | None = None) -> None:
+        row = {"day_key": day_key, "instance_name": self._instance_name, "created_at": created_at, "error": error}
         async with self._sf() as s:
-            stmt = select(DailySupplyRun).where(
-                DailySupplyRun.day_key == day_key,
-                DailySupplyRun.instance_name == self._instance_name,
-            )
-            res = await s.execute(stmt)
-            row = res.scalar_one_or_none()
-            if not row:
-                row = DailySupplyRun(day_key=day_key, instance_name=self._instance_name)
-            row.created_at = created_at
-            row.error = error
-            s.add(row)
+            # supply_id/report_text прошлой попытки не трогаем
+            await s.execute(upsert_stmt(
+                s, DailySupplyRun, [row],
+                conflict_cols=["day_key", "instance_name"],
+                update_cols=["created_at", "error"],
+            ))
+            if notify_text is not None:
+                add_to_outbox(s, self._instance_name, notify_text, kind="supply_error")
             await s.commit()
 
     async def get_last_report(self) -> DailySupplyRun | None:
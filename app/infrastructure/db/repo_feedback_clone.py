@@ -1,37 +1,56 @@
 from datetime import datetime
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from .models import FeedbackClone
+from .upsert import chunked, upsert_stmt
 
 class FeedbackCloneRepo:
-    def __init__(self, sf: async_sessionmaker[AsyncSession]):
+    def __init__(self, sf: async_sessionmaker[AsyncSession], instance_name: str = "default"):
         self._sf = sf
+        self._instance_name = instance_name
 
     async def was_processed(self, feedback_id: str) -> bool:
         async with self._sf() as s:
-            return await s.get(FeedbackClone, feedback_id) is not None
+            return await s.get(FeedbackClone, (feedback_id, self._instance_name)) is not None
 
-    async def mark_cloned(self, feedback_id: str, nm_id: int, new_nm_id: str, created_at: datetime) -> None:
+    async def processed_ids(self, feedback_ids: list[str]) -> set[str]:
+        """
+        Какие из feedback_ids уже обработаны (CLONED или FAILED) — один SELECT ... IN (...) на пачку.
+        """
+        result: set[str] = set()
+        if not feedback_ids:
+            return result
         async with self._sf() as s:
-            row = FeedbackClone(
-                feedback_id=feedback_id,
-                nm_id=nm_id,
-                created_at=created_at,
-                status="CLONED",
-                new_nm_id=new_nm_id,
-                error=None,
-            )
-            s.add(row)
-            await s.commit()
+            for part in chunked(list(feedback_ids)):
+                res = await s.execute(select(FeedbackClone.feedback_id).where(
+                    FeedbackClone.instance_name == self._instance_name,
+                    FeedbackClone.feedback_id.in_(part),
+                ))
+                result.update(res.scalars())
+        return result
+
+    async def mark_cloned(self, feedback_id: str, nm_id: int, new_nm_id: str | None, created_at: datetime) -> None:
+        await self._save(feedback_id, nm_id, created_at, status="CLONED", new_nm_id=new_nm_id, error=None)
 
     async def mark_failed(self, feedback_id: str, nm_id: int, created_at: datetime, error: str) -> None:
+        await self._save(feedback_id, nm_id, created_at, status="FAILED", new_nm_id=None, error=error)
+
+    async def _save(self, feedback_id: str, nm_id: int, created_at: datetime, status: str,
+                    new_nm_id: str | None, error: str | None) -> None:
+        row = {
+            "feedback_id": feedback_id,
+            "instance_name": self._instance_name,
+            "nm_id": nm_id,
+            "created_at": created_at,
+            "status": status,
+            "new_nm_id": new_nm_id,
+            "error": error,
+        }
         async with self._sf() as s:
-            row = FeedbackClone(
-                feedback_id=feedback_id,
-                nm_id=nm_id,
-                created_at=created_at,
-                status="FAILED",
-                new_nm_id=None,
-                error=error,
-            )
-            s.add(row)
+            # повторная попытка после FAILED перезаписывает статус, а не падает на PK
+            await s.execute(upsert_stmt(
+                s, FeedbackClone, [row],
+                conflict_cols=["feedback_id", "instance_name"],
+                update_cols=["nm_id", "created_at", "status", "new_nm_id", "error"],
+            ))
             await s.commit()
@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func
 from .models import Order
+from .upsert import upsert_stmt
 from datetime import datetime
 
 class OrderRepo:
@@ -11,32 +12,41 @@ class OrderRepo:
     async def upsert_order(self, order_wb: dict):
         """
         order_wb: dict with keys: id, nmId, quantity, offerName, vendorCode
+        Один INSERT ... ON CONFLICT (order_id, instance_name) DO UPDATE ... RETURNING.
+        Отсутствующие в order_wb поля не затирают сохранённые.
         """
+        now = datetime.utcnow()
+        row = {
+            "order_id": int(order_wb["id"]),
+            "nm_id": int(order_wb.get("nmId", 0)),
+            "quantity": int(order_wb.get("quantity", 1)),
+            "offer_name": order_wb.get("offerName"),
+            "vendor_code": order_wb.get("vendorCode"),
+            "created_at": now,
+            "updated_at": now,
+            "instance_name": self._instance_name,
+        }
+        update_cols = ["updated_at"]
+        if "nmId" in order_wb:
+            update_cols.append("nm_id")
+        if "quantity" in order_wb:
+            update_cols.append("quantity")
+
         async with self._sf() as s:
-            # try find by order_id
-            q = await s.execute(select(Order).where(Order.order_id == int(order_wb["id"]),
-                                                    Order.instance_name == self._instance_name))
-            row = q.scalars().first()
-            if row:
-                row.nm_id = int(order_wb.get("nmId", row.nm_id))
-                row.quantity = int(order_wb.get("quantity", row.quantity))
-                row.offer_name = order_wb.get("offerName") or row.offer_name
-                row.vendor_code = order_wb.get("vendorCode") or row.vendor_code
-                row.updated_at = datetime.utcnow()
-            else:
-                row = Order(
-                    order_id=int(order_wb["id"]),
-                    nm_id=int(order_wb.get("nmId", 0)),
-                    quantity=int(order_wb.get("quantity", 1)),
-                    offer_name=order_wb.get("offerName"),
-                    vendor_code=order_wb.get("vendorCode"),
-                    created_at=datetime.utcnow(),
-                    updated_at=datetime.utcnow(),
-                    instance_name=self._instance_name
-                )
-                s.add(row)
+            stmt = upsert_stmt(
+                s, Order, [row],
+                conflict_cols=["order_id", "instance_name"],
+                update_cols=update_cols,
+                # пустая строка от WB, как и отсутствие поля, сохранённое значение не затирает
+                set_=lambda excluded: {
+                    "offer_name": func.coalesce(func.nullif(excluded.offer_name, ""), Order.offer_name),
+                    "vendor_code": func.coalesce(func.nullif(excluded.vendor_code, ""), Order.vendor_code),
+                },
+            ).returning(Order)
+            res = await s.execute(stmt, execution_options={"populate_existing": True})
+            saved = res.scalar_one()
             await s.commit()
-            return row
+            return saved
 
     async def get_unassigned_orders(self):
         async with self._sf() as s:
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from .models import Outbox
+from .upsert import chunked
+
+def add_to_outbox(session: AsyncSession, instance_name: str, text: str, kind: str = "message") -> None:
+    """
+    Добавить уведомление в outbox внутри чужой транзакции — коммитит вызывающий репозиторий.
+    """
+    now = datetime.utcnow()
+    session.add(Outbox(
+        instance_name=instance_name,
+        kind=kind,
+        text=text,
+        created_at=now,
+        attempts=0,
+        next_attempt_at=now,
+    ))
+
+class OutboxRepo:
+    def __init__(self, sf: async_sessionmaker[AsyncSession], instance_name: str = "default"):
+        self._sf = sf
+        self._instance_name = instance_name
+
+    async def add(self, text: str, kind: str = "message") -> None:
+        async with self._sf() as s:
+            add_to_outbox(s, self._instance_name, text, kind)
+            await s.commit()
+
+    async def pending(self, now: datetime, limit: int = 50, max_attempts: int = 20) -> list[Outbox]:
+        """
+        Недоставленные сообщения, чей срок повтора наступил, в порядке создания.
+        """
+        async with self._sf() as s:
+            stmt = (
+                select(Outbox)
+                .where(
+                    Outbox.instance_name == self._instance_name,
+                    Outbox.sent_at.is_(None),
+                    Outbox.attempts < max_attempts,
+                    Outbox.next_attempt_at <= now,
+                )
+                .order_by(Outbox.id)
+                .limit(limit)
+            )
+            res = await s.execute(stmt)
+            return list(res.scalars())
+
+    async def mark_sent(self, ids: list[int], sent_at: datetime) -> None:
+        if not ids:
+            return
+        async with self._sf() as s:
+            for part in chunked(list(ids)):
+                await s.execute(
+                    update(Outbox)
+                    .where(Outbox.id.in_(part))
+                    .values(sent_at=sent_at, attempts=Outbox.attempts + 1, last_error=None)
+                )
+            await s.commit()
+
+    async def mark_retry(
+        self, id: int, error: str, delay_sec: float, now: datetime, done_chats: set[int] | None = None,
+    ) -> None:
+        """
+        Отложить повтор. done_chats — админы, которым повторять не нужно (уже доставлено или бот заблокирован).
+        """
+        values = dict(
+            attempts=Outbox.attempts + 1,
+            last_error=error,
+            next_attempt_at=now + timedelta(seconds=delay_sec),
+        )
+        if done_chats is not None:
+            values["done_chat_ids"] = ",".join(str(c) for c in sorted(done_chats)) or None
+        async with self._sf() as s:
+            await s.execute(update(Outbox).where(Outbox.id == id).values(**values))
+            await s.commit()
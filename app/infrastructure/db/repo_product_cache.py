@@ -1,7 +1,11 @@
+import asyncio
+import logging
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from .models import ProductCache
+from .upsert import chunked, upsert_stmt
 from sqlalchemy import select
 from datetime import datetime
+from app.infrastructure.cache.ttl_lru import TtlLruCache
 
 class ProductCacheRepo:
     def __init__(self, sf: async_sessionmaker[AsyncSession], instance_name: str = "default"):
@@ -18,28 +22,127 @@ class ProductCacheRepo:
             )
             return q.scalar_one_or_none()
 
-    async def set(self, nm_id: int, title: str | None, color: str | None):
+    async def get_many(self, nm_ids: list[int]) -> dict[int, ProductCache]:
+        """
+        Один SELECT ... WHERE nm_id IN (...) на весь список (пачками по CHUNK_SIZE).
+        """
+        result: dict[int, ProductCache] = {}
+        if not nm_ids:
+            return result
         async with self._sf() as s:
-            q = await s.execute(
-                select(ProductCache).where(
-                    ProductCache.nm_id == nm_id,
-                    ProductCache.instance_name == self._instance_name,
-                )
-            )
-            row = q.scalar_one_or_none()
-
-            if not row:
-                row = ProductCache(
-                    nm_id=nm_id,
-                    instance_name=self._instance_name,
-                    title=title,
-                    color=color,
-                    updated_at=datetime.utcnow(),
+            for part in chunked(list(set(nm_ids))):
+                q = await s.execute(
+                    select(ProductCache).where(
+                        ProductCache.instance_name == self._instance_name,
+                        ProductCache.nm_id.in_(part),
+                    )
                 )
-            else:
-                row.title = title
-                row.color = color
-                row.updated_at = datetime.utcnow()
+                for row in q.scalars():
+                    result[row.nm_id] = row
+        return result
+
+    async def set(self, nm_id: int, title: str | None, color: str | None):
+        await self.set_many([(nm_id, title, color)])
 
-            s.add(row)
+    async def set_many(self, rows: list[tuple[int, str | None, str | None]]):
+        """
+        rows: [(nm_id, title, color), ...] — многострочный upsert одной транзакцией.
+        """
+        if not rows:
+            return
+        now = datetime.utcnow()
+        # последняя запись по nmId выигрывает, дубликаты в одном INSERT ломают ON CONFLICT
+        values = {
+            nm_id: {
+                "nm_id": nm_id,
+                "instance_name": self._instance_name,
+                "title": title,
+                "color": color,
+                "updated_at": now,
+            }
+            for nm_id, title, color in rows
+        }
+        async with self._sf() as s:
+            for part in chunked(list(values.values())):
+                await s.execute(upsert_stmt(
+                    s, ProductCache, part,
+                    conflict_cols=["nm_id", "instance_name"],
+                    update_cols=["title", "color", "updated_at"],
+                ))
             await s.commit()
+
+class CachedProductCacheRepo:
+    """
+    In-memory слой перед ProductCacheRepo с тем же интерфейсом (get/get_many/set/set_many).
+    Один экземпляр на аккаунт — общий для поставки, каталога и клонов.
+
+    - LRU с лимитом max_size: память не растёт со временем;
+    - TTL: свежие записи отдаются без БД, устаревшие — отдаются сразу,
+      а в фоне перечитываются из product_cache (stale-while-revalidate);
+    - запись сквозная: в БД и в память.
+    """
+
+    def __init__(self, repo: ProductCacheRepo, max_size: int = 20_000, ttl_sec: float = 3600, stale_ttl_sec: float = 86400):
+        self._repo = repo
+        self._mem = TtlLruCache(max_size=max_size, ttl_sec=ttl_sec, stale_ttl_sec=stale_ttl_sec)
+        self._refreshing: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._log = logging.getLogger("product_cache")
+
+    def stats(self) -> dict[str, int]:
+        return self._mem.stats()
+
+    async def get(self, nm_id: int):
+        return (await self.get_many([nm_id])).get(nm_id)
+
+    async def get_many(self, nm_ids: list[int]) -> dict[int, ProductCache]:
+        result: dict[int, ProductCache] = {}
+        missing: list[int] = []
+        stale: list[int] = []
+        for nm_id in dict.fromkeys(nm_ids):
+            hit = self._mem.get(nm_id)
+            if hit is None:
+                missing.append(nm_id)
+                continue
+            row, is_stale = hit
+            result[nm_id] = row
+            if is_stale:
+                stale.append(nm_id)
+
+        if missing:
+            rows = await self._repo.get_many(missing)
+            for nm_id, row in rows.items():
+                self._mem.set(nm_id, row)
+            result.update(rows)
+
+        if stale:
+            self._schedule_refresh(stale)
+        return result
+
+    async def set(self, nm_id: int, title: str | None, color: str | None):
+        await self.set_many([(nm_id, title, color)])
+
+    async def set_many(self, rows: list[tuple[int, str | None, str | None]]):
+        await self._repo.set_many(rows)
+        now = datetime.utcnow()
+        for nm_id, title, color in rows:
+            self._mem.set(nm_id, ProductCache(nm_id=nm_id, title=title, color=color, updated_at=now))
+
+    def _schedule_refresh(self, nm_ids: list[int]) -> None:
+        todo = [nm_id for nm_id in nm_ids if nm_id not in self._refreshing]
+        if not todo:
+            return
+        self._refreshing.update(todo)
+        task = asyncio.create_task(self._refresh(todo))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, nm_ids: list[int]) -> None:
+        try:
+            rows = await self._repo.get_many(nm_ids)
+            for nm_id, row in rows.items():
+                self._mem.set(nm_id, row)
+        except Exception as e:
+            self._log.warning("product cache refresh failed: %s", e)
+        finally:
+            self._refreshing.difference_update(nm_ids)
@@ -0,0 +1,35 @@
+import json
+from datetime import datetime
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from .models import SyncState
+from .upsert import upsert_stmt
+
+class SyncStateRepo:
+    """
+    Водяные метки инкрементальных синков (курсор Content API и т.п.) по instance_name.
+    """
+    def __init__(self, sf: async_sessionmaker[AsyncSession], instance_name: str = "default"):
+        self._sf = sf
+        self._instance_name = instance_name
+
+    async def get(self, key: str) -> dict | None:
+        async with self._sf() as s:
+            row = await s.get(SyncState, (self._instance_name, key))
+            if not row or not row.cursor:
+                return None
+            return json.loads(row.cursor)
+
+    async def set(self, key: str, cursor: dict | None) -> None:
+        row = {
+            "instance_name": self._instance_name,
+            "key": key,
+            "cursor": json.dumps(cursor) if cursor is not None else None,
+            "updated_at": datetime.utcnow(),
+        }
+        async with self._sf() as s:
+            await s.execute(upsert_stmt(
+                s, SyncState, [row],
+                conflict_cols=["instance_name", "key"],
+                update_cols=["cursor", "updated_at"],
+            ))
+            await s.commit()
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime
+from sqlalchemy import case, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from app.domain.vendorcode import VendorCodeIndex
+from .models import VendorCodeSuffix
+from .upsert import chunked, upsert_stmt
+
+class VendorCodeIndexRepo:
+    """
+    Индекс суффиксов vendorCode аккаунта: словарь в памяти (загружается один раз)
+    + таблица vendor_code_suffix, чтобы занятые (n) переживали рестарт.
+    Засевается синком каталога, обновляется при каждом reserve.
+    """
+
+    def __init__(self, sf: async_sessionmaker[AsyncSession], instance_name: str = "default"):
+        self._sf = sf
+        self._instance_name = instance_name
+        self._index: VendorCodeIndex | None = None
+        self._lock = asyncio.Lock()
+
+    async def _loaded(self) -> VendorCodeIndex:
+        if self._index is None:
+            async with self._sf() as s:
+                res = await s.execute(
+                    select(VendorCodeSuffix.root, VendorCodeSuffix.max_suffix)
+                    .where(VendorCodeSuffix.instance_name == self._instance_name)
+                )
+                self._index = VendorCodeIndex({root: n for root, n in res.all()})
+        return self._index
+
+    async def is_empty(self) -> bool:
+        async with self._lock:
+            return len(await self._loaded()) == 0
+
+    async def knows(self, root: str) -> bool:
+        async with self._lock:
+            return (await self._loaded()).max_suffix(root) is not None
+
+    async def observe_many(self, codes: list[str]) -> int:
+        """
+        Учитывает существующие vendorCode (страница каталога). В БД пишутся только выросшие корни.
+        """
+        async with self._lock:
+            index = await self._loaded()
+            changed = {root for code in codes if code and (root := index.observe(code))}
+            await self._save({root: index.max_suffix(root) for root in changed})
+            return len(changed)
+
+    async def reserve(self, base: str) -> str:
+        """
+        Следующий свободный vendorCode для base ("Redmi 12" → "Redmi 12 (3)"), сразу занятый.
+        """
+        async with self._lock:
+            index = await self._loaded()
+            root, code = index.reserve(base)
+            await self._save({root: index.max_suffix(root)})
+            return code
+
+    async def _save(self, max_suffix: dict[str, int]) -> None:
+        if not max_suffix:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {"instance_name": self._instance_name, "root": root, "max_suffix": n, "updated_at": now}
+            for root, n in max_suffix.items()
+        ]
+        async with self._sf() as s:
+            for part in chunked(rows):
+                # максимум только растёт: параллельный процесс мог уже занять больший (n)
+                await s.execute(upsert_stmt(
+                    s, VendorCodeSuffix, part,
+                    conflict_cols=["instance_name", "root"],
+                    update_cols=["updated_at"],
+                    set_=lambda excluded: {
+                        "max_suffix": case(
+                            (excluded.max_suffix > VendorCodeSuffix.max_suffix, excluded.max_suffix),
+                            else_=VendorCodeSuffix.max_suffix,
+                        ),
+                    },
+                ))
+            await s.commit()
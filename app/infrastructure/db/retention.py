@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from .models import ClaimProcessing, DailySupplyRun, FeedbackClone, Order, Outbox
+
+log = logging.getLogger("db.retention")
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Сроки хранения в днях; 0 — хранить всегда.
+    Оставляем то, что нужно проверкам идемпотентности: заявки, которые ещё могут быть в листинге,
+    сегодняшний запуск поставки, неназначенные заказы.
+    """
+    claims_days: int = 90
+    orders_days: int = 60
+    supply_runs_days: int = 365
+    supply_report_text_days: int = 30  # старше — report_text обнуляется, строка запуска остаётся
+    feedback_clone_days: int = 365
+    outbox_days: int = 14
+    batch_size: int = 500
+    batch_pause_sec: float = 0.05
+    vacuum_pages: int = 2000
+
+async def convert_sqlite_to_incremental_vacuum(engine: AsyncEngine) -> bool:
+    """
+    Разовый перевод SQLite-базы, созданной без auto_vacuum, на INCREMENTAL: PRAGMA + полный VACUUM.
+    VACUUM переписывает весь файл и держит эксклюзивную блокировку до конца — поэтому только по явному
+    запросу (DB_SQLITE_CONVERT_INCREMENTAL_VACUUM при старте), не из плановой джобы.
+    True — если база переведена сейчас.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if (await conn.execute(text("PRAGMA auto_vacuum"))).scalar() == 2:
+            return False
+        log.warning("sqlite: switching to auto_vacuum=INCREMENTAL with a full VACUUM")
+        await conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+        await conn.execute(text("VACUUM"))
+        return True
+
+def _cutoff(now: datetime, days: int, aware: bool) -> datetime:
+    cutoff = now - timedelta(days=days)
+    return cutoff if aware else cutoff.replace(tzinfo=None)
+
+class RetentionJob:
+    """
+    Чистит историю маленькими пачками (каждая пачка — отдельная короткая транзакция,
+    блокировка записи не держится долго), затем для SQLite — incremental VACUUM.
+    Одна джоба на базу: таблицы общие для всех аккаунтов.
+    """
+
+    def __init__(self, sf: async_sessionmaker[AsyncSession], engine: AsyncEngine, policy: RetentionPolicy):
+        self._sf = sf
+        self._engine = engine
+        self._policy = policy
+        self._lock = asyncio.Lock()
+
+    async def run(self) -> dict[str, int]:
+        p = self._policy
+        now = datetime.now(timezone.utc)
+        stats: dict[str, int] = {}
+        async with self._lock:
+            if p.claims_days:
+                stats["claim_processing"] = await self._delete_batched(
+                    ClaimProcessing, ClaimProcessing.processed_at < _cutoff(now, p.claims_days, aware=True),
+                )
+            if p.orders_days:
+                # неназначенные заказы нужны поставке — их не трогаем
+                stats["orders"] = await self._delete_batched(
+                    Order,
+                    Order.supply_id.is_not(None),
+                    Order.updated_at < _cutoff(now, p.orders_days, aware=False),
+                )
+            if p.supply_report_text_days:
+                stats["daily_supply_run.report_text"] = await self._update_batched(
+                    DailySupplyRun,
+                    {"report_text": None},
+                    DailySupplyRun.report_text.is_not(None),
+                    DailySupplyRun.created_at < _cutoff(now, p.supply_report_text_days, aware=True),
+                )
+            if p.supply_runs_days:
+                stats["daily_supply_run"] = await self._delete_batched(
+                    DailySupplyRun, DailySupplyRun.created_at < _cutoff(now, p.supply_runs_days, aware=True),
+                )
+            if p.feedback_clone_days:
+                stats["feedback_clone"] = await self._delete_batched(
+                    FeedbackClone, FeedbackClone.created_at < _cutoff(now, p.feedback_clone_days, aware=True),
+                )
+            if p.outbox_days:
+                # двухнедельный недоставленный отчёт уже никому не нужен — чистим по возрасту
+                stats["outbox"] = await self._delete_batched(
+                    Outbox, Outbox.created_at < _cutoff(now, p.outbox_days, aware=False),
+                )
+            await self._vacuum()
+        log.info("retention done: %s", stats)
+        return stats
+
+    async def _delete_batched(self, model, *where) -> int:
+        pk = list(model.__table__.primary_key.columns)
+        total = 0
+        while True:
+            keys = select(*pk).where(*where).limit(self._policy.batch_size)
+            async with self._sf() as s:
+                res = await s.execute(delete(model).where(tuple_(*pk).in_(keys)))
+                await s.commit()
+            total += res.rowcount or 0
+            if (res.rowcount or 0) < self._policy.batch_size:
+                return total
+            await asyncio.sleep(self._policy.batch_pause_sec)
+
+    async def _update_batched(self, model, values: dict, *where) -> int:
+        pk = list(model.__table__.primary_key.columns)
+        total = 0
+        while True:
+            keys = select(*pk).where(*where).limit(self._policy.batch_size)
+            async with self._sf() as s:
+                res = await s.execute(update(model).where(tuple_(*pk).in_(keys)).values(**values))
+                await s.commit()
+            total += res.rowcount or 0
+            if (res.rowcount or 0) < self._policy.batch_size:
+                return total
+            await asyncio.sleep(self._policy.batch_pause_sec)
+
+    async def _vacuum(self) -> None:
+        if self._engine.dialect.name != "sqlite" or not self._policy.vacuum_pages:
+            return  # PostgreSQL освобождает место autovacuum'ом
+        async with self._engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+            if mode != 2:
+                # полный VACUUM джоба не делает: он надолго блокирует базу (см. convert_sqlite_to_incremental_vacuum)
+                log.info("sqlite auto_vacuum=%s: incremental vacuum skipped, set DB_SQLITE_CONVERT_INCREMENTAL_VACUUM=1 once", mode)
+                return
+            # через cursor.execute PRAGMA incremental_vacuum освобождает одну страницу за шаг —
+            # executescript прогоняет его до конца
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(self._policy.vacuum_pages)});")
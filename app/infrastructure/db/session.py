@@ -1,12 +1,135 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy import text
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
 from .models import Base
+from .migrations import run_migrations
+import logging
+
+log = logging.getLogger("db")
+
+def _sqlite_pragmas(
+    wal: bool,
+    synchronous: str,
+    busy_timeout_ms: int,
+    cache_size_kib: int,
+    mmap_size_mb: int,
+) -> list[str]:
+    pragmas = [f"PRAGMA busy_timeout={int(busy_timeout_ms)}"]
+    if wal:
+        # WAL: читатели не блокируют писателя; при WAL synchronous=NORMAL безопасен для целостности
+        pragmas.append("PRAGMA journal_mode=WAL")
+    if synchronous:
+        pragmas.append(f"PRAGMA synchronous={synchronous.upper()}")
+    if cache_size_kib:
+        pragmas.append(f"PRAGMA cache_size=-{int(cache_size_kib)}")  # отрицательное значение — в KiB
+    if mmap_size_mb:
+        pragmas.append(f"PRAGMA mmap_size={int(mmap_size_mb) * 1024 * 1024}")
+    pragmas.append("PRAGMA temp_store=MEMORY")
+    return pragmas
+
+def make_session_factory(
+    db_url: str,
+    sqlite_wal: bool = True,
+    sqlite_synchronous: str = "NORMAL",
+    sqlite_busy_timeout_ms: int = 5000,
+    sqlite_cache_size_kib: int = 16384,
+    sqlite_mmap_size_mb: int = 128,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout_sec: int = 30,
+    pool_recycle_sec: int = 1800,
+):
+    """
+    Engine + фабрика сессий.
+     - SQLite: PRAGMA на каждое новое соединение (WAL, synchronous, busy_timeout, кэш, mmap);
+       in-memory база живёт в одном соединении — пул не настраиваем.
+     - остальные диалекты: размер пула, recycle и pre_ping.
+    """
+    url = make_url(db_url)
+    is_sqlite = url.get_backend_name() == "sqlite"
+    in_memory = is_sqlite and url.database in (None, "", ":memory:")
+
+    kwargs: dict = {"echo": False}
+    if not in_memory:
+        kwargs.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout_sec,
+            pool_recycle=pool_recycle_sec,
+        )
+    if not is_sqlite:
+        kwargs["pool_pre_ping"] = True
+
+    engine = create_async_engine(db_url, **kwargs)
+
+    if is_sqlite:
+        pragmas = _sqlite_pragmas(
+            wal=sqlite_wal and not in_memory,
+            synchronous=sqlite_synchronous,
+            busy_timeout_ms=sqlite_busy_timeout_ms,
+            cache_size_kib=sqlite_cache_size_kib,
+            mmap_size_mb=sqlite_mmap_size_mb,
+        )
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _on_connect(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            # auto_vacuum меняется только у пустого файла и до journal_mode=WAL; на существующей базе
+            # PRAGMA брал бы блокировку записи на каждом соединении. Старую базу переводит
+            # convert_sqlite_to_incremental_vacuum (retention.py) по явному флагу
+            cur.execute("PRAGMA page_count")
+            if cur.fetchone()[0] == 0:
+                cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            for pragma in pragmas:
+                cur.execute(pragma)
+            cur.close()
 
-def make_session_factory(db_url: str):
-    engine = create_async_engine(db_url, echo=False)
     return async_sessionmaker(engine, expire_on_commit=False), engine
 
+def _create_missing_indexes(sync_conn) -> None:
+    # create_all не трогает уже существующие таблицы — индексы, добавленные позже, доводим сами
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with sync_conn.begin_nested():
+                    index.create(sync_conn, checkfirst=True)
+            except Exception as e:
+                # без уникального индекса ломаются upsert'ы с ON CONFLICT — стартовать нельзя
+                if index.unique:
+                    raise
+                log.warning("index %s not created: %s", index.name, e)
+
+# ключ advisory lock «один процесс бота на базу» (ASCII "WBRB")
+SINGLE_INSTANCE_LOCK_KEY = 0x57425242
+
+async def acquire_single_instance_lock(engine):
+    """
+    PostgreSQL: сессионный advisory lock на отдельном соединении. Джобы (заявки, поставка, outbox,
+    retention) и polling Telegram не рассчитаны на несколько реплик — второй процесс с той же базой
+    не стартует. Возвращает соединение, которое держит lock (отпустить release_single_instance_lock);
+    для SQLite — None.
+    """
+    if engine.dialect.name != "postgresql":
+        return None
+    conn = await engine.connect()
+    # autocommit: иначе соединение висело бы idle in transaction до остановки
+    conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+    got = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SINGLE_INSTANCE_LOCK_KEY})).scalar()
+    if not got:
+        await conn.close()
+        raise RuntimeError("another bot instance is already running against this database")
+    return conn
+
+async def release_single_instance_lock(conn) -> None:
+    if conn is None:
+        return
+    # close() лишь вернёт соединение в пул — сессионный lock нужно снять явно
+    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SINGLE_INSTANCE_LOCK_KEY})
+    await conn.close()
+
 async def init_db(engine) -> None:
     async with engine.begin() as conn:
         await conn.execute(text("SELECT 1"))
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+        await conn.run_sync(_create_missing_indexes)
@@ -0,0 +1,45 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# SQLite держит максимум 32766 параметров на запрос (старые сборки — 999),
+# поэтому многострочные INSERT и IN (...) режем на пачки.
+CHUNK_SIZE = 500
+
+def chunked(items: list, size: int = CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def dialect_insert(session: AsyncSession, model):
+    """
+    INSERT с поддержкой ON CONFLICT под диалект текущей сессии (sqlite / postgresql).
+    """
+    name = session.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Upsert не поддержан для диалекта {name}")
+    return insert(model)
+
+def upsert_stmt(
+    session: AsyncSession,
+    model,
+    rows: list[dict],
+    conflict_cols: list[str],
+    update_cols: list[str],
+    set_: dict | None = None,
+):
+    """
+    INSERT ... VALUES (...), (...) ON CONFLICT (conflict_cols) DO UPDATE SET update_cols = excluded.update_cols
+
+    set_ — выражения сверх update_cols (например, coalesce(excluded.x, table.x)).
+    Для RETURNING: upsert_stmt(...).returning(model).
+    """
+    stmt = dialect_insert(session, model).values(rows)
+    values = {c: stmt.excluded[c] for c in update_cols}
+    if set_:
+        values.update(set_(stmt.excluded) if callable(set_) else set_)
+    return stmt.on_conflict_do_update(
+        index_elements=conflict_cols,
+        set_=values,
+    )
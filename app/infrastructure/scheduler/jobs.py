@@ -1,3 +1,5 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from apscheduler.triggers.cron import CronTrigger
 
 def register_jobs(
@@ -9,6 +11,13 @@ def register_jobs(
     daily_minute: int = 55,
     timezone: str = "Europe/Amsterdam",
     instance_name: str = "default",
+    catalog_sync_usecase=None,
+    catalog_sync_interval_minutes: int = 60,
+    claims_due_queue: bool = False,
+    outbox_dispatcher=None,
+    outbox_interval_sec: int = 15,
+    quality_clone_usecase=None,
+    quality_clone_interval_minutes: int = 30,
 ):
     # Возвраты — interval
     sched.add_job(
@@ -21,6 +30,23 @@ def register_jobs(
         coalesce=True,
     )
 
+    # Очередь созревания заявок — date-джоба на время ближайшей, переставляется после каждого прохода
+    if claims_due_queue:
+        def schedule_due(when: datetime) -> None:
+            sched.add_job(
+                func=returns_usecase.run_due,
+                trigger="date",
+                run_date=max(when, datetime.now(ZoneInfo(timezone))),
+                id=f"{instance_name}.claims_due",
+                replace_existing=True,
+                max_instances=1,
+                misfire_grace_time=None,
+            )
+
+        returns_usecase.set_on_next_due(schedule_due)
+        # первый проход сразу — по очереди, сохранённой до рестарта
+        schedule_due(datetime.now(ZoneInfo(timezone)))
+
     # Ежедневная поставка — cron
     if daily_supply_usecase is not None:
         sched.add_job(
@@ -31,3 +57,53 @@ def register_jobs(
             max_instances=1,
             coalesce=True,
         )
+
+    # Дельта-синк каталога — interval, первый прогон сразу (засеять product_cache)
+    if catalog_sync_usecase is not None:
+        sched.add_job(
+            func=catalog_sync_usecase.run,
+            trigger="interval",
+            minutes=catalog_sync_interval_minutes,
+            next_run_time=datetime.now(ZoneInfo(timezone)),
+            id=f"{instance_name}.catalog_sync",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    # Доставка outbox — interval, первый прогон сразу (хвост, не ушедший до рестарта)
+    if outbox_dispatcher is not None:
+        sched.add_job(
+            func=outbox_dispatcher.run,
+            trigger="interval",
+            seconds=outbox_interval_sec,
+            next_run_time=datetime.now(ZoneInfo(timezone)),
+            id=f"{instance_name}.outbox",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    # Клоны по 1⭐ отзывам — interval, отзывы читаются от водяной метки
+    if quality_clone_usecase is not None:
+        sched.add_job(
+            func=quality_clone_usecase.run,
+            trigger="interval",
+            minutes=quality_clone_interval_minutes,
+            id=f"{instance_name}.quality_clone",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+def register_retention_job(sched, retention_job, interval_hours: int = 24):
+    # Retention — одна джоба на базу (таблицы общие для всех аккаунтов)
+    sched.add_job(
+        func=retention_job.run,
+        trigger="interval",
+        hours=interval_hours,
+        id="db.retention",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
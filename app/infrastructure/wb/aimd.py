@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+
+log = logging.getLogger("wb_aimd")
+
+class AimdLimiter:
+    """
+    Адаптивное окно параллельных запросов (AIMD, как в TCP):
+     - быстрый 2xx — окно растёт аддитивно (+increase за «окно» успешных ответов);
+     - 429 / 5xx / сетевая ошибка / latency выше latency_factor × базовой — окно режется в decrease раз.
+    Базовая latency — EWMA по успешным ответам.
+
+    Использование:
+        async with limiter:
+            r = await client.post(...)
+            limiter.record(r.status_code, r.elapsed.total_seconds())
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial: int | None = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_factor: float = 2.0,
+        name: str = "",
+    ):
+        self._max = max(1, max_limit)
+        self._min = max(1, min(min_limit, self._max))
+        self._limit = float(min(self._max, max(self._min, initial or self._min)))
+        self._increase = increase
+        self._decrease = decrease
+        self._latency_factor = latency_factor
+        self._baseline: float | None = None
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+        self._name = name
+
+    @property
+    def window(self) -> int:
+        return int(self._limit)
+
+    def stats(self) -> dict[str, float | int | None]:
+        return {
+            "window": self.window,
+            "in_flight": self._in_flight,
+            "baseline_latency": round(self._baseline, 3) if self._baseline is not None else None,
+        }
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.window)
+            self._in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, status_code: int | None, latency: float) -> None:
+        """
+        status_code=None — запрос не дошёл (сетевая ошибка/таймаут).
+        """
+        overloaded = status_code is None or status_code == 429 or status_code >= 500
+        slow = (
+            not overloaded
+            and self._baseline is not None
+            and latency > self._baseline * self._latency_factor
+        )
+        if overloaded or slow:
+            self._on_decrease("overload" if overloaded else "latency", status_code, latency)
+            return
+
+        if status_code < 400:
+            self._baseline = latency if self._baseline is None else 0.8 * self._baseline + 0.2 * latency
+            old = self.window
+            self._limit = min(float(self._max), self._limit + self._increase / self._limit)
+            if self.window != old:
+                log.info("%s concurrency window %s → %s (latency=%.2fs)", self._name, old, self.window, latency)
+
+    def _on_decrease(self, reason: str, status_code: int | None, latency: float) -> None:
+        # пачка 429 из одного окна — это один сигнал, режем не чаще раза за базовую latency
+        now = time.monotonic()
+        if now - self._last_decrease < max(self._baseline or 0.0, 1.0):
+            return
+        self._last_decrease = now
+        old = self.window
+        self._limit = max(float(self._min), self._limit * self._decrease)
+        log.info(
+            "%s concurrency window %s → %s (%s, status=%s, latency=%.2fs)",
+            self._name, old, self.window, reason, status_code, latency,
+        )
@@ -1,12 +1,14 @@
 import httpx
 from typing import Any
+from .rate_limit import RateLimiterRegistry, rate_limit_hooks
 
 class WbReturnsClient:
     BASE = "https://returns-api.wildberries.ru"
 
-    def __init__(self, token: str, timeout: float = 20.0):
+    def __init__(self, token: str, timeout: float = 20.0, limiters: RateLimiterRegistry | None = None):
         self._headers = {"Authorization": token}  # WB использует HeaderApiKey (токен) в заголовке
-        self._client = httpx.AsyncClient(timeout=timeout, headers=self._headers)
+        limiter = (limiters or RateLimiterRegistry()).get(token, self.BASE)
+        self._client = httpx.AsyncClient(timeout=timeout, headers=self._headers, event_hooks=rate_limit_hooks(limiter))
 
     async def close(self) -> None:
         await self._client.aclose()
@@ -4,30 +4,52 @@ from typing import Any
 import random
 from typing import Any
 import logging
+from .singleflight import SingleFlight
+from .rate_limit import RateLimiterRegistry, rate_limit_hooks
+from .aimd import AimdLimiter
+from app.domain.vendorcode import split_vendor_code
 
 log = logging.getLogger("wb_content")
 
 class WbContentClient:
     BASE = "https://content-api.wildberries.ru"
 
-    def __init__(self, token: str, timeout: float = 30.0, max_parallel: int = 3):
-        self._client = httpx.AsyncClient(timeout=timeout, headers={"Authorization": token})
-        self._sem = asyncio.Semaphore(max_parallel)
+    def __init__(self, token: str, timeout: float = 30.0, max_parallel: int = 6, limiters: RateLimiterRegistry | None = None):
+        # общий на токен лимитер: темп держим заранее по X-Ratelimit-*, а не только после 429
+        limiter = (limiters or RateLimiterRegistry()).get(token, self.BASE)
+        self._client = httpx.AsyncClient(timeout=timeout, headers={"Authorization": token}, event_hooks=rate_limit_hooks(limiter))
+        # окно параллельных запросов подстраивается под ответы WB; max_parallel — потолок
+        self._aimd = AimdLimiter(max_limit=max_parallel, initial=min(3, max_parallel), name="content")
         self._max_parallel = max_parallel
+        self._flight = SingleFlight()  # одинаковые параллельные поиски → один HTTP-запрос
 
     async def close(self):
         await self._client.aclose()
 
-    async def _post_with_rate_limit_retry(self, url: str, params=None, json=None, max_attempts: int = 6):
+    def concurrency_stats(self) -> dict:
+        return self._aimd.stats()
+
+    async def _post_with_rate_limit_retry(self, url: str, params=None, json=None, max_attempts: int = 6, idempotent: bool = True):
+        """
+        POST с повторами на 429, 5xx и сетевые ошибки. idempotent=False — повтор только на 429
+        (запрос точно не принят); 5xx возвращается, сетевая ошибка пробрасывается сразу.
+        """
         attempt = 0
         base_sleep = 1.0
         while True:
             attempt += 1
             try:
-                r = await self._client.post(url, params=params, json=json)
+                # слот окна держим только на время самого запроса, паузы между попытками — вне окна
+                async with self._aimd:
+                    try:
+                        r = await self._client.post(url, params=params, json=json)
+                    except httpx.RequestError:
+                        self._aimd.record(None, 0.0)
+                        raise
+                    self._aimd.record(r.status_code, r.elapsed.total_seconds())
             except (httpx.RequestError, httpx.ConnectError) as e:
                 log.warning("Content POST request error (attempt %s): %s", attempt, e)
-                if attempt >= max_attempts:
+                if attempt >= max_attempts or not idempotent:
                     raise
                 await asyncio.sleep(min(30, base_sleep * (2 ** (attempt - 1)) + random.random()))
                 continue
@@ -49,7 +71,7 @@ class WbContentClient:
 
             if 500 <= r.status_code < 600:
                 log.warning("Content API 5xx (%s). attempt=%s", r.status_code, attempt)
-                if attempt >= max_attempts:
+                if attempt >= max_attempts or not idempotent:
                     return r
                 await asyncio.sleep(min(30, base_sleep * (2 ** (attempt - 1)) + random.random()))
                 continue
@@ -57,19 +79,155 @@ class WbContentClient:
             return r
 
     async def find_card_by_text(self, text: str, locale: str = "ru", limit: int = 100) -> dict[str, Any]:
+        # /supply_run поверх джобы daily_supply или клон по тому же nmId не тратят лимит повторно
+        return await self._flight.do(
+            ("find_card_by_text", text, locale, limit),
+            lambda: self._find_card_by_text(text, locale, limit),
+        )
+
+    async def _find_card_by_text(self, text: str, locale: str, limit: int) -> dict[str, Any]:
         payload = {
             "settings": {
                 "cursor": {"limit": limit},
                 "filter": {"textSearch": text, "withPhoto": -1},
             }
         }
-        # семафор вокруг запроса: не более N параллельных вызовов
-        async with self._sem:
-            r = await self._post_with_rate_limit_retry(f"{self.BASE}/content/v2/get/cards/list", params={"locale": locale}, json=payload)
+        r = await self._post_with_rate_limit_retry(f"{self.BASE}/content/v2/get/cards/list", params={"locale": locale}, json=payload)
         try:
             r.raise_for_status()
         except Exception:
             # логируем полный ответ для диагностики
             log.warning("Content API error for text=%s status=%s body=%s", text, getattr(r, "status_code", None), getattr(r, "text", "")[:1000])
             raise
-        return r.json()
\ No newline at end of file
+        return r.json()
+
+    async def get_card_by_nm_id(self, nm_id: int, locale: str = "ru") -> dict[str, Any]:
+        """
+        Полная карточка по nmId: textSearch по nmId, из выдачи — карточка с тем же nmID.
+        """
+        data = await self.find_card_by_text(str(nm_id), locale=locale)
+        for card in data.get("cards") or []:
+            if int(card.get("nmID") or 0) == int(nm_id):
+                return card
+        raise LookupError(f"card nmId={nm_id} not found")
+
+    async def find_vendor_codes_like(self, vendor_code: str, locale: str = "ru") -> set[str]:
+        """
+        vendorCode всех карточек, найденных по корню артикула ("Redmi 12 (3)" → "Redmi 12").
+        """
+        root, _ = split_vendor_code(vendor_code)
+        data = await self.find_card_by_text(root, locale=locale)
+        return {c["vendorCode"] for c in data.get("cards") or [] if c.get("vendorCode")}
+
+    async def create_card(
+        self,
+        payload: dict[str, Any],
+        lookup_attempts: int = 3,
+        lookup_delay_sec: float = 2.0,
+        upload_attempts: int = 3,
+    ) -> int | None:
+        """
+        Создаёт карточку через cards/upload — под тем же лимитером и окном AIMD, что и чтение.
+        payload — {"subjectID", "vendorCode", "title", "description", "characteristics", ...}.
+
+        Upload не идемпотентен: вслепую повторяется только 429. После таймаута или 5xx WB мог
+        карточку уже принять — сначала ищем её по vendorCode и шлём заново, только если её нет
+        (иначе второй upload создал бы дубль). Всего не больше upload_attempts отправок.
+
+        WB создаёт карточку асинхронно и nmID в ответе не отдаёт: ищем его по vendorCode
+        до lookup_attempts раз; не появилась — None.
+        """
+        variant = {
+            k: payload[k]
+            for k in ("vendorCode", "title", "description", "brand", "dimensions", "sizes")
+            if payload.get(k) is not None
+        }
+        # в upload характеристики передаются по id, без name
+        variant["characteristics"] = [
+            {"id": c["id"], "value": c["value"]}
+            for c in payload.get("characteristics") or []
+            if c.get("id") is not None
+        ]
+        body = [{"subjectID": payload["subjectID"], "variants": [variant]}]
+        vendor_code = variant["vendorCode"]
+        for attempt in range(1, max(1, upload_attempts) + 1):
+            try:
+                r = await self._post_with_rate_limit_retry(
+                    f"{self.BASE}/content/v2/cards/upload", json=body, idempotent=False,
+                )
+                if r.status_code < 500:
+                    break
+                failure: Exception = httpx.HTTPStatusError(f"cards/upload {r.status_code}", request=r.request, response=r)
+            except httpx.RequestError as e:
+                failure = e
+            # ответа не было или он 5xx — карточка могла создаться: проверяем, прежде чем слать снова
+            nm_id = await self._find_nm_id_by_vendor_code(vendor_code, lookup_attempts, lookup_delay_sec)
+            if nm_id is not None:
+                log.info("card %s was created despite upload failure: %s", vendor_code, failure)
+                return nm_id
+            if attempt >= upload_attempts:
+                log.warning("Content API upload failed vendorCode=%s: %s", vendor_code, failure)
+                raise failure
+            log.warning("card %s not found after upload failure, re-sending: %s", vendor_code, failure)
+        try:
+            r.raise_for_status()
+        except Exception:
+            log.warning("Content API upload error vendorCode=%s status=%s body=%s", vendor_code, getattr(r, "status_code", None), getattr(r, "text", "")[:1000])
+            raise
+        data = r.json()
+        if data.get("error"):
+            raise RuntimeError(f"cards/upload: {data.get('errorText') or data.get('additionalErrors')}")
+
+        nm_id = await self._find_nm_id_by_vendor_code(vendor_code, lookup_attempts, lookup_delay_sec)
+        if nm_id is None:
+            log.info("card %s uploaded, nmID not assigned yet", vendor_code)
+        return nm_id
+
+    async def _find_nm_id_by_vendor_code(self, vendor_code: str, attempts: int, delay_sec: float) -> int | None:
+        for _ in range(attempts):
+            await asyncio.sleep(delay_sec)
+            found = await self.find_card_by_text(vendor_code)
+            for card in found.get("cards") or []:
+                if card.get("vendorCode") == vendor_code and card.get("nmID"):
+                    return int(card["nmID"])
+        return None
+
+    async def list_cards(self, cursor: dict[str, Any] | None = None, locale: str = "ru", limit: int = 100) -> dict[str, Any]:
+        """
+        Одна страница cards/list по курсору. cursor — {"updatedAt": ..., "nmID": ...}
+        из ответа предыдущей страницы (None — с начала каталога).
+        """
+        page_cursor: dict[str, Any] = {"limit": limit}
+        if cursor:
+            page_cursor["updatedAt"] = cursor.get("updatedAt")
+            page_cursor["nmID"] = cursor.get("nmID")
+        payload = {
+            "settings": {
+                "sort": {"ascending": True},
+                "cursor": page_cursor,
+                "filter": {"withPhoto": -1},
+            }
+        }
+        r = await self._post_with_rate_limit_retry(f"{self.BASE}/content/v2/get/cards/list", params={"locale": locale}, json=payload)
+        try:
+            r.raise_for_status()
+        except Exception:
+            log.warning("Content API error for cursor=%s status=%s body=%s", cursor, getattr(r, "status_code", None), getattr(r, "text", "")[:1000])
+            raise
+        return r.json()
+
+    async def iter_cards(self, cursor: dict[str, Any] | None = None, locale: str = "ru", limit: int = 100):
+        """
+        Обходит весь каталог страницами по limit карточек.
+        Отдаёт пары (cards, cursor), где cursor — позиция после этой страницы.
+        Последняя страница — та, где cursor.total < limit.
+        """
+        while True:
+            data = await self.list_cards(cursor, locale=locale, limit=limit)
+            cards = data.get("cards") or []
+            resp_cursor = data.get("cursor") or {}
+            if cards:
+                cursor = {"updatedAt": resp_cursor.get("updatedAt"), "nmID": resp_cursor.get("nmID")}
+            yield cards, cursor
+            if not cards or int(resp_cursor.get("total") or 0) < limit:
+                break
\ No newline at end of file
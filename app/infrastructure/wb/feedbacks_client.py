@@ -1,27 +1,92 @@
 import httpx
+from datetime import datetime
 from typing import Any
+from .rate_limit import RateLimiterRegistry, rate_limit_hooks
+
+# WB не отдаёт отзывы дальше skip=199990; skip здесь нужен только внутри одной секунды createdDate
+MAX_SKIP = 199990
+
+def extract_feedbacks(data: dict[str, Any]) -> list[dict[str, Any]]:
+    # ответ — {"data": {"feedbacks": [...]}}; плоский {"feedbacks": [...]} тоже принимаем
+    inner = data.get("data")
+    if isinstance(inner, dict):
+        return inner.get("feedbacks") or []
+    return data.get("feedbacks") or inner or []
+
+def _created_ts(fb: dict[str, Any]) -> int | None:
+    raw = fb.get("createdDate")
+    if not raw:
+        return None
+    try:
+        return int(datetime.fromisoformat(str(raw).replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return None
 
 class WbFeedbacksClient:
     BASE = "https://feedbacks-api.wildberries.ru"
 
-    def __init__(self, token: str, timeout: float = 30.0):
+    def __init__(self, token: str, timeout: float = 30.0, limiters: RateLimiterRegistry | None = None):
+        limiter = (limiters or RateLimiterRegistry()).get(token, self.BASE)
         self._client = httpx.AsyncClient(
             timeout=timeout,
             headers={"Authorization": token},
+            event_hooks=rate_limit_hooks(limiter),
         )
 
     async def close(self) -> None:
         await self._client.aclose()
 
-    async def list_feedbacks(self, *, is_answered: bool = False, take: int = 500, skip: int = 0) -> dict[str, Any]:
+    async def list_feedbacks(
+        self,
+        *,
+        is_answered: bool = False,
+        take: int = 500,
+        skip: int = 0,
+        date_from: int | None = None,
+        order: str | None = None,
+    ) -> dict[str, Any]:
         # Конкретные параметры могут отличаться; ориентируемся на раздел Feedbacks. :contentReference[oaicite:4]{index=4}
-        r = await self._client.get(
-            f"{self.BASE}/api/v1/feedbacks",
-            params={
-                "isAnswered": str(is_answered).lower(),
-                "take": take,
-                "skip": skip,
-            },
-        )
+        params: dict[str, Any] = {
+            "isAnswered": str(is_answered).lower(),
+            "take": take,
+            "skip": skip,
+        }
+        if date_from is not None:
+            params["dateFrom"] = int(date_from)  # unix-время, включительно
+        if order:
+            params["order"] = order  # "dateAsc" / "dateDesc"
+        r = await self._client.get(f"{self.BASE}/api/v1/feedbacks", params=params)
         r.raise_for_status()
         return r.json()
+
+    async def iter_feedbacks(self, *, is_answered: bool = False, date_from: int | None = None, take: int = 500):
+        """
+        Обходит отзывы от старых к новым страницами по take.
+
+        Следующая страница запрашивается не по skip, а с dateFrom = createdDate последнего отзыва:
+        если отзыв ответили во время обхода, хвост списка сдвигается, и skip перепрыгнул бы через
+        соседний неотвеченный. dateFrom включительный (секунды), поэтому отзывы граничной секунды
+        приходят повторно — их отсекаем по id. skip остаётся только внутри одной секунды,
+        когда вся страница пришлась на неё.
+        """
+        skip = 0
+        boundary: set[str] = set()  # id уже отданных отзывов с createdDate == date_from
+        while skip <= MAX_SKIP:
+            data = await self.list_feedbacks(
+                is_answered=is_answered, take=take, skip=skip, date_from=date_from, order="dateAsc",
+            )
+            feedbacks = extract_feedbacks(data)
+            fresh = [fb for fb in feedbacks if str(fb.get("id")) not in boundary]
+            if fresh:
+                yield fresh
+            if len(feedbacks) < take:
+                break
+            last = _created_ts(feedbacks[-1])
+            if last is None:
+                skip += len(feedbacks)  # без даты двигаться по времени нельзя
+                continue
+            if date_from is None or last > date_from:
+                date_from, skip, boundary = last, 0, set()
+            else:
+                skip += len(feedbacks)  # вся страница в одной секунде
+            boundary |= {str(fb.get("id")) for fb in feedbacks if _created_ts(fb) == date_from}
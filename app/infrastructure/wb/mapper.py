@@ -1,15 +1,41 @@
-from typing import Any
-from app.application.ports import WbReturnsPort
+from typing import Any, AsyncIterator
+import httpx
+from app.application.ports import WbReturnsPort, TransientWbError
 from .client import WbReturnsClient
 
 class WbReturnsAdapter(WbReturnsPort):
-    def __init__(self, client: WbReturnsClient):
+    def __init__(self, client: WbReturnsClient, page_size: int = 200):
         self._client = client
+        self._page_size = page_size
+
+    async def iter_claims(self, is_archive: bool = False) -> AsyncIterator[list[dict[str, Any]]]:
+        """
+        Постраничный обход /api/v1/claims (limit/offset), пока страницы не кончатся.
+        is_archive=True — архив заявок (для бэкфилла).
+        """
+        offset = 0
+        while True:
+            resp = await self._client.get_claims(is_archive=is_archive, limit=self._page_size, offset=offset)
+            claims = resp.get("claims", []) or []
+            if claims:
+                yield claims
+            offset += len(claims)
+            total = resp.get("total")
+            if len(claims) < self._page_size or (total is not None and offset >= int(total)):
+                break
 
     async def get_open_claims(self) -> list[dict[str, Any]]:
-        # можно пагинировать, если total > limit
-        resp = await self._client.get_claims(is_archive=False, limit=200, offset=0)
-        return resp.get("claims", [])
+        claims: list[dict[str, Any]] = []
+        async for page in self.iter_claims(is_archive=False):
+            claims.extend(page)
+        return claims
 
     async def answer_claim(self, claim_id: str, action: str, comment: str | None) -> dict[str, Any]:
-        return await self._client.answer_claim(claim_id, action, comment)
+        try:
+            return await self._client.answer_claim(claim_id, action, comment)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429 or e.response.status_code >= 500:
+                raise TransientWbError(f"HTTP {e.response.status_code}") from e
+            raise
+        except httpx.RequestError as e:
+            raise TransientWbError(f"{type(e).__name__}: {e}") from e
@@ -1,13 +1,36 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass, field
 import httpx
 from typing import Any
+from .rate_limit import RateLimiterRegistry, rate_limit_hooks
+
+log = logging.getLogger("wb_marketplace")
+
+# PATCH .../supplies/{supplyId}/orders принимает за раз до 100 заказов
+ORDERS_PER_REQUEST = 100
+
+@dataclass
+class AddOrdersResult:
+    added: list[int] = field(default_factory=list)
+    failed: dict[int, str] = field(default_factory=dict)  # order_id -> причина
+
+def _is_retryable(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+# отказ по конкретным заказам — пачку есть смысл делить; 401/403/404 и прочее отвергают весь запрос
+_ORDER_REJECT_STATUSES = {400, 409, 422}
 
 class WbMarketplaceClient:
     BASE = "https://marketplace-api.wildberries.ru"
 
-    def __init__(self, token: str, timeout: float = 30.0):
+    def __init__(self, token: str, timeout: float = 30.0, limiters: RateLimiterRegistry | None = None):
+        limiter = (limiters or RateLimiterRegistry()).get(token, self.BASE)
         self._client = httpx.AsyncClient(
             timeout=timeout,
             headers={"Authorization": token},
+            event_hooks=rate_limit_hooks(limiter),
         )
 
     async def close(self) -> None:
@@ -25,11 +48,53 @@ class WbMarketplaceClient:
         r.raise_for_status()
         return r.json()
 
-    async def add_orders_to_supply(self, supply_id: str, order_ids: list[int]) -> dict[str, Any]:
-        # PATCH /api/marketplace/v3/supplies/{supplyId}/orders  :contentReference[oaicite:2]{index=2}
-        r = await self._client.patch(
-            f"{self.BASE}/api/marketplace/v3/supplies/{supply_id}/orders",
-            json={"orders": order_ids[:100]},  # за раз до 100 заказов :contentReference[oaicite:3]{index=3}
-        )
-        r.raise_for_status()
-        return r.json() if r.content else {}
+    async def add_orders_to_supply(
+        self,
+        supply_id: str,
+        order_ids: list[int],
+        max_parallel: int = 3,
+        max_attempts: int = 3,
+    ) -> AddOrdersResult:
+        """
+        Прикрепляет к поставке все заказы: пачками по ORDERS_PER_REQUEST, не больше max_parallel
+        пачек одновременно (темп держит лимитер marketplace). 429/5xx/сеть — повтор с backoff;
+        400/409/422 на пачке — делим её пополам, чтобы найти конкретные отклонённые заказы;
+        остальные 4xx (авторизация, нет поставки) — вся пачка сразу в failed.
+        """
+        result = AddOrdersResult()
+        sem = asyncio.Semaphore(max_parallel)
+
+        async def send(chunk: list[int]) -> None:
+            error = ""
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    async with sem:
+                        # PATCH /api/marketplace/v3/supplies/{supplyId}/orders  :contentReference[oaicite:2]{index=2}
+                        r = await self._client.patch(
+                            f"{self.BASE}/api/marketplace/v3/supplies/{supply_id}/orders",
+                            json={"orders": chunk},
+                        )
+                    if r.status_code < 400:
+                        result.added.extend(chunk)
+                        return
+                    error = f"HTTP {r.status_code}: {r.text[:200]}"
+                    if not _is_retryable(r.status_code):
+                        if r.status_code in _ORDER_REJECT_STATUSES and len(chunk) > 1:
+                            mid = len(chunk) // 2
+                            await asyncio.gather(send(chunk[:mid]), send(chunk[mid:]))
+                            return
+                        break
+                except httpx.RequestError as e:
+                    error = f"{type(e).__name__}: {e}"
+
+                if attempt < max_attempts:
+                    log.warning("add_orders_to_supply %s: chunk of %s failed (%s), retry %s",
+                                supply_id, len(chunk), error, attempt)
+                    await asyncio.sleep(min(30, 2 ** (attempt - 1) + random.random()))
+
+            for order_id in chunk:
+                result.failed[order_id] = error
+
+        chunks = [order_ids[i:i + ORDERS_PER_REQUEST] for i in range(0, len(order_ids), ORDERS_PER_REQUEST)]
+        await asyncio.gather(*(send(c) for c in chunks))
+        return result
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+log = logging.getLogger("wb_rate_limit")
+
+@dataclass(frozen=True)
+class RateLimit:
+    per_sec: float
+    burst: int
+
+# Лимиты из документации WB API (на один токен продавца)
+DEFAULT_LIMITS: dict[str, RateLimit] = {
+    "content-api.wildberries.ru": RateLimit(per_sec=100 / 60, burst=5),
+    "marketplace-api.wildberries.ru": RateLimit(per_sec=300 / 60, burst=20),
+    "returns-api.wildberries.ru": RateLimit(per_sec=20 / 60, burst=10),
+    "feedbacks-api.wildberries.ru": RateLimit(per_sec=3, burst=6),
+}
+FALLBACK_LIMIT = RateLimit(per_sec=1, burst=5)
+
+def _num(v) -> float | None:
+    try:
+        return float(v) if v is not None and str(v).strip() != "" else None
+    except ValueError:
+        return None
+
+class TokenBucket:
+    """
+    Token bucket с резервированием: acquire() сразу забирает токен (баланс может уйти в минус)
+    и один раз спит ровно до момента, когда этот токен «наступит». Так очередь ждущих
+    выстраивается без циклов опроса.
+
+    observe() подстраивает ведро под ответ WB:
+     - X-Ratelimit-Remaining — сервер знает остаток лучше нас, не даём себе больше;
+     - Remaining=0 + X-Ratelimit-Reset — не шлём ничего до сброса окна;
+     - 429 + X-Ratelimit-Retry / Retry-After — пауза на указанное время.
+    """
+
+    def __init__(self, limit: RateLimit, name: str = ""):
+        self._rate = limit.per_sec
+        self._burst = float(limit.burst)
+        self._tokens = float(limit.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._name = name
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens -= 1
+        wait = max(-self._tokens / self._rate, self._blocked_until - now, 0.0)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def observe(self, status_code: int, headers) -> None:
+        now = time.monotonic()
+        self._refill(now)
+
+        remaining = _num(headers.get("X-Ratelimit-Remaining"))
+        reset = _num(headers.get("X-Ratelimit-Reset"))
+        retry = _num(headers.get("X-Ratelimit-Retry") or headers.get("Retry-After"))
+
+        if remaining is not None:
+            self._tokens = min(self._tokens, remaining)
+            if remaining <= 0 and reset:
+                self._blocked_until = max(self._blocked_until, now + reset)
+
+        if status_code == 429:
+            self._tokens = min(self._tokens, 0.0)
+            pause = retry or reset or 1 / self._rate
+            self._blocked_until = max(self._blocked_until, now + pause)
+            log.warning("WB rate limit hit (%s): pause %.1fs", self._name, pause)
+
+class RateLimiterRegistry:
+    """
+    Одно ведро на пару (WB-токен, API-хост). Создаётся один раз в bot.main
+    и передаётся во все клиенты — аккаунты с общим токеном делят лимит.
+    """
+
+    def __init__(self, limits: dict[str, RateLimit] | None = None):
+        self._limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+
+    def get(self, token: str, base_url: str) -> TokenBucket:
+        host = urlparse(base_url).hostname or base_url
+        key = (token, host)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self._limits.get(host, FALLBACK_LIMIT), name=host)
+            self._buckets[key] = bucket
+        return bucket
+
+def rate_limit_hooks(limiter: TokenBucket) -> dict:
+    """
+    event_hooks для httpx.AsyncClient: каждый запрос ждёт токен, каждый ответ подстраивает ведро.
+    """
+    async def on_request(request):
+        await limiter.acquire()
+
+    async def on_response(response):
+        limiter.observe(response.status_code, response.headers)
+
+    return {"request": [on_request], "response": [on_response]}
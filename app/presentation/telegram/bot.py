@@ -1,32 +1,63 @@
 import asyncio
 import os
 from zoneinfo import ZoneInfo
-from app.infrastructure.db.repo_product_cache import ProductCacheRepo
+from app.infrastructure.db.repo_product_cache import ProductCacheRepo, CachedProductCacheRepo
 from aiogram import Bot, Dispatcher
 from app.infrastructure.config import load_settings
 from app.infrastructure.wb.client import WbReturnsClient
 from app.infrastructure.wb.mapper import WbReturnsAdapter
-from app.infrastructure.db.session import make_session_factory, init_db
+from app.infrastructure.db.session import (
+    make_session_factory, init_db, acquire_single_instance_lock, release_single_instance_lock,
+)
 from app.infrastructure.db.repo import ClaimsRepo
+from app.infrastructure.db.repo_claim_due import ClaimDueRepo
 from app.domain.rules import AutoRejectRule
 from app.application.usecases import ProcessClaimsUseCase
+from app.application.digest import NotificationDigest
 from app.infrastructure.scheduler.scheduler import make_scheduler
-from app.infrastructure.scheduler.jobs import register_jobs
+from app.infrastructure.scheduler.jobs import register_jobs, register_retention_job
 from .handlers import setup_handlers
 from app.presentation.telegram.notifier import TelegramNotifier
+from app.presentation.telegram.send_queue import TelegramSendQueue
 from app.infrastructure.db.repo_orders import OrderRepo
 from app.infrastructure.wb.marketplace_client import WbMarketplaceClient
 from app.infrastructure.wb.content_client import WbContentClient
+from app.infrastructure.wb.feedbacks_client import WbFeedbacksClient
+from app.infrastructure.wb.rate_limit import RateLimiterRegistry
 from app.infrastructure.db.repo_daily_supply import DailySupplyRepo
+from app.infrastructure.db.repo_sync_state import SyncStateRepo
+from app.infrastructure.db.repo_outbox import OutboxRepo
+from app.infrastructure.db.repo_feedback_clone import FeedbackCloneRepo
+from app.infrastructure.db.repo_vendor_code_index import VendorCodeIndexRepo
+from app.infrastructure.db.retention import RetentionJob, RetentionPolicy, convert_sqlite_to_incremental_vacuum
 from app.application.usecases_daily_supply import CreateDailySupplyUseCase
+from app.application.usecases_catalog_sync import SyncProductCatalogUseCase
+from app.application.usecases_outbox import DispatchOutboxUseCase
+from app.application.usecases_quality_clone import CloneOnOneStarFeedbackUseCase
 import logging
 logging.basicConfig(level=logging.INFO)
 async def main():
     settings = load_settings()
 
     # --- DB ---
-    sf, engine = make_session_factory(settings.db_url)
+    sf, engine = make_session_factory(
+        settings.db_url,
+        sqlite_wal=settings.db_sqlite_wal,
+        sqlite_synchronous=settings.db_sqlite_synchronous,
+        sqlite_busy_timeout_ms=settings.db_sqlite_busy_timeout_ms,
+        sqlite_cache_size_kib=settings.db_sqlite_cache_size_kib,
+        sqlite_mmap_size_mb=settings.db_sqlite_mmap_size_mb,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout_sec=settings.db_pool_timeout_sec,
+        pool_recycle_sec=settings.db_pool_recycle_sec,
+    )
+    # один процесс бота на базу: джобы и polling не координируются между репликами
+    instance_lock = await acquire_single_instance_lock(engine)
     await init_db(engine)
+    if settings.db_sqlite_convert_incremental_vacuum:
+        # до старта джоб и polling: VACUUM держит базу заблокированной
+        await convert_sqlite_to_incremental_vacuum(engine)
 
     # --- Scheduler ---
     scheduler = make_scheduler(settings.daily_supply_tz)
@@ -35,33 +66,68 @@ async def main():
     # 🚨 Telegram создаётся ОДИН раз
     first_account = settings.accounts[0]
     bot = Bot(token=first_account.telegram_token)
+    # и очередь отправки одна на Bot — flood-лимиты считаются на бота
+    send_queue = TelegramSendQueue(bot)
     dp = Dispatcher()
 
     # registry всех аккаунтов
     accounts_registry = {}
 
+    # лимитеры WB API: одно ведро на (токен, хост), общее для всех клиентов
+    limiters = RateLimiterRegistry()
+
     for acct in settings.accounts:
         instance_name = acct.name
 
-        notifier = TelegramNotifier(bot=bot, admin_ids=acct.admin_ids)
+        notifier = TelegramNotifier(bot=bot, admin_ids=acct.admin_ids, send_queue=send_queue)
 
         # --- WB clients ---
-        wb_client = WbReturnsClient(acct.wb_token)
+        wb_client = WbReturnsClient(acct.wb_token, limiters=limiters)
         wb_adapter = WbReturnsAdapter(wb_client)
 
-        mp_client = WbMarketplaceClient(acct.wb_token)
-        content_client = WbContentClient(acct.wb_token)
+        mp_client = WbMarketplaceClient(acct.wb_token, limiters=limiters)
+        content_client = WbContentClient(
+            acct.wb_token,
+            max_parallel=settings.wb_content_max_parallel,
+            limiters=limiters,
+        )
+        feedbacks_client = WbFeedbacksClient(acct.wb_token, limiters=limiters)
 
         # --- repos ---
-        claims_repo = ClaimsRepo(sf, instance_name=instance_name)
+        claims_repo = ClaimsRepo(
+            sf,
+            instance_name=instance_name,
+            flush_max_pending=settings.claims_flush_max_pending,
+            flush_interval_sec=settings.claims_flush_interval_sec,
+        )
         order_repo = OrderRepo(sf, instance_name=instance_name)
-        product_cache_repo = ProductCacheRepo(sf, instance_name=instance_name)
+        # один in-memory кэш названий на аккаунт — его делят поставка, каталог и клоны
+        product_cache_repo = CachedProductCacheRepo(
+            ProductCacheRepo(sf, instance_name=instance_name),
+            max_size=settings.product_cache_max_size,
+            ttl_sec=settings.product_cache_ttl_sec,
+            stale_ttl_sec=settings.product_cache_stale_sec,
+        )
+        claim_due_repo = ClaimDueRepo(sf, instance_name=instance_name)
         daily_repo = DailySupplyRepo(sf, instance_name=instance_name)
+        outbox_repo = OutboxRepo(sf, instance_name=instance_name)
+        sync_state_repo = SyncStateRepo(sf, instance_name=instance_name)
+        # индекс суффиксов vendorCode нужен только клонам; засевается синком каталога
+        vendor_code_index = VendorCodeIndexRepo(sf, instance_name=instance_name) if settings.quality_clone_enabled else None
 
         # --- rules ---
         rule = AutoRejectRule(delay_days=settings.delay_days)
 
         # --- usecases ---
+        returns_digest = (
+            NotificationDigest(
+                notifier,
+                title=f"WB Returns [{instance_name}]",
+                window_sec=settings.returns_digest_window_sec,
+            )
+            if settings.returns_notify_digest
+            else None
+        )
         returns_usecase = ProcessClaimsUseCase(
             wb=wb_adapter,
             repo=claims_repo,
@@ -69,6 +135,17 @@ async def main():
             default_comment=settings.default_reject_comment,
             enabled=settings.enabled,
             notifier=notifier,
+            max_parallel=settings.returns_max_parallel,
+            digest=returns_digest,
+            due_repo=claim_due_repo if settings.claims_due_queue else None,
+        )
+
+        catalog_sync_usecase = SyncProductCatalogUseCase(
+            content_client=content_client,
+            product_cache_repo=product_cache_repo,
+            instance_name=instance_name,
+            sync_state_repo=sync_state_repo,
+            vendor_code_index=vendor_code_index,
         )
 
         daily_supply_usecase = CreateDailySupplyUseCase(
@@ -79,42 +156,101 @@ async def main():
             tz=settings.daily_supply_tz,
             enabled=True,
             product_cache_repo=product_cache_repo,
+            instance_name=instance_name,
+            local_catalog=True,
+            outbox=settings.outbox_enabled,
+        )
+
+        # клон читает и создаёт карточки тем же content_client — общий лимитер и окно AIMD
+        quality_clone_usecase = CloneOnOneStarFeedbackUseCase(
+            feedbacks=feedbacks_client,
+            cards_reader=content_client,
+            cards_writer=content_client,
+            clone_repo=FeedbackCloneRepo(sf, instance_name=instance_name),
+            notifier=notifier,
+            enabled=settings.quality_clone_enabled,
+            product_cache=product_cache_repo,
+            sync_state_repo=sync_state_repo,
+            max_parallel=settings.quality_clone_max_parallel,
+            initial_lookback_hours=settings.quality_clone_initial_lookback_hours,
+            vendor_code_index=vendor_code_index,
+        )
+
+        outbox_dispatcher = DispatchOutboxUseCase(
+            outbox_repo=outbox_repo,
+            notifier=notifier,
+            instance_name=instance_name,
+            max_attempts=settings.outbox_max_attempts,
         )
 
         # сохраняем в registry
         accounts_registry[instance_name] = {
             "returns": returns_usecase,
             "daily": daily_supply_usecase,
+            "catalog": catalog_sync_usecase,
             "repo": daily_repo,
+            "product_cache": product_cache_repo,
             "admins": set(acct.admin_ids),
-            "clients": (mp_client, content_client),
+            "clients": (mp_client, content_client, feedbacks_client),
+            "digest": returns_digest,
         }
 
         # scheduler jobs
         register_jobs(
             scheduler,
             returns_usecase=returns_usecase,
-            returns_interval_minutes=settings.interval_minutes,
+            returns_interval_minutes=(
+                settings.claims_poll_interval_minutes if settings.claims_due_queue else settings.interval_minutes
+            ),
             daily_supply_usecase=daily_supply_usecase,
             daily_hour=settings.daily_supply_hour,
             daily_minute=settings.daily_supply_minute,
             timezone=settings.timezone,
             instance_name=instance_name,
+            catalog_sync_usecase=catalog_sync_usecase,
+            catalog_sync_interval_minutes=settings.catalog_sync_interval_minutes,
+            claims_due_queue=settings.claims_due_queue,
+            outbox_dispatcher=outbox_dispatcher if settings.outbox_enabled else None,
+            outbox_interval_sec=settings.outbox_interval_sec,
+            quality_clone_usecase=quality_clone_usecase if settings.quality_clone_enabled else None,
+            quality_clone_interval_minutes=settings.quality_clone_interval_minutes,
         )
 
+    if settings.retention_enabled:
+        retention_job = RetentionJob(
+            sf,
+            engine,
+            RetentionPolicy(
+                claims_days=settings.retention_claims_days,
+                orders_days=settings.retention_orders_days,
+                supply_runs_days=settings.retention_supply_runs_days,
+                supply_report_text_days=settings.retention_supply_report_text_days,
+                feedback_clone_days=settings.retention_feedback_clone_days,
+                outbox_days=settings.retention_outbox_days,
+                batch_size=settings.retention_batch_size,
+            ),
+        )
+        register_retention_job(scheduler, retention_job, interval_hours=settings.retention_interval_hours)
+
     # handlers получают registry
     setup_handlers(dp, accounts_registry)
 
     try:
         await dp.start_polling(bot)
     finally:
+        # новые запуски джоб не начинаем; дайджесты отправляем сразу, иначе открытое окно пропадёт
+        scheduler.shutdown(wait=False)
+        for acc in accounts_registry.values():
+            if acc["digest"] is not None:
+                await acc["digest"].close()
+        await send_queue.join()
         await bot.session.close()
 
         for acc in accounts_registry.values():
-            mp, content = acc["clients"]
-            await mp.close()
-            await content.close()
+            for client in acc["clients"]:
+                await client.close()
 
+        await release_single_instance_lock(instance_lock)
         await engine.dispose()
 
 if __name__ == "__main__":
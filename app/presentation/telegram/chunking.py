@@ -0,0 +1,64 @@
+import csv
+import io
+from dataclasses import dataclass
+from aiogram.types import BufferedInputFile
+from app.application.digest import MAX_MESSAGE_LEN, chunk_lines
+
+# длиннее — отправляем файлом: пара сообщений читается, десяток — уже нет
+MAX_CHUNKS = 3
+# лимит подписи к документу в Telegram — 1024 символа
+MAX_CAPTION_LEN = 1000
+
+@dataclass
+class LongMessage:
+    parts: list[str]  # сообщения по порядку (при документе — пусто)
+    document: BufferedInputFile | None = None
+    caption: str | None = None
+
+def split_message(text: str, max_len: int = MAX_MESSAGE_LEN) -> list[str]:
+    """
+    Режет текст на сообщения по границам строк; строку длиннее max_len — на куски по max_len.
+    """
+    lines: list[str] = []
+    for line in text.split("\n"):
+        while len(line) > max_len:
+            lines.append(line[:max_len])
+            line = line[max_len:]
+        lines.append(line)
+    return chunk_lines(lines, max_len) or [""]
+
+def lines_to_csv(lines: list[str], sep: str = " — ") -> str:
+    """
+    Строки отчёта вида «Название — 3» → CSV (name;qty). Остальные строки уходят одной колонкой.
+    """
+    buf = io.StringIO()
+    w = csv.writer(buf, delimiter=";")
+    w.writerow(["name", "qty"])
+    for line in lines:
+        if not line.strip():
+            continue
+        name, found, qty = line.rpartition(sep)
+        w.writerow([name, qty] if found else [line])
+    return buf.getvalue()
+
+def prepare_long_message(
+    text: str,
+    filename: str = "report.txt",
+    max_chunks: int = MAX_CHUNKS,
+    max_len: int = MAX_MESSAGE_LEN,
+    document_text: str | None = None,
+) -> LongMessage:
+    """
+    До max_chunks сообщений — отправляем частями; больше — одним документом с заголовком в подписи.
+    document_text — содержимое файла, если оно отличается от текста (например, CSV).
+    """
+    parts = split_message(text, max_len)
+    if len(parts) <= max_chunks:
+        return LongMessage(parts=parts)
+
+    head = text.split("\n\n", 1)[0]
+    caption = f"{head}\n\n(полный отчёт во вложении: {text.count(chr(10)) + 1} строк)"
+    if len(caption) > MAX_CAPTION_LEN:
+        caption = caption[: MAX_CAPTION_LEN - 1] + "…"
+    data = (document_text if document_text is not None else text).encode("utf-8")
+    return LongMessage(parts=[], document=BufferedInputFile(data, filename=filename), caption=caption)
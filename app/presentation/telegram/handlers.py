@@ -1,17 +1,31 @@
 from aiogram import Router, F, Dispatcher
 from aiogram.types import Message
+from .chunking import lines_to_csv, prepare_long_message
 
 
 def _is_admin(message: Message, admin_ids: set[int]) -> bool:
     return message.from_user and message.from_user.id in admin_ids
 
 
+async def _answer_long(m: Message, text: str, filename: str, document_text: str | None = None) -> None:
+    """
+    Ответ без обрезки: частями по границам строк, а если частей много — файлом.
+    """
+    msg = prepare_long_message(text, filename=filename, document_text=document_text)
+    if msg.document is not None:
+        await m.answer_document(msg.document, caption=msg.caption)
+        return
+    for part in msg.parts:
+        await m.answer(part)
+
+
 def setup_handlers(dp: Dispatcher, accounts_registry: dict):
     """
     accounts_registry = {
         "acc1": {
             "returns": usecase,
             "daily": daily_usecase,
+            "catalog": catalog_sync_usecase,
             "repo": repo,
             "admins": set(...)
         }
@@ -84,8 +98,40 @@ def setup_handlers(dp: Dispatcher, accounts_registry: dict):
 
         res = await acc["daily"].run()
 
+        await _answer_long(
+            m,
+            f"{name} supply:\n" + "\n".join(res.lines),
+            filename=f"{name}_supply.csv",
+            document_text=lines_to_csv(res.lines),
+        )
+
+    # --- catalog sync ---
+    @router.message(F.text.startswith("/catalog_sync"))
+    async def catalog_sync(m: Message):
+        parts = m.text.split()
+
+        if len(parts) < 2:
+            await m.answer("Используй: /catalog_sync ACCOUNT [full]")
+            return
+
+        name = parts[1]
+        acc = _get_account(name)
+
+        if not acc or "catalog" not in acc:
+            await m.answer("Аккаунт не найден")
+            return
+
+        if not _is_admin(m, acc["admins"]):
+            return
+
+        full = len(parts) > 2 and parts[2] == "full"
+        res = await acc["catalog"].run(full=full)
+
         await m.answer(
-            f"{name} supply:\n" + "\n".join(res.lines)
+            f"{name} каталог:\n"
+            f"Страниц: {res.pages}\n"
+            f"Карточек: {res.cards}\n"
+            f"Сохранено: {res.saved}"
         )
 
     # --- last supply ---
@@ -113,11 +159,6 @@ def setup_handlers(dp: Dispatcher, accounts_registry: dict):
             await m.answer("Нет данных")
             return
 
-        text = row.report_text
-
-        if len(text) <= 3800:
-            await m.answer(text)
-        else:
-            await m.answer(text[:3800] + "\n...\n(обрезано)")
+        await _answer_long(m, row.report_text, filename=f"{name}_last_supply.txt")
 
     dp.include_router(router)
\ No newline at end of file
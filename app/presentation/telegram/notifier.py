@@ -1,16 +1,76 @@
 from aiogram import Bot
+import asyncio
 import logging
+from collections.abc import Collection
+from .chunking import LongMessage, MAX_CHUNKS, prepare_long_message
+from .send_queue import TelegramSendQueue, is_permanent_failure
 
 
 class TelegramNotifier:
-    def __init__(self, bot: Bot, admin_ids: list[int]):
+    def __init__(
+        self,
+        bot: Bot,
+        admin_ids: list[int],
+        send_queue: TelegramSendQueue | None = None,
+        max_chunks: int = MAX_CHUNKS,
+    ):
         self._bot = bot
         self._admin_ids = admin_ids
+        # с очередью — рассылка параллельная, с учётом flood-лимитов, и вызывающий её не ждёт
+        self._queue = send_queue
+        # длинный текст режется по строкам; больше max_chunks частей — уходит файлом
+        self._max_chunks = max_chunks
 
     async def notify_admins(self, text: str):
+        msg = prepare_long_message(text, max_chunks=self._max_chunks)
+        if self._queue is not None:
+            for admin in self._admin_ids:
+                self._enqueue(admin, msg)
+            return
         for admin in self._admin_ids:
             try:
-                await self._bot.send_message(admin, text)
+                await self._send_direct(admin, msg)
             except Exception as e:
                 # логируем, но не падаем
-                logging.getLogger("notifier").exception("notify_admins failed: %s", e)
\ No newline at end of file
+                logging.getLogger("notifier").exception("notify_admins failed: %s", e)
+
+    async def deliver(self, text: str, skip: Collection[int] = ()) -> dict[int, bool | None]:
+        """
+        Доставка с подтверждением (для outbox): шлёт всем админам, кроме skip, и ждёт результата.
+        По каждому chat_id: True — доставлено, False — не вышло (повторить),
+        None — не выйдет никогда (бот заблокирован, чата нет) — повторять незачем.
+        """
+        msg = prepare_long_message(text, max_chunks=self._max_chunks)
+        admins = [admin for admin in self._admin_ids if admin not in skip]
+        if self._queue is not None:
+            per_admin = [asyncio.gather(*self._enqueue(admin, msg)) for admin in admins]
+            results = await asyncio.gather(*per_admin)
+            return {admin: _merge(parts) for admin, parts in zip(admins, results)}
+        report: dict[int, bool | None] = {}
+        for admin in admins:
+            try:
+                await self._send_direct(admin, msg)
+                report[admin] = True
+            except Exception as e:
+                report[admin] = None if is_permanent_failure(e) else False
+                logging.getLogger("notifier").warning("deliver to %s failed: %s", admin, e)
+        return report
+
+    def _enqueue(self, chat_id: int, msg: LongMessage) -> list[asyncio.Future]:
+        # части ставятся подряд — очередь чата сохраняет порядок
+        if msg.document is not None:
+            return [self._queue.send_document(chat_id, msg.document, caption=msg.caption)]
+        return [self._queue.send_message(chat_id, part) for part in msg.parts]
+
+    async def _send_direct(self, chat_id: int, msg: LongMessage) -> None:
+        if msg.document is not None:
+            await self._bot.send_document(chat_id, msg.document, caption=msg.caption)
+            return
+        for part in msg.parts:
+            await self._bot.send_message(chat_id, part)
+
+def _merge(parts: list[bool | None]) -> bool | None:
+    # сообщение из нескольких частей доставлено, только если дошли все
+    if any(p is None for p in parts):
+        return None
+    return all(parts)
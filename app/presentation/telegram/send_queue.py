@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from collections import deque
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from app.infrastructure.wb.rate_limit import RateLimit, TokenBucket
+
+log = logging.getLogger("tg_send_queue")
+
+# лимиты Bot API: ~30 сообщений/с на бота, ~1/с в один чат (короткий всплеск допускается)
+GLOBAL_LIMIT = RateLimit(per_sec=30, burst=30)
+PER_CHAT_LIMIT = RateLimit(per_sec=1, burst=3)
+
+def is_permanent_failure(exc: BaseException) -> bool:
+    """
+    Ошибка, после которой в этот чат слать бессмысленно: бот заблокирован, чата нет.
+    """
+    if isinstance(exc, TelegramForbiddenError):
+        return True
+    return isinstance(exc, TelegramBadRequest) and "chat not found" in str(exc).lower()
+
+class TelegramSendQueue:
+    """
+    Общая очередь отправки для одного Bot.
+     - у каждого чата своя FIFO и свой обработчик: чаты шлются параллельно, порядок внутри чата сохраняется;
+     - общее ведро держит глобальный лимит бота, ведро чата — лимит на чат;
+     - TelegramRetryAfter — пауза всей очереди на retry_after и повтор того же сообщения.
+
+    send_message()/send_document() ставят в очередь и сразу возвращают Future: True — доставлено,
+    False — не доставлено, None — и не будет (is_permanent_failure); ждать его не обязательно.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        global_limit: RateLimit = GLOBAL_LIMIT,
+        per_chat_limit: RateLimit = PER_CHAT_LIMIT,
+        max_attempts: int = 5,
+    ):
+        self._bot = bot
+        self._global = TokenBucket(global_limit, name="telegram")
+        self._per_chat_limit = per_chat_limit
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._queues: dict[int, deque] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._max_attempts = max(1, max_attempts)
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        return self._enqueue(chat_id, "send_message", text, kwargs)
+
+    def send_document(self, chat_id: int, document, **kwargs) -> asyncio.Future:
+        return self._enqueue(chat_id, "send_document", document, kwargs)
+
+    @property
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _enqueue(self, chat_id: int, method: str, payload, kwargs: dict) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(chat_id, deque()).append((method, payload, kwargs, fut))
+        if chat_id not in self._workers:
+            task = asyncio.create_task(self._drain_chat(chat_id))
+            self._workers[chat_id] = task
+        return fut
+
+    async def join(self) -> None:
+        """
+        Дождаться отправки всего, что уже в очереди (остановка бота, тесты).
+        """
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    async def _drain_chat(self, chat_id: int) -> None:
+        queue = self._queues[chat_id]
+        bucket = self._chat_buckets.setdefault(chat_id, TokenBucket(self._per_chat_limit, name=f"chat {chat_id}"))
+        try:
+            while queue:
+                method, payload, kwargs, fut = queue.popleft()
+                ok = await self._send(chat_id, bucket, method, payload, kwargs)
+                if not fut.done():
+                    fut.set_result(ok)
+        finally:
+            # между опустевшей очередью и этим местом await нет — новое сообщение запустит новый обработчик
+            self._workers.pop(chat_id, None)
+
+    async def _send(self, chat_id: int, bucket: TokenBucket, method: str, payload, kwargs: dict) -> bool | None:
+        for attempt in range(1, self._max_attempts + 1):
+            await bucket.acquire()
+            await self._global.acquire()
+            try:
+                await getattr(self._bot, method)(chat_id, payload, **kwargs)
+                return True
+            except TelegramRetryAfter as e:
+                # flood control касается всего бота — тормозим обе очереди
+                self._global.observe(429, {"Retry-After": e.retry_after})
+                bucket.observe(429, {"Retry-After": e.retry_after})
+                log.warning("telegram flood control (chat %s): retry after %ss, attempt %s", chat_id, e.retry_after, attempt)
+            except Exception as e:
+                if is_permanent_failure(e):
+                    log.warning("telegram %s to %s rejected permanently: %s", method, chat_id, e)
+                    return None
+                # логируем, но не падаем
+                log.exception("telegram %s to %s failed: %s", method, chat_id, e)
+                return False
+        log.error("telegram %s to %s dropped after %s attempts", method, chat_id, self._max_attempts)
+        return False
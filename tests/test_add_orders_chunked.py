@@ -0,0 +1,106 @@
+import json
+import pytest
+import respx
+import httpx
+
+from app.infrastructure.wb import marketplace_client
+from app.infrastructure.wb.marketplace_client import WbMarketplaceClient, AddOrdersResult
+from app.application.usecases_daily_supply import CreateDailySupplyUseCase
+
+pytestmark = pytest.mark.asyncio
+
+URL = "https://marketplace-api.wildberries.ru/api/marketplace/v3/supplies/SUP-1/orders"
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    async def fast_sleep(_):
+        return None
+    monkeypatch.setattr(marketplace_client.asyncio, "sleep", fast_sleep)
+
+@respx.mock
+async def test_orders_are_sent_in_chunks_with_retry_and_bisect():
+    sent = []
+    flaky = {"left": 1}
+
+    def handler(request: httpx.Request):
+        chunk = json.loads(request.content)["orders"]
+        sent.append(len(chunk))
+        if 150 in chunk and flaky["left"]:
+            flaky["left"] -= 1
+            return httpx.Response(503)
+        if 777 in chunk:
+            return httpx.Response(409, json={"code": "FailedToAddSupplyOrder"})
+        return httpx.Response(204)
+
+    respx.patch(URL).mock(side_effect=handler)
+    client = WbMarketplaceClient("test")
+
+    order_ids = list(range(1, 251)) + [777]
+    res = await client.add_orders_to_supply("SUP-1", order_ids)
+    await client.close()
+
+    assert isinstance(res, AddOrdersResult)
+    assert max(sent) == 100
+    assert sorted(res.added) == list(range(1, 251))
+    assert list(res.failed) == [777]
+    assert "409" in res.failed[777]
+
+class PartialMP:
+    async def get_new_orders(self):
+        return {
+            "orders": [
+                {"id": 1, "nmId": 111, "quantity": 2, "offerName": "Samsung A25 Black"},
+                {"id": 2, "nmId": 222, "quantity": 3, "offerName": "Redmi 12 Blue"},
+            ]
+        }
+    async def create_supply(self, name):
+        return {"id": "SUP-1"}
+    async def add_orders_to_supply(self, supply_id, order_ids):
+        return AddOrdersResult(added=[1], failed={2: "HTTP 409"})
+
+class NoContent:
+    async def find_card_by_text(self, text, locale="ru"):
+        return {"cards": []}
+
+class SpyRepo:
+    def __init__(self): self.saved = None
+    async def already_ran(self, day_key): return False
+    async def mark_ok(self, day_key, supply_id, created_at, order_count, report_text):
+        self.saved = {"order_count": order_count, "report_text": report_text}
+
+class FakeNotifier:
+    async def notify_admins(self, text): pass
+
+async def test_report_counts_only_attached_orders():
+    repo = SpyRepo()
+    uc = CreateDailySupplyUseCase(
+        marketplace_client=PartialMP(),
+        content_client=NoContent(),
+        daily_repo=repo,
+        notifier=FakeNotifier(),
+        tz="Europe/Moscow",
+        enabled=True,
+    )
+
+    res = await uc.run()
+
+    assert res.total_qty == 2
+    assert repo.saved["order_count"] == 1
+    assert "Не добавлены в поставку: 1" in repo.saved["report_text"]
+
+@respx.mock
+async def test_auth_error_fails_whole_chunk_without_bisect():
+    sent = []
+
+    def handler(request: httpx.Request):
+        sent.append(len(json.loads(request.content)["orders"]))
+        return httpx.Response(401, json={"title": "unauthorized"})
+
+    respx.patch(URL).mock(side_effect=handler)
+    client = WbMarketplaceClient("test")
+    res = await client.add_orders_to_supply("SUP-1", list(range(1, 301)))
+    await client.close()
+
+    assert sent == [100, 100, 100]
+    assert res.added == []
+    assert len(res.failed) == 300 and "401" in res.failed[1]
@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+
+from app.infrastructure.wb.aimd import AimdLimiter
+
+def test_window_grows_additively_on_fast_success():
+    lim = AimdLimiter(max_limit=5, initial=2)
+
+    for _ in range(2):
+        lim.record(200, 0.1)
+    assert lim.window == 2  # +0.5 за ответ при окне 2
+
+    for _ in range(10):
+        lim.record(200, 0.1)
+    assert lim.window == 5  # упёрлись в потолок
+
+def test_window_halves_on_429_and_on_latency_spike(monkeypatch):
+    from app.infrastructure.wb import aimd
+    clock = {"now": 100.0}
+    monkeypatch.setattr(aimd.time, "monotonic", lambda: clock["now"])
+
+    lim = AimdLimiter(max_limit=8, initial=8)
+    lim.record(200, 0.2)
+
+    lim.record(429, 0.2)
+    assert lim.window == 4
+    lim.record(429, 0.2)
+    assert lim.window == 4  # та же волна 429 — режем один раз
+
+    clock["now"] += 5
+    lim.record(200, 1.5)  # latency > 2× базовой
+    assert lim.window == 2
+
+    clock["now"] += 5
+    lim.record(None, 0.0)
+    lim.record(503, 0.1)
+    assert lim.window == 1
+
+@pytest.mark.asyncio
+async def test_in_flight_never_exceeds_window():
+    lim = AimdLimiter(max_limit=3, initial=2)
+    active = {"now": 0, "max": 0}
+
+    async def job():
+        async with lim:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+
+    await asyncio.gather(*(job() for _ in range(10)))
+
+    assert active["max"] == 2
+    assert lim.stats()["in_flight"] == 0
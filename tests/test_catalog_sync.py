@@ -0,0 +1,167 @@
+import pytest
+
+from app.application.usecases_catalog_sync import SyncProductCatalogUseCase
+from app.application.usecases_daily_supply import CreateDailySupplyUseCase
+from app.domain.vendorcode import VendorCodeIndex
+
+pytestmark = pytest.mark.asyncio
+
+def _card(nm_id: int, title: str, color: str):
+    return {"nmID": nm_id, "title": title, "characteristics": [{"name": "Цвет", "value": [color]}]}
+
+class PagedContentClient:
+    """Каталог из трёх карточек, отдаётся страницами по 2."""
+    def __init__(self):
+        self.pages_requested = 0
+        self.text_calls = []
+        self.cards = [
+            _card(111, "Samsung Galaxy A25", "black"),
+            _card(222, "Redmi 12", "blue"),
+            _card(333, "Samsung Galaxy A15", "white"),
+        ]
+
+    async def iter_cards(self, cursor=None, locale="ru", limit=100):
+        limit = 2
+        start = 0
+        if cursor:
+            start = [c["nmID"] for c in self.cards].index(cursor["nmID"]) + 1
+        for i in range(start, len(self.cards), limit):
+            self.pages_requested += 1
+            page = self.cards[i:i + limit]
+            yield page, {"updatedAt": f"t{i}", "nmID": page[-1]["nmID"]}
+
+    async def find_card_by_text(self, text, locale="ru"):
+        self.text_calls.append(text)
+        return {"cards": []}
+
+class MemoryCacheRepo:
+    class Row:
+        def __init__(self, title, color):
+            self.title = title
+            self.color = color
+
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, nm_id):
+        v = self.store.get(nm_id)
+        return self.Row(*v) if v else None
+
+    async def set(self, nm_id, title, color):
+        self.store[nm_id] = (title, color)
+
+    async def set_many(self, rows):
+        for nm_id, title, color in rows:
+            self.store[nm_id] = (title, color)
+
+class MemoryStateRepo:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, cursor):
+        self.store[key] = cursor
+
+class FakeMP:
+    async def get_new_orders(self):
+        return {
+            "orders": [
+                {"id": 1, "nmId": 111, "quantity": 2, "offerName": "Samsung A25"},
+                {"id": 2, "nmId": 222, "quantity": 1, "offerName": "Redmi 12"},
+                {"id": 3, "nmId": 444, "quantity": 1, "offerName": "Samsung A05 Black"},
+            ]
+        }
+    async def create_supply(self, name):
+        return {"id": "S1"}
+    async def add_orders_to_supply(self, supply_id, order_ids):
+        return {}
+
+class FakeRepo:
+    async def already_ran(self, day_key): return False
+    async def mark_ok(self, *args, **kwargs): pass
+
+class FakeNotifier:
+    def __init__(self): self.msgs = []
+    async def notify_admins(self, text): self.msgs.append(text)
+
+async def test_catalog_sync_fills_cache_from_all_pages():
+    content = PagedContentClient()
+    repo = MemoryCacheRepo()
+
+    res = await SyncProductCatalogUseCase(content, repo).run()
+
+    assert res.pages == 2
+    assert res.saved == 3
+    assert repo.store[222] == ("Redmi 12", "blue")
+
+async def test_catalog_sync_delta_starts_from_stored_cursor():
+    content = PagedContentClient()
+    repo = MemoryCacheRepo()
+    state = MemoryStateRepo()
+    sync = SyncProductCatalogUseCase(content, repo, sync_state_repo=state)
+
+    await sync.run()
+    assert state.store["catalog"]["nmID"] == 333
+
+    content.cards.append(_card(444, "Samsung Galaxy A05", "black"))
+    content.pages_requested = 0
+    res = await sync.run()
+
+    assert content.pages_requested == 1
+    assert res.saved == 1
+    assert repo.store[444] == ("Samsung Galaxy A05", "black")
+    assert state.store["catalog"]["nmID"] == 444
+
+async def test_catalog_sync_seeds_vendor_code_index_with_full_pass():
+    content = PagedContentClient()
+    for i, card in enumerate(content.cards):
+        card["vendorCode"] = f"A25 ({i})" if i else "A25"
+    state = MemoryStateRepo()
+    state.store["catalog"] = {"updatedAt": "t0", "nmID": 333}  # курсор остался от синка без индекса
+    index = VendorCodeIndex()
+
+    class MemoryIndex:
+        async def is_empty(self):
+            return len(index) == 0
+
+        async def observe_many(self, codes):
+            return sum(1 for code in codes if index.observe(code))
+
+    sync = SyncProductCatalogUseCase(content, MemoryCacheRepo(), sync_state_repo=state, vendor_code_index=MemoryIndex())
+    res = await sync.run()
+
+    assert res.pages == 2  # пустой индекс — полный проход, несмотря на курсор
+    assert index.max_suffix("A25") == 2
+    assert index.reserve("A25") == ("A25", "A25 (3)")
+
+async def test_daily_supply_uses_catalog_without_per_nm_lookups():
+    content = PagedContentClient()
+    repo = MemoryCacheRepo()
+    sync = SyncProductCatalogUseCase(content, repo)
+
+    uc = CreateDailySupplyUseCase(
+        marketplace_client=FakeMP(),
+        content_client=content,
+        daily_repo=FakeRepo(),
+        notifier=FakeNotifier(),
+        tz="Europe/Moscow",
+        enabled=True,
+        product_cache_repo=repo,
+        local_catalog=True,
+    )
+
+    await sync.run()   # джоба синка каталога
+    pages = content.pages_requested
+    res = await uc.run()
+
+    # поставка читает только локальный каталог: ни поиска по nmId, ни синка
+    assert content.text_calls == []
+    assert content.pages_requested == pages
+    text = "\n".join(res.lines)
+    assert "A25 black — 2" in text
+    assert "12 blue — 1" in text
+    # 444 нет в каталоге — имя из заказа, заглушка в кэш не пишется
+    assert "A05 black — 1" in text
+    assert 444 not in repo.store
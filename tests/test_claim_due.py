@@ -0,0 +1,77 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from app.application.usecases import ProcessClaimsUseCase
+from app.domain.rules import AutoRejectRule, parse_wb_dt
+from app.infrastructure.db.repo_claim_due import ClaimDueRepo
+from tests.test_process_claims import FakeWb, FakeClaimsRepo, _claim
+
+pytestmark = pytest.mark.asyncio
+
+def _usecase(wb, repo, due_repo, scheduled):
+    return ProcessClaimsUseCase(
+        wb=wb,
+        repo=repo,
+        rule=AutoRejectRule(delay_days=3),
+        default_comment="comment",
+        enabled=True,
+        due_repo=due_repo,
+        on_next_due=scheduled.append,
+    )
+
+async def test_poll_enqueues_unripe_claims_and_schedules_nearest(sf):
+    young, younger = _claim(1, days_old=1), _claim(2, days_old=2)
+    wb = FakeWb([[young, _claim(3), younger]])
+    due_repo = ClaimDueRepo(sf, instance_name="acc1")
+    scheduled = []
+
+    res = await _usecase(wb, FakeClaimsRepo(), due_repo, scheduled).run()
+
+    assert res.processed == 1
+    assert [a[0] for a in wb.answered] == ["c3"]
+    # будильник — на созревание c2 (она старше), а не через интервал опроса
+    expected = AutoRejectRule(3).due_at(parse_wb_dt(younger["dt"]))
+    assert scheduled == [expected]
+    assert await ClaimDueRepo(sf, instance_name="acc2").next_due_at() is None
+
+async def test_run_due_answers_ripe_claims_without_listing(sf):
+    due_repo = ClaimDueRepo(sf, instance_name="acc1")
+    now = datetime.now(timezone.utc)
+    ripe, unripe = _claim(1, days_old=4), _claim(2, days_old=1)
+    await due_repo.add_many([
+        {**ripe, "due_at": now - timedelta(minutes=1)},
+        {**unripe, "due_at": now + timedelta(days=2)},
+    ])
+    wb = FakeWb([])   # листинг не нужен
+    scheduled = []
+
+    res = await _usecase(wb, FakeClaimsRepo(), due_repo, scheduled).run_due()
+
+    assert (res.checked, res.processed) == (1, 1)
+    assert wb.answered == [("c1", "rejectcustom", "comment")]
+    assert [c["id"] for c in await due_repo.due(now + timedelta(days=3))] == ["c2"]
+    assert len(scheduled) == 1 and scheduled[0] > now
+
+async def test_poll_drops_claims_closed_in_listing(sf):
+    due_repo = ClaimDueRepo(sf, instance_name="acc1")
+    await due_repo.add_many([{**_claim(9, days_old=1), "due_at": datetime.now(timezone.utc) + timedelta(days=2)}])
+
+    uc = _usecase(FakeWb([[_claim(1, days_old=1)]]), FakeClaimsRepo(), due_repo, [])
+    far = datetime.now(timezone.utc) + timedelta(days=5)
+
+    # одного снимка без c9 мало — она могла просто сдвинуться за страницу
+    await uc.run()
+    assert sorted(c["id"] for c in await due_repo.due(far)) == ["c1", "c9"]
+    await uc.run()
+    assert [c["id"] for c in await due_repo.due(far)] == ["c1"]
+
+async def test_poll_keeps_queue_when_listing_shifted_while_paging(sf):
+    due_repo = ClaimDueRepo(sf, instance_name="acc1")
+    await due_repo.add_many([{**_claim(9, days_old=1), "due_at": datetime.now(timezone.utc) + timedelta(days=2)}])
+
+    # c1 на обеих страницах — листинг сдвинулся, c9 могла просто не попасть в снимок
+    shifted = FakeWb([[_claim(1, days_old=1)], [_claim(1, days_old=1)]])
+    await _usecase(shifted, FakeClaimsRepo(), due_repo, []).run()
+
+    far = datetime.now(timezone.utc) + timedelta(days=5)
+    assert sorted(c["id"] for c in await due_repo.due(far)) == ["c1", "c9"]
@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import event
+
+from app.infrastructure.db.models import ClaimProcessing
+from app.infrastructure.db import repo as repo_module
+from app.infrastructure.db.repo import ClaimsRepo
+
+pytestmark = pytest.mark.asyncio
+
+async def test_processed_ids_returns_only_done_claims_of_instance(sf):
+    now = datetime.now(timezone.utc)
+    repo = ClaimsRepo(sf, instance_name="acc1")
+    other = ClaimsRepo(sf, instance_name="acc2")
+
+    await repo.mark_done("c1", "rejectcustom", now)
+    await repo.mark_failed("c2", "boom", now)
+    await other.mark_done("c3", "rejectcustom", now)
+
+    assert await repo.processed_ids(["c1", "c2", "c3", "c4"]) == {"c1"}
+    assert await repo.processed_ids([]) == set()
+
+async def test_unit_of_work_flushes_batch_in_one_transaction(sf):
+    now = datetime.now(timezone.utc)
+    repo = ClaimsRepo(sf, instance_name="acc1", flush_max_pending=3, flush_interval_sec=0)
+    await repo.mark_done("c0", "rejectcustom", now)
+
+    commits = []
+    async with repo.unit_of_work() as uow:
+        engine = sf.kw["bind"]
+        event.listen(engine.sync_engine, "commit", lambda conn: commits.append(1))
+        await uow.mark_done("c1", "rejectcustom", now)
+        await uow.mark_failed("c2", "boom", now)
+        # до flush в БД ничего нет
+        assert await repo.processed_ids(["c1"]) == set()
+        await uow.mark_failed("c0", "retry", now)   # третья запись → сброс пачкой
+        assert len(commits) == 1
+        await uow.mark_done("c2", "reject", now)
+    assert len(commits) == 2
+
+    assert await repo.processed_ids(["c0", "c1", "c2"]) == {"c1", "c2"}
+    async with sf() as s:
+        row = await s.get(ClaimProcessing, ("c0", "acc1"))
+        # у failed action сохраняется прежний
+        assert (row.processed, row.action, row.error) == (False, "rejectcustom", "retry")
+
+async def test_unit_of_work_exit_keeps_batch_of_interrupted_timer_flush(sf, monkeypatch):
+    now = datetime.now(timezone.utc)
+    original = repo_module._upsert_statuses
+
+    async def slow_upsert(s, done, failed):
+        await asyncio.sleep(0.05)
+        await original(s, done, failed)
+
+    monkeypatch.setattr(repo_module, "_upsert_statuses", slow_upsert)
+    repo = ClaimsRepo(sf, instance_name="acc1", flush_max_pending=100, flush_interval_sec=0.01)
+    async with repo.unit_of_work() as uow:
+        await uow.mark_done("c1", "rejectcustom", now)
+        await asyncio.sleep(0.02)  # таймерный сброс уже пишет, когда выходим из контекста
+
+    assert await repo.processed_ids(["c1"]) == {"c1"}
+
+async def test_failed_final_flush_is_carried_to_next_unit_of_work(sf, monkeypatch):
+    now = datetime.now(timezone.utc)
+    original = repo_module._upsert_statuses
+
+    async def broken(s, done, failed):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(repo_module, "_upsert_statuses", broken)
+    repo = ClaimsRepo(sf, instance_name="acc1", flush_interval_sec=0)
+    uow = repo.unit_of_work()
+    uow._final_flush_pause_sec = 0
+    async with uow:
+        await uow.mark_done("c1", "rejectcustom", now)
+    assert await repo.processed_ids(["c1"]) == set()
+
+    monkeypatch.setattr(repo_module, "_upsert_statuses", original)
+    async with repo.unit_of_work():
+        pass
+    assert await repo.processed_ids(["c1"]) == {"c1"}
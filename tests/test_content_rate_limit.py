@@ -1,3 +1,4 @@
+import json
 import pytest
 import respx
 import httpx
@@ -43,3 +44,95 @@ async def test_content_client_retries_on_429(monkeypatch):
 
     assert call_count["n"] == 2
     assert data["cards"][0]["title"] == "Redmi 12"
+
+@respx.mock
+async def test_content_client_deduplicates_concurrent_lookups():
+    client = WbContentClient("test")
+    url = "https://content-api.wildberries.ru/content/v2/get/cards/list"
+    calls = {"n": 0}
+
+    def handler(request: httpx.Request):
+        calls["n"] += 1
+        return httpx.Response(200, json={"cards": [{"nmID": 123, "title": "Redmi 12"}]})
+
+    respx.post(url).mock(side_effect=handler)
+
+    import asyncio
+    first, second, other = await asyncio.gather(
+        client.find_card_by_text("123"),
+        client.find_card_by_text("123"),
+        client.find_card_by_text("456"),
+    )
+    again = await client.find_card_by_text("123")
+    await client.close()
+
+    # два параллельных поиска "123" склеились, "456" и повторный запрос после — отдельные
+    assert calls["n"] == 3
+    assert first is second
+    assert again["cards"][0]["title"] == "Redmi 12"
+
+@respx.mock
+async def test_content_client_creates_card_and_finds_its_nm_id(monkeypatch):
+    client = WbContentClient("test")
+    uploads = []
+
+    def upload(request: httpx.Request):
+        uploads.append(json.loads(request.content))
+        return httpx.Response(200, json={"data": None, "error": False, "errorText": ""})
+
+    def search(request: httpx.Request):
+        text = json.loads(request.content)["settings"]["filter"]["textSearch"]
+        cards = [{"nmID": 555, "vendorCode": "Redmi 12 (2)"}] if text == "Redmi 12 (2)" else []
+        return httpx.Response(200, json={"cards": cards})
+
+    respx.post("https://content-api.wildberries.ru/content/v2/cards/upload").mock(side_effect=upload)
+    respx.post("https://content-api.wildberries.ru/content/v2/get/cards/list").mock(side_effect=search)
+
+    import asyncio
+    async def fast_sleep(_):
+        return None
+    monkeypatch.setattr(asyncio, "sleep", fast_sleep)
+
+    nm_id = await client.create_card({
+        "subjectID": 7,
+        "vendorCode": "Redmi 12 (2)",
+        "title": "Redmi 12",
+        "characteristics": [{"id": 14177449, "name": "Цвет", "value": ["белый"]}, {"name": "без id"}],
+    })
+    await client.close()
+
+    assert nm_id == 555
+    variant = uploads[0][0]["variants"][0]
+    assert uploads[0][0]["subjectID"] == 7
+    assert variant["characteristics"] == [{"id": 14177449, "value": ["белый"]}]
+
+@respx.mock
+@pytest.mark.parametrize("accepted", [True, False])
+async def test_create_card_checks_vendor_code_before_reupload(monkeypatch, accepted):
+    client = WbContentClient("test")
+    uploads = []
+
+    def upload(request: httpx.Request):
+        uploads.append(json.loads(request.content))
+        if len(uploads) == 1:
+            return httpx.Response(502)   # WB мог принять карточку, но ответ потерялся
+        return httpx.Response(200, json={"data": None, "error": False, "errorText": ""})
+
+    def search(request: httpx.Request):
+        exists = accepted or len(uploads) > 1
+        return httpx.Response(200, json={"cards": [{"nmID": 555, "vendorCode": "Redmi 12 (2)"}] if exists else []})
+
+    respx.post("https://content-api.wildberries.ru/content/v2/cards/upload").mock(side_effect=upload)
+    respx.post("https://content-api.wildberries.ru/content/v2/get/cards/list").mock(side_effect=search)
+
+    import asyncio
+    async def fast_sleep(_):
+        return None
+    monkeypatch.setattr(asyncio, "sleep", fast_sleep)
+
+    nm_id = await client.create_card({"subjectID": 7, "vendorCode": "Redmi 12 (2)", "title": "Redmi 12"})
+    await client.close()
+
+    assert nm_id == 555
+    # принятая карточка повторно не загружается; не принятая — загружается ещё раз
+    assert len(uploads) == (1 if accepted else 2)
@@ -97,9 +97,6 @@ async def test_create_supply_and_call_content_for_each_nmId():
         notifier=notifier,
         tz="Europe/Moscow",
         enabled=True,
-        batch_size=2,         # process both without pause
-        batch_pause_sec=0,
-        cards_limit=100,
     )
 
     res = await uc.run()
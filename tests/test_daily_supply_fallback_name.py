@@ -47,8 +47,6 @@ async def test_fallback_to_offerName():
         tz="Europe/Moscow",
         enabled=True,
         product_cache_repo=cache_repo,
-        batch_size=2,
-        batch_pause_sec=0,
     )
 
     res = await uc.run()
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from sqlalchemy import text
+
+from app.infrastructure.db.session import (
+    make_session_factory, init_db, acquire_single_instance_lock, release_single_instance_lock,
+)
+from tests.conftest import POSTGRES_URL
+
+pytestmark = pytest.mark.asyncio
+
+async def test_sqlite_connections_get_tuned_pragmas(tmp_path):
+    sf, engine = make_session_factory(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", sqlite_busy_timeout_ms=1234)
+    await init_db(engine)
+    try:
+        async with sf() as s:
+            assert (await s.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await s.execute(text("PRAGMA synchronous"))).scalar() == 1   # NORMAL
+            assert (await s.execute(text("PRAGMA busy_timeout"))).scalar() == 1234
+            assert (await s.execute(text("PRAGMA auto_vacuum"))).scalar() == 2  # INCREMENTAL у новой базы
+    finally:
+        await engine.dispose()
+
+async def test_wal_reader_is_not_blocked_by_open_write(tmp_path):
+    sf, engine = make_session_factory(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    await init_db(engine)
+    try:
+        async with sf() as writer:
+            await writer.execute(text(
+                "INSERT INTO sync_state (instance_name, key, cursor) VALUES ('a', 'k', NULL)"
+            ))
+            # транзакция писателя открыта — читатель видит снимок и не ждёт
+            async with sf() as reader:
+                res = await asyncio.wait_for(reader.execute(text("SELECT count(*) FROM sync_state")), timeout=1)
+                assert res.scalar() == 0
+            await writer.commit()
+    finally:
+        await engine.dispose()
+
+async def test_in_memory_sqlite_still_works():
+    sf, engine = make_session_factory("sqlite+aiosqlite:///:memory:")
+    await init_db(engine)
+    async with sf() as s:
+        assert (await s.execute(text("SELECT 1"))).scalar() == 1
+    await engine.dispose()
+
+async def test_second_bot_process_cannot_take_the_database(db):
+    sf, engine = db
+    first = await acquire_single_instance_lock(engine)
+    if engine.dialect.name != "postgresql":
+        assert first is None  # SQLite — файл на одном хосте, lock не нужен
+        return
+    other = make_session_factory(POSTGRES_URL)[1]
+    try:
+        with pytest.raises(RuntimeError):
+            await acquire_single_instance_lock(other)
+        await release_single_instance_lock(first)
+        again = await acquire_single_instance_lock(other)
+        await release_single_instance_lock(again)
+    finally:
+        await other.dispose()
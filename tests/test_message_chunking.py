@@ -0,0 +1,56 @@
+import pytest
+
+from app.presentation.telegram.chunking import lines_to_csv, prepare_long_message, split_message
+from app.presentation.telegram.notifier import TelegramNotifier
+
+pytestmark = pytest.mark.asyncio
+
+def _report(n_skus: int) -> str:
+    lines = [f"Samsung A{i:04d} Black — {i % 7 + 1}" for i in range(n_skus)]
+    return "WB Supply 2026-10-18\nСоздана поставка: WB-GI-1\n\n" + "\n".join(lines)
+
+async def test_split_keeps_every_line_in_order():
+    text = _report(300)
+
+    parts = split_message(text)
+
+    assert len(parts) > 1
+    assert all(len(p) <= 4000 for p in parts)
+    assert "\n".join(parts) == text
+
+async def test_big_report_goes_out_as_single_document():
+    text = _report(2000)
+
+    msg = prepare_long_message(text, filename="supply.txt")
+
+    assert msg.parts == []
+    assert msg.document.filename == "supply.txt"
+    assert msg.document.data.decode() == text
+    assert msg.caption.startswith("WB Supply 2026-10-18\nСоздана поставка: WB-GI-1")
+
+async def test_lines_to_csv_splits_name_and_qty():
+    csv_text = lines_to_csv(["5 шт", "Redmi 12 — Blue — 3", ""])
+
+    assert csv_text.splitlines() == ["name;qty", "5 шт", "Redmi 12 — Blue;3"]
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(("message", chat_id, len(text)))
+
+    async def send_document(self, chat_id, document, caption=None, **kwargs):
+        self.calls.append(("document", chat_id, document.filename))
+
+async def test_notifier_sends_parts_or_document():
+    bot = FakeBot()
+    notifier = TelegramNotifier(bot, admin_ids=[1], max_chunks=3)
+
+    await notifier.notify_admins(_report(200))
+    kinds = [c[0] for c in bot.calls]
+    assert kinds == ["message"] * len(kinds) and 1 < len(kinds) <= 3
+
+    bot.calls.clear()
+    await notifier.notify_admins(_report(2000))
+    assert bot.calls == [("document", 1, "report.txt")]
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import inspect, text
+
+from app.infrastructure.db.migrations import MIGRATIONS
+from app.infrastructure.db.session import make_session_factory, init_db
+from app.infrastructure.db.repo import ClaimsRepo
+from app.infrastructure.db.repo_daily_supply import DailySupplyRepo
+from app.infrastructure.db.repo_feedback_clone import FeedbackCloneRepo
+
+pytestmark = pytest.mark.asyncio
+
+LEGACY_SCHEMA = [
+    """CREATE TABLE claim_processing (
+        claim_id VARCHAR NOT NULL PRIMARY KEY, instance_name VARCHAR NOT NULL,
+        processed BOOLEAN NOT NULL, action VARCHAR, processed_at DATETIME, error TEXT)""",
+    "CREATE INDEX ix_claim_processing_instance_name ON claim_processing (instance_name)",
+    """CREATE TABLE daily_supply_run (
+        day_key VARCHAR NOT NULL PRIMARY KEY, supply_id VARCHAR, created_at DATETIME,
+        order_count INTEGER NOT NULL, report_text TEXT, error TEXT, instance_name VARCHAR NOT NULL)""",
+    """CREATE TABLE feedback_clone (
+        feedback_id VARCHAR NOT NULL PRIMARY KEY, nm_id INTEGER NOT NULL, created_at DATETIME,
+        status VARCHAR NOT NULL, new_nm_id VARCHAR, error TEXT)""",
+    "INSERT INTO claim_processing VALUES ('c1', 'acc1', 1, 'rejectcustom', '2026-01-01 00:00:00', NULL)",
+    "INSERT INTO daily_supply_run VALUES ('2026-01-01', 'WB-1', '2026-01-01 10:00:00', 5, 'report', NULL, 'acc1')",
+    "INSERT INTO feedback_clone VALUES ('f1', 111, '2026-01-01 00:00:00', 'CLONED', '222', NULL)",
+]
+
+async def test_legacy_database_is_migrated_to_composite_keys(tmp_path):
+    sf, engine = make_session_factory(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+    async with engine.begin() as conn:
+        for sql in LEGACY_SCHEMA:
+            await conn.execute(text(sql))
+
+    await init_db(engine)
+    await init_db(engine)   # повторный старт — без изменений
+
+    async with engine.connect() as conn:
+        pks = await conn.run_sync(lambda c: {
+            t: set(inspect(c).get_pk_constraint(t)["constrained_columns"])
+            for t in ("claim_processing", "daily_supply_run", "feedback_clone")
+        })
+        versions = (await conn.execute(text("SELECT version FROM schema_version ORDER BY version"))).scalars().all()
+    assert pks == {
+        "claim_processing": {"claim_id", "instance_name"},
+        "daily_supply_run": {"day_key", "instance_name"},
+        "feedback_clone": {"feedback_id", "instance_name"},
+    }
+    assert versions == [m[0] for m in MIGRATIONS]
+
+    # данные на месте, и у другого аккаунта те же ключи больше не конфликтуют
+    assert await ClaimsRepo(sf, instance_name="acc1").processed_ids(["c1"]) == {"c1"}
+    await ClaimsRepo(sf, instance_name="acc2").mark_done("c1", "reject", None)
+    assert (await DailySupplyRepo(sf, instance_name="acc1").get_last_report()).report_text == "report"
+    assert await FeedbackCloneRepo(sf).was_processed("f1")
+    assert not await FeedbackCloneRepo(sf, instance_name="acc1").was_processed("f1")
+    await engine.dispose()
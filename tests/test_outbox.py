@@ -0,0 +1,121 @@
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from datetime import datetime, timedelta
+
+from app.application.usecases_daily_supply import CreateDailySupplyUseCase
+from app.application.usecases_outbox import DispatchOutboxUseCase
+from app.infrastructure.db.repo_daily_supply import DailySupplyRepo
+from app.infrastructure.db.repo_outbox import OutboxRepo
+from app.presentation.telegram.notifier import TelegramNotifier
+from app.presentation.telegram.send_queue import TelegramSendQueue
+
+pytestmark = pytest.mark.asyncio
+
+class FlakyNotifier:
+    """Telegram недоступен, пока down=True."""
+    def __init__(self):
+        self.down = True
+        self.delivered = []
+        self.direct = []
+
+    async def notify_admins(self, text):
+        self.direct.append(text)
+
+    async def deliver(self, text, skip=()):
+        if self.down:
+            raise ConnectionError("telegram is down")
+        self.delivered.append(text)
+        return {}
+
+class NoOrdersMP:
+    async def get_new_orders(self):
+        return {"orders": []}
+
+async def test_supply_report_survives_telegram_outage(sf):
+    daily_repo = DailySupplyRepo(sf, instance_name="acc1")
+    outbox_repo = OutboxRepo(sf, instance_name="acc1")
+    notifier = FlakyNotifier()
+    uc = CreateDailySupplyUseCase(
+        marketplace_client=NoOrdersMP(),
+        content_client=None,
+        daily_repo=daily_repo,
+        notifier=notifier,
+        tz="Europe/Moscow",
+        enabled=True,
+        instance_name="acc1",
+        outbox=True,
+    )
+    dispatcher = DispatchOutboxUseCase(outbox_repo, notifier, instance_name="acc1", retry_base_sec=60)
+
+    await uc.run()
+    assert notifier.direct == []   # use case в Telegram не ходит
+
+    res = await dispatcher.run()
+    assert (res.sent, res.failed) == (0, 1)
+    [msg] = await outbox_repo.pending(datetime.utcnow() + timedelta(seconds=61))
+    assert msg.attempts == 1 and "telegram is down" in msg.last_error
+    assert await outbox_repo.pending(datetime.utcnow()) == []   # ждёт backoff
+
+    notifier.down = False
+    await outbox_repo.mark_retry(msg.id, msg.last_error, 0, datetime.utcnow() - timedelta(seconds=1))
+    res = await dispatcher.run()
+
+    assert res.sent == 1
+    assert notifier.delivered == [(await daily_repo.get_last_report()).report_text]
+    assert await outbox_repo.pending(datetime.utcnow() + timedelta(days=1)) == []
+
+async def test_outbox_is_per_instance_and_batched(sf):
+    a, b = OutboxRepo(sf, instance_name="acc1"), OutboxRepo(sf, instance_name="acc2")
+    for i in range(5):
+        await a.add(f"m{i}")
+    await b.add("other")
+    notifier = FlakyNotifier()
+    notifier.down = False
+
+    res = await DispatchOutboxUseCase(a, notifier, batch_size=2).run()
+
+    assert res.sent == 5
+    assert notifier.delivered == [f"m{i}" for i in range(5)]
+    assert len(await b.pending(datetime.utcnow())) == 1
+
+class AdminsBot:
+    """Админ 2 заблокировал бота, у админа 3 Telegram пока недоступен."""
+    def __init__(self):
+        self.sent = []
+        self.down = {3}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == 2:
+            raise TelegramForbiddenError(method=None, message="Forbidden: bot was blocked by the user")
+        if chat_id in self.down:
+            raise ConnectionError("telegram is down")
+        self.sent.append((chat_id, text))
+
+async def test_outbox_retries_only_undelivered_admins(sf):
+    repo = OutboxRepo(sf, instance_name="acc1")
+    await repo.add("report")
+    bot = AdminsBot()
+    notifier = TelegramNotifier(bot, admin_ids=[1, 2, 3], send_queue=TelegramSendQueue(bot))
+    dispatcher = DispatchOutboxUseCase(repo, notifier, instance_name="acc1", retry_base_sec=0)
+
+    res = await dispatcher.run()
+    assert (res.sent, res.failed) == (0, 1)
+    [msg] = await repo.pending(datetime.utcnow() + timedelta(seconds=1))
+    assert msg.done_chats == {1, 2}   # 1 доставлено, 2 заблокирован — повторять не нужно
+
+    bot.down.clear()
+    res = await dispatcher.run()
+    assert res.sent == 1
+    assert bot.sent == [(1, "report"), (3, "report")]   # админ 1 не получил отчёт повторно
+    assert await repo.pending(datetime.utcnow() + timedelta(days=1)) == []
+
+async def test_outbox_blocked_admin_is_not_retried(sf):
+    repo = OutboxRepo(sf, instance_name="acc1")
+    await repo.add("report")
+    bot = AdminsBot()
+    bot.down.clear()
+    notifier = TelegramNotifier(bot, admin_ids=[1, 2], send_queue=None)
+
+    res = await DispatchOutboxUseCase(repo, notifier, instance_name="acc1").run()
+    assert (res.sent, res.failed) == (1, 0)
+    assert bot.sent == [(1, "report")]
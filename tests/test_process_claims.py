@@ -0,0 +1,226 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from app.application.usecases import ProcessClaimsUseCase
+from app.application.digest import NotificationDigest, chunk_lines
+from app.application.ports import TransientWbError
+from app.domain.rules import AutoRejectRule
+from app.infrastructure.wb.mapper import WbReturnsAdapter
+
+pytestmark = pytest.mark.asyncio
+
+def _claim(i: int, days_old: int = 5, actions=("rejectcustom",)):
+    dt = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days_old)
+    return {"id": f"c{i}", "dt": dt.isoformat(), "actions": list(actions)}
+
+class FakeClaimsClient:
+    """Имитирует /api/v1/claims с limit/offset."""
+    def __init__(self, claims):
+        self.claims = claims
+        self.calls = []
+
+    async def get_claims(self, is_archive, limit=200, offset=0):
+        self.calls.append((is_archive, limit, offset))
+        return {"claims": self.claims[offset:offset + limit], "total": len(self.claims)}
+
+    async def answer_claim(self, claim_id, action, comment=None):
+        return {}
+
+class FakeWb:
+    def __init__(self, pages):
+        self.pages = pages
+        self.answered = []
+
+    async def iter_claims(self, is_archive=False):
+        for p in self.pages:
+            yield p
+
+    async def answer_claim(self, claim_id, action, comment):
+        self.answered.append((claim_id, action, comment))
+        return {}
+
+class FakeClaimsRepo:
+    def __init__(self, processed=()):
+        self.processed = set(processed)
+        self.done = []
+        self.failed = []
+        self.lookups = []
+
+    async def was_processed(self, claim_id):
+        return claim_id in self.processed
+
+    async def processed_ids(self, claim_ids):
+        self.lookups.append(list(claim_ids))
+        return {i for i in claim_ids if i in self.processed}
+
+    async def mark_done(self, claim_id, action, processed_at):
+        self.processed.add(claim_id)
+        self.done.append(claim_id)
+
+    async def mark_failed(self, claim_id, error, processed_at):
+        self.failed.append((claim_id, error))
+
+class FakeNotifier:
+    def __init__(self):
+        self.msgs = []
+
+    async def notify_admins(self, text):
+        self.msgs.append(text)
+
+def _usecase(wb, repo, notifier=None, **kwargs):
+    return ProcessClaimsUseCase(
+        wb=wb,
+        repo=repo,
+        rule=AutoRejectRule(delay_days=3),
+        default_comment="comment",
+        enabled=True,
+        notifier=notifier,
+        **kwargs,
+    )
+
+async def test_adapter_pages_through_all_claims():
+    client = FakeClaimsClient([_claim(i) for i in range(450)])
+    adapter = WbReturnsAdapter(client, page_size=200)
+
+    pages = [p async for p in adapter.iter_claims()]
+
+    assert [len(p) for p in pages] == [200, 200, 50]
+    assert [c[2] for c in client.calls] == [0, 200, 400]
+
+async def test_run_processes_claims_from_every_page():
+    wb = FakeWb([[_claim(1), _claim(2, days_old=1)], [_claim(3), _claim(4)]])
+    repo = FakeClaimsRepo(processed={"c4"})
+
+    res = await _usecase(wb, repo).run()
+
+    assert (res.checked, res.processed, res.skipped_already_done, res.errors) == (4, 2, 1, 0)
+    assert [a[0] for a in wb.answered] == ["c1", "c3"]
+    assert wb.answered[0] == ("c1", "rejectcustom", "comment")
+
+class ShrinkingClaimsClient(FakeClaimsClient):
+    """Как WB: отвеченная заявка сразу пропадает из листинга открытых."""
+    async def answer_claim(self, claim_id, action, comment=None):
+        self.claims = [c for c in self.claims if c["id"] != claim_id]
+        return {}
+
+async def test_answered_claims_do_not_shift_later_pages_out_of_view():
+    claims = [_claim(i) for i in range(200)] + [_claim(i, days_old=1) for i in range(200, 300)]
+    client = ShrinkingClaimsClient(claims)
+
+    res = await _usecase(WbReturnsAdapter(client, page_size=100), FakeClaimsRepo()).run()
+
+    assert (res.checked, res.processed) == (300, 200)
+    assert len(client.claims) == 100
+
+async def test_processed_ids_stay_warm_between_runs():
+    wb = FakeWb([[_claim(1), _claim(2)], [_claim(3, days_old=1)]])
+    repo = FakeClaimsRepo(processed={"c2"})
+    uc = _usecase(wb, repo)
+
+    await uc.run()
+    assert repo.lookups == [["c1", "c2"], ["c3"]]
+
+    repo.lookups.clear()
+    res = await uc.run()
+
+    # c1/c2 известны из памяти, в БД спрашиваем только про ещё не обработанную c3
+    assert repo.lookups == [["c3"]]
+    assert res.skipped_already_done == 2
+    assert [a[0] for a in wb.answered] == ["c1"]
+
+class SlowFlakyWb(FakeWb):
+    """Отвечает с задержкой; c1 дважды падает временной ошибкой, c2 — постоянной."""
+    def __init__(self, pages):
+        super().__init__(pages)
+        self.active = 0
+        self.max_active = 0
+        self.flaky_left = 2
+
+    async def answer_claim(self, claim_id, action, comment):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if claim_id == "c1" and self.flaky_left:
+                self.flaky_left -= 1
+                raise TransientWbError("HTTP 503")
+            if claim_id == "c2":
+                raise RuntimeError("HTTP 400")
+            self.answered.append((claim_id, action, comment))
+            return {}
+        finally:
+            self.active -= 1
+
+async def test_worker_pool_bounds_parallelism_and_retries_transient_errors():
+    wb = SlowFlakyWb([[_claim(i) for i in range(1, 11)]])
+    repo = FakeClaimsRepo()
+
+    res = await _usecase(wb, repo, max_parallel=3, retry_base_sec=0).run()
+
+    assert wb.max_active == 3
+    assert (res.checked, res.processed, res.errors) == (10, 9, 1)
+    assert "c1" in repo.done
+    assert repo.failed[0][0] == "c2"
+
+class BlockingNotifier:
+    """Telegram «висит», пока тест не отпустит."""
+    def __init__(self):
+        self.msgs = []
+        self.release = asyncio.Event()
+
+    async def notify_admins(self, text):
+        await self.release.wait()
+        self.msgs.append(text)
+
+async def test_digest_mode_sends_chunked_summary_without_waiting_on_telegram():
+    wb = SlowFlakyWb([[_claim(i) for i in range(1, 301)]])
+    notifier = BlockingNotifier()
+    digest = NotificationDigest(notifier, title="WB Returns", window_sec=0, max_len=1000)
+    uc = _usecase(wb, FakeClaimsRepo(), notifier=notifier, max_parallel=50, retry_base_sec=0, digest=digest)
+
+    res = await asyncio.wait_for(uc.run(), timeout=5)   # джоба не ждёт Telegram
+
+    assert (res.processed, res.errors) == (299, 1)
+    assert notifier.msgs == []
+    notifier.release.set()
+    await digest.drain()
+
+    text = "\n".join(notifier.msgs)
+    assert 1 < len(notifier.msgs) < 20
+    assert all(len(m) <= 1000 and m.startswith("WB Returns") for m in notifier.msgs)
+    assert "✗ c2" in text and "✓ c300" in text and "processed=299" in text
+
+async def test_digest_window_accumulates_events_across_runs():
+    notifier = FakeNotifier()
+    digest = NotificationDigest(notifier, title="WB Returns", window_sec=3600)
+    digest.add("first")
+    assert digest.flush_due()            # первая отправка — сразу
+    digest.add("second")
+    assert not digest.flush_due()        # окно ещё не прошло — копим
+    digest.add("third")
+    assert digest.flush_due(force=True)
+    await digest.drain()
+
+    assert notifier.msgs == ["WB Returns\nfirst", "WB Returns\nsecond\nthird"]
+
+async def test_digest_close_sends_events_of_open_window():
+    notifier = FakeNotifier()
+    digest = NotificationDigest(notifier, title="WB Returns", window_sec=3600)
+    digest.add("first")
+    assert digest.flush_due()
+    digest.add("second")
+    assert not digest.flush_due()        # окно открыто — при остановке строка иначе пропала бы
+
+    await digest.close()
+
+    assert notifier.msgs == ["WB Returns\nfirst", "WB Returns\nsecond"]
+    assert digest.pending == 0
+
+async def test_chunk_lines_splits_on_line_boundaries():
+    lines = [f"line {i:03d}" for i in range(100)]   # по 8 символов
+
+    chunks = chunk_lines(lines, max_len=100, header="H")
+
+    assert all(len(c) <= 100 for c in chunks)
+    assert [l for c in chunks for l in c.split("\n")[1:]] == lines
@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+
+from app.infrastructure.cache import ttl_lru
+from app.infrastructure.cache.ttl_lru import TtlLruCache
+from app.infrastructure.db.repo_product_cache import CachedProductCacheRepo
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(ttl_lru.time, "monotonic", c)
+    return c
+
+class Row:
+    def __init__(self, nm_id, title, color=""):
+        self.nm_id = nm_id
+        self.title = title
+        self.color = color
+
+class CountingRepo:
+    def __init__(self):
+        self.store = {}
+        self.reads = 0
+
+    async def get_many(self, nm_ids):
+        self.reads += 1
+        return {nm: Row(nm, *self.store[nm]) for nm in nm_ids if nm in self.store}
+
+    async def set_many(self, rows):
+        for nm_id, title, color in rows:
+            self.store[nm_id] = (title, color)
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = TtlLruCache(max_size=2, ttl_sec=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)
+    cache.set(3, "c")
+
+    assert cache.get(2) is None
+    assert cache.get(1) == ("a", False)
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_marks_stale_then_expires(clock):
+    cache = TtlLruCache(max_size=10, ttl_sec=60, stale_ttl_sec=600)
+    cache.set(1, "a")
+
+    clock.now += 61
+    assert cache.get(1) == ("a", True)
+
+    clock.now += 600
+    assert cache.get(1) is None
+    assert cache.stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_cached_repo_serves_hits_from_memory(clock):
+    repo = CountingRepo()
+    cached = CachedProductCacheRepo(repo, max_size=100, ttl_sec=60)
+    await cached.set_many([(1, "Redmi 12", "blue")])
+
+    rows = await cached.get_many([1])
+    rows_again = await cached.get_many([1])
+
+    assert rows[1].title == "Redmi 12"
+    assert rows_again[1].title == "Redmi 12"
+    assert repo.reads == 0
+    assert cached.stats()["hits"] == 2
+
+@pytest.mark.asyncio
+async def test_cached_repo_refreshes_stale_entries_in_background(clock):
+    repo = CountingRepo()
+    cached = CachedProductCacheRepo(repo, max_size=100, ttl_sec=60, stale_ttl_sec=3600)
+    await cached.set_many([(1, "Redmi 12", "blue")])
+
+    # карточку переименовали, синк каталога записал это прямо в БД
+    repo.store[1] = ("Redmi 12 Pro", "blue")
+    clock.now += 120
+
+    stale = await cached.get(1)
+    assert stale.title == "Redmi 12"  # отдали сразу, не дожидаясь БД
+
+    await asyncio.sleep(0)
+    assert (await cached.get(1)).title == "Redmi 12 Pro"
+    assert repo.reads == 1
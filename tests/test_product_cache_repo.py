@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import event
+
+from app.infrastructure.db.repo_product_cache import ProductCacheRepo
+
+pytestmark = pytest.mark.asyncio
+
+async def test_set_many_and_get_many_roundtrip(db):
+    sf, engine = db
+    repo = ProductCacheRepo(sf, instance_name="acc1")
+    other = ProductCacheRepo(sf, instance_name="acc2")
+
+    await repo.set_many([(1, "Redmi 12", "blue"), (2, "Samsung A25", "black")])
+    await other.set_many([(1, "Чужая карточка", "")])
+    # повторный upsert обновляет, а не падает на PK
+    await repo.set_many([(2, "Samsung Galaxy A25", "black"), (3, "A15", "white")])
+
+    rows = await repo.get_many([1, 2, 3, 4])
+
+    assert set(rows) == {1, 2, 3}
+    assert rows[1].title == "Redmi 12"
+    assert rows[2].title == "Samsung Galaxy A25"
+    assert (await other.get(1)).title == "Чужая карточка"
+
+async def test_get_many_is_single_query(db):
+    sf, engine = db
+    repo = ProductCacheRepo(sf)
+    await repo.set_many([(i, f"t{i}", "") for i in range(1, 301)])
+
+    statements = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    rows = await repo.get_many(list(range(1, 301)))
+
+    assert len(rows) == 300
+    assert len(statements) == 1
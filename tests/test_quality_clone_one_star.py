@@ -1,5 +1,13 @@
+import asyncio
+import time
+import httpx
 import pytest
+import respx
+from datetime import datetime, timezone
 from app.application.usecases_quality_clone import CloneOnOneStarFeedbackUseCase
+from app.infrastructure.db.repo_feedback_clone import FeedbackCloneRepo
+from app.infrastructure.db.repo_vendor_code_index import VendorCodeIndexRepo
+from app.infrastructure.wb.feedbacks_client import WbFeedbacksClient
 
 pytestmark = pytest.mark.asyncio
 
@@ -67,3 +75,212 @@ async def test_clone_created_on_one_star():
     res = await uc.run()
     assert res.triggered == 1
     assert res.cloned == 1
+
+class PagedFeedbacks:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    async def iter_feedbacks(self, *, is_answered=False, date_from=None, take=500):
+        self.calls.append(date_from)
+        for page in self.pages:
+            yield [fb for fb in page if date_from is None or fb["ts"] >= date_from]
+
+class BulkRepo(FakeRepo):
+    def __init__(self):
+        super().__init__()
+        self.bulk_calls = 0
+
+    async def was_processed(self, feedback_id: str) -> bool:
+        raise AssertionError("row-by-row check")
+
+    async def processed_ids(self, feedback_ids):
+        self.bulk_calls += 1
+        return {fid for fid in feedback_ids if fid in self.processed}
+
+class FakeState:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, cursor):
+        self.data[key] = cursor
+
+# час назад: внутри окна initial_lookback_hours=24
+T0 = int(time.time()) - 3600
+
+def _fb(fid, ts, rating=1, nm_id=111):
+    created = datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+    return {"id": fid, "ts": ts, "createdDate": created, "productValuation": rating, "productDetails": {"nmId": nm_id}}
+
+async def test_feedbacks_are_paged_and_watermarked():
+    feedbacks = PagedFeedbacks([
+        [_fb("F1", T0), _fb("F2", T0 + 100, rating=5)],
+        [_fb("F3", T0 + 200)],
+    ])
+    repo, state, writer = BulkRepo(), FakeState(), FakeCardsWriter()
+    uc = CloneOnOneStarFeedbackUseCase(
+        feedbacks=feedbacks, cards_reader=FakeCardsReader(), cards_writer=writer,
+        clone_repo=repo, notifier=FakeNotifier(), enabled=True, sync_state_repo=state, initial_lookback_hours=24,
+    )
+
+    res = await uc.run()
+    assert (res.checked, res.triggered, res.cloned) == (3, 2, 2)
+    assert repo.bulk_calls == 2  # один запрос на страницу
+    assert state.data["feedbacks"]["id"] == "F3"
+
+    # второй запуск начинает с метки и не трогает уже виденный отзыв
+    feedbacks.pages.append([_fb("F4", T0 + 300)])
+    res = await uc.run()
+    assert feedbacks.calls[1] == T0 + 200
+    assert (res.checked, res.cloned) == (1, 1)
+    assert state.data["feedbacks"]["id"] == "F4"
+    assert len(writer.created) == 3
+
+async def test_feedback_clone_repo_processed_ids(sf):
+    repo = FeedbackCloneRepo(sf, instance_name="acc1")
+    now = datetime.now(timezone.utc)
+    await repo.mark_cloned("F1", 111, "999", now)
+    await repo.mark_failed("F2", 111, now, "boom")
+    await FeedbackCloneRepo(sf, instance_name="acc2").mark_cloned("F3", 111, "998", now)
+
+    assert await repo.processed_ids(["F1", "F2", "F3", "F4"]) == {"F1", "F2"}
+    assert await repo.processed_ids([]) == set()
+
+async def test_first_run_does_not_clone_historical_feedbacks():
+    feedbacks = PagedFeedbacks([[_fb("OLD", T0 - 86400 * 30), _fb("F1", T0)]])
+    writer, state = FakeCardsWriter(), FakeState()
+    uc = CloneOnOneStarFeedbackUseCase(
+        feedbacks=feedbacks, cards_reader=FakeCardsReader(), cards_writer=writer,
+        clone_repo=BulkRepo(), notifier=FakeNotifier(), enabled=True, sync_state_repo=state,
+    )
+
+    res = await uc.run()
+
+    # без окна метка ставится на «сейчас»: и месячный, и часовой отзыв уже история
+    assert res.cloned == 0
+    assert feedbacks.calls[0] >= T0 + 3600
+    assert state.data["feedbacks"]["createdDate"]
+
+class SlowCardsClient:
+    """Поиск WB не видит только что созданные карточки; create_card медленный."""
+    def __init__(self, roots):
+        self.roots = roots
+        self.created = []
+        self.active = self.peak = 0
+
+    async def get_card_by_nm_id(self, nm_id: int):
+        return {"vendorCode": self.roots[nm_id], "subjectID": 1, "title": "t", "characteristics": []}
+
+    async def find_vendor_codes_like(self, vendor_code: str):
+        return set()
+
+    async def create_card(self, payload: dict):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        self.created.append(payload["vendorCode"])
+        return None
+
+async def test_parallel_clones_never_reuse_suffix():
+    client = SlowCardsClient({111: "Redmi 12", 222: "Redmi 12 (1)", 333: "Poco X6"})
+    feedbacks = PagedFeedbacks([[
+        _fb("F1", T0, nm_id=111),
+        _fb("F2", T0 + 1, nm_id=222),
+        _fb("F3", T0 + 2, nm_id=333),
+    ]])
+    repo = BulkRepo()
+    uc = CloneOnOneStarFeedbackUseCase(
+        feedbacks=feedbacks, cards_reader=client, cards_writer=client,
+        clone_repo=repo, notifier=FakeNotifier(), enabled=True, max_parallel=4, initial_lookback_hours=24,
+    )
+
+    res = await uc.run()
+    assert res.cloned == 3
+    assert sorted(client.created) == ["Poco X6 (1)", "Redmi 12 (1)", "Redmi 12 (2)"]
+    assert client.peak == 3  # код занят до создания — под lock корня только выбор суффикса
+    assert {new for _, _, new in repo.ok} == {None}
+
+async def test_vendor_code_index_replaces_search(sf):
+    index = VendorCodeIndexRepo(sf, instance_name="acc1")
+    assert await index.is_empty()
+    await index.observe_many(["Redmi 12", "Redmi 12 (1)", "Redmi 12 (4)", "Poco X6"])
+
+    class NoSearch(SlowCardsClient):
+        async def find_vendor_codes_like(self, vendor_code: str):
+            raise AssertionError("search must not be called")
+
+    client = NoSearch({111: "Redmi 12", 222: "Redmi 12 (1)", 333: "Poco X6"})
+    uc = CloneOnOneStarFeedbackUseCase(
+        feedbacks=PagedFeedbacks([[
+            _fb("F1", T0, nm_id=111),
+            _fb("F2", T0 + 1, nm_id=222),
+            _fb("F3", T0 + 2, nm_id=333),
+        ]]),
+        cards_reader=client, cards_writer=client, clone_repo=BulkRepo(), notifier=FakeNotifier(),
+        enabled=True, max_parallel=4, vendor_code_index=index, initial_lookback_hours=24,
+    )
+    await uc.run()
+    assert sorted(client.created) == ["Poco X6 (1)", "Redmi 12 (5)", "Redmi 12 (6)"]
+
+    # занятые суффиксы переживают рестарт; старый код из каталога максимум не уменьшает
+    reloaded = VendorCodeIndexRepo(sf, instance_name="acc1")
+    await reloaded.observe_many(["Redmi 12 (2)"])
+    assert await reloaded.reserve("Redmi 12 (3)") == "Redmi 12 (7)"
+    assert await VendorCodeIndexRepo(sf, instance_name="acc2").reserve("Redmi 12") == "Redmi 12 (1)"
+
+async def test_vendor_code_index_falls_back_to_search_for_unknown_root(sf):
+    index = VendorCodeIndexRepo(sf, instance_name="acc1")  # синк каталога ещё не прошёл
+
+    class SearchOnce(SlowCardsClient):
+        searches = []
+
+        async def find_vendor_codes_like(self, vendor_code: str):
+            self.searches.append(vendor_code)
+            return {"Redmi 12", "Redmi 12 (1)", "Redmi 12 (2)"}
+
+    client = SearchOnce({111: "Redmi 12", 222: "Redmi 12 (1)"})
+    uc = CloneOnOneStarFeedbackUseCase(
+        feedbacks=PagedFeedbacks([[_fb("F1", T0, nm_id=111), _fb("F2", T0 + 1, nm_id=222)]]),
+        cards_reader=client, cards_writer=client, clone_repo=BulkRepo(), notifier=FakeNotifier(),
+        enabled=True, max_parallel=4, vendor_code_index=index, initial_lookback_hours=24,
+    )
+    await uc.run()
+
+    # существующие (1)/(2) не переиспользованы, поиск — один раз на корень
+    assert sorted(client.created) == ["Redmi 12 (3)", "Redmi 12 (4)"]
+    assert len(client.searches) == 1
+
+@respx.mock
+async def test_feedback_answered_between_pages_is_not_skipped():
+    listing = [_fb(f"F{i}", T0 + i) for i in range(5)]
+    requests = []
+
+    def handler(request: httpx.Request):
+        params = request.url.params
+        date_from, skip, take = int(params["dateFrom"]), int(params["skip"]), int(params["take"])
+        requests.append((date_from, skip))
+        page = [fb for fb in listing if fb["ts"] >= date_from][skip:skip + take]
+        if len(requests) == 1:
+            listing.pop(0)  # F0 ответили, пока читалась первая страница: хвост сдвинулся
+        return httpx.Response(200, json={"data": {"feedbacks": page}})
+
+    respx.get("https://feedbacks-api.wildberries.ru/api/v1/feedbacks").mock(side_effect=handler)
+    client = WbFeedbacksClient("test")
+    repo, state = BulkRepo(), FakeState()
+    uc = CloneOnOneStarFeedbackUseCase(
+        feedbacks=client, cards_reader=FakeCardsReader(), cards_writer=FakeCardsWriter(),
+        clone_repo=repo, notifier=FakeNotifier(), enabled=True, sync_state_repo=state,
+        page_size=2, initial_lookback_hours=24,
+    )
+
+    res = await uc.run()
+    await client.close()
+    # со skip=2 после сдвига пропал бы F2, а метка ушла бы дальше него
+    assert sorted(fid for fid, _, _ in repo.ok) == ["F0", "F1", "F2", "F3", "F4"]
+    assert res.checked == 5
+    assert all(skip == 0 for _, skip in requests[1:])
+    assert state.data["feedbacks"]["id"] == "F4"
@@ -0,0 +1,62 @@
+import pytest
+
+from app.infrastructure.wb import rate_limit
+from app.infrastructure.wb.rate_limit import RateLimit, RateLimiterRegistry, TokenBucket
+
+pytestmark = pytest.mark.asyncio
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, sec):
+        self.sleeps.append(round(sec, 3))
+        self.now += sec
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    t = FakeTime()
+    monkeypatch.setattr(rate_limit.time, "monotonic", t.monotonic)
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", t.sleep)
+    return t
+
+async def test_bucket_allows_burst_then_paces(fake_time):
+    bucket = TokenBucket(RateLimit(per_sec=2, burst=3))
+
+    for _ in range(5):
+        await bucket.acquire()
+
+    # 3 из burst без ожидания, дальше — по 0.5с на токен
+    assert fake_time.sleeps == [0.5, 0.5]
+
+async def test_bucket_respects_remaining_and_reset_headers(fake_time):
+    bucket = TokenBucket(RateLimit(per_sec=10, burst=10))
+
+    bucket.observe(200, {"X-Ratelimit-Remaining": "0", "X-Ratelimit-Reset": "7"})
+    await bucket.acquire()
+
+    assert fake_time.sleeps == [7.0]
+
+async def test_bucket_pauses_after_429_retry_header(fake_time):
+    bucket = TokenBucket(RateLimit(per_sec=10, burst=10))
+
+    bucket.observe(429, {"X-Ratelimit-Retry": "3"})
+    await bucket.acquire()
+
+    assert fake_time.sleeps == [3.0]
+
+async def test_registry_shares_bucket_per_token_and_host():
+    reg = RateLimiterRegistry()
+
+    a = reg.get("token-1", "https://content-api.wildberries.ru")
+    b = reg.get("token-1", "https://content-api.wildberries.ru/content/v2/get/cards/list")
+    c = reg.get("token-1", "https://marketplace-api.wildberries.ru")
+    d = reg.get("token-2", "https://content-api.wildberries.ru")
+
+    assert a is b
+    assert a is not c
+    assert a is not d
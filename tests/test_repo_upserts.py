@@ -0,0 +1,90 @@
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import event, inspect
+
+from app.infrastructure.db.models import Order
+from app.infrastructure.db.session import make_session_factory, init_db
+from app.infrastructure.db.repo_orders import OrderRepo
+from app.infrastructure.db.repo_daily_supply import DailySupplyRepo
+from app.infrastructure.db.repo import ClaimsRepo
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture
+def statements(db):
+    sf, engine = db
+    seen = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cur, stmt, *a: seen.append(stmt.split()[0].upper()))
+    return sf, seen
+
+async def test_upsert_order_is_one_statement_and_keeps_known_fields(statements):
+    sf, statements = statements
+    repo = OrderRepo(sf, instance_name="acc1")
+
+    first = await repo.upsert_order({"id": 7, "nmId": 111, "quantity": 2, "offerName": "Samsung A25"})
+    statements.clear()
+    second = await repo.upsert_order({"id": 7, "quantity": 3, "vendorCode": "A25-BLK"})
+
+    assert statements == ["INSERT"]
+    assert second.id == first.id
+    assert (second.nm_id, second.quantity, second.offer_name, second.vendor_code) == (111, 3, "Samsung A25", "A25-BLK")
+    other = await OrderRepo(sf, instance_name="acc2").upsert_order({"id": 7, "nmId": 222})
+    assert other.id != first.id
+
+async def test_repo_writes_do_not_select_first(statements):
+    sf, statements = statements
+    now = datetime.now(timezone.utc)
+    daily = DailySupplyRepo(sf, instance_name="acc1")
+    claims = ClaimsRepo(sf, instance_name="acc1")
+
+    await daily.mark_ok("2026-10-18", supply_id="WB-GI-1", created_at=now, order_count=3, report_text="r")
+    await daily.mark_failed("2026-10-18", created_at=now, error="boom")
+    await claims.mark_done("c1", "rejectcustom", now)
+    await claims.mark_failed("c1", "later", now)
+
+    assert "SELECT" not in statements
+    row = await daily.get_last_report()
+    # неудачный повтор не затирает поставку и отчёт прошлой попытки
+    assert (row.supply_id, row.report_text, row.error) == ("WB-GI-1", "r", "boom")
+    assert not await daily.already_ran("2026-10-18")
+
+async def test_init_db_adds_indexes_to_existing_tables(tmp_path):
+    sf, engine = make_session_factory(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+    async with engine.begin() as conn:
+        # таблица orders из старой версии — без unique-индекса
+        await conn.run_sync(lambda c: Order.__table__.create(c))
+        await conn.exec_driver_sql("DROP INDEX ux_orders_order_instance")
+
+    await init_db(engine)
+
+    async with engine.connect() as conn:
+        names = await conn.run_sync(lambda c: {i["name"] for i in inspect(c).get_indexes("orders")})
+    assert "ux_orders_order_instance" in names
+    await engine.dispose()
+
+async def test_init_db_dedupes_legacy_orders_before_unique_index(tmp_path):
+    sf, engine = make_session_factory(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda c: Order.__table__.create(c))
+        await conn.exec_driver_sql("DROP INDEX ux_orders_order_instance")
+        # заказ 7 сохранён трижды, одна из копий уже в поставке
+        for supply_id in ("NULL", "'WB-1'", "NULL"):
+            await conn.exec_driver_sql(
+                f"INSERT INTO orders (order_id, nm_id, quantity, supply_id, instance_name) "
+                f"VALUES (7, 111, 1, {supply_id}, 'acc1')"
+            )
+
+    await init_db(engine)
+
+    repo = OrderRepo(sf, instance_name="acc1")
+    saved = await repo.upsert_order({"id": 7, "quantity": 2})
+    assert saved.supply_id == "WB-1"
+    assert [o.order_id for o in await repo.get_orders_for_supply("WB-1")] == [7]
+    await engine.dispose()
+
+async def test_upsert_order_keeps_name_on_empty_string(sf):
+    repo = OrderRepo(sf, instance_name="acc1")
+    await repo.upsert_order({"id": 8, "nmId": 111, "offerName": "Samsung A25", "vendorCode": "A25"})
+    saved = await repo.upsert_order({"id": 8, "offerName": "", "vendorCode": ""})
+    assert (saved.offer_name, saved.vendor_code) == ("Samsung A25", "A25")
@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select, text
+
+from app.infrastructure.db.models import DailySupplyRun, Order
+from app.infrastructure.db.repo import ClaimsRepo
+from app.infrastructure.db.repo_daily_supply import DailySupplyRepo
+from app.infrastructure.db.repo_orders import OrderRepo
+from app.infrastructure.db.retention import RetentionJob, RetentionPolicy, convert_sqlite_to_incremental_vacuum
+from app.infrastructure.db.session import make_session_factory, init_db
+
+pytestmark = pytest.mark.asyncio
+
+async def _count(sf, model):
+    async with sf() as s:
+        return (await s.execute(select(func.count()).select_from(model))).scalar()
+
+async def test_retention_deletes_old_history_in_batches(db):
+    sf, engine = db
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=100)
+    claims = ClaimsRepo(sf, instance_name="acc1", flush_interval_sec=0)
+    async with claims.unit_of_work() as uow:
+        for i in range(25):
+            await uow.mark_done(f"old{i}", "rejectcustom", old)
+        await uow.mark_done("fresh", "rejectcustom", now)
+
+    daily = DailySupplyRepo(sf, instance_name="acc1")
+    await daily.mark_ok("2026-01-01", supply_id="WB-1", created_at=now - timedelta(days=40), order_count=1, report_text="old report")
+    await daily.mark_ok("2026-10-18", supply_id="WB-2", created_at=now, order_count=1, report_text="today")
+
+    orders = OrderRepo(sf, instance_name="acc1")
+    await orders.upsert_order({"id": 1, "nmId": 1})
+    await orders.upsert_order({"id": 2, "nmId": 2})
+    await orders.mark_orders_assigned([1], "WB-1")
+    async with sf() as s:
+        await s.execute(Order.__table__.update().values(updated_at=datetime.utcnow() - timedelta(days=90)))
+        await s.commit()
+
+    stats = await RetentionJob(sf, engine, RetentionPolicy(batch_size=10)).run()
+
+    assert stats["claim_processing"] == 25
+    assert await ClaimsRepo(sf, instance_name="acc1").processed_ids(["fresh", "old0"]) == {"fresh"}
+    # назначенный старый заказ удалён, неназначенный нужен поставке
+    assert stats["orders"] == 1
+    assert [o.order_id for o in await orders.get_unassigned_orders()] == [2]
+    # старый отчёт сжат, строка запуска осталась
+    async with sf() as s:
+        rows = {r.day_key: r.report_text for r in (await s.execute(select(DailySupplyRun))).scalars()}
+    assert rows == {"2026-01-01": None, "2026-10-18": "today"}
+
+async def test_sqlite_conversion_to_incremental_vacuum_is_explicit(tmp_path):
+    sf, engine = make_session_factory(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+    async with engine.connect() as conn:
+        # старая база, созданная без auto_vacuum
+        await conn.execute(text("PRAGMA auto_vacuum=NONE"))
+        await conn.execute(text("VACUUM"))
+    await init_db(engine)
+
+    async def mode():
+        async with engine.connect() as conn:
+            return (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+
+    job = RetentionJob(sf, engine, RetentionPolicy())
+    await job.run()
+    assert await mode() == 0  # плановая джоба полный VACUUM не запускает
+
+    assert await convert_sqlite_to_incremental_vacuum(engine)
+    assert not await convert_sqlite_to_incremental_vacuum(engine)
+    await job.run()   # теперь — incremental_vacuum
+    assert await mode() == 2
+    await engine.dispose()
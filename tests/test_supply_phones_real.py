@@ -104,8 +104,6 @@ async def test_daily_supply_builds_phone_list_from_orders():
         notifier=notifier,
         tz="Europe/Moscow",
         enabled=True,
-        batch_size=10,
-        batch_pause_sec=0,
     )
 
     result = await uc.run()
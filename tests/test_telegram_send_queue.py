@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.infrastructure.wb import rate_limit
+from app.presentation.telegram.notifier import TelegramNotifier
+from app.presentation.telegram.send_queue import TelegramSendQueue
+
+pytestmark = pytest.mark.asyncio
+
+class FakeBot:
+    def __init__(self, flood_once_for=None):
+        self.sent = []
+        self.active = 0
+        self.max_active = 0
+        self.release = asyncio.Event()
+        self.release.set()
+        self.flood_once_for = flood_once_for
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self.release.wait()
+        if chat_id == self.flood_once_for:
+            self.flood_once_for = None
+            raise TelegramRetryAfter(method=None, message="Flood control exceeded", retry_after=7)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0)
+        self.active -= 1
+        self.sent.append((chat_id, text))
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(sec):
+        calls.append(round(sec, 2))
+        await real_sleep(0)
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", fake_sleep)
+    return calls
+
+async def test_notifier_returns_immediately_and_fans_out_in_order(sleeps):
+    bot = FakeBot()
+    bot.release.clear()   # Telegram «висит»
+    queue = TelegramSendQueue(bot)
+    notifier = TelegramNotifier(bot, admin_ids=[1, 2, 3], send_queue=queue)
+
+    for i in range(4):
+        await asyncio.wait_for(notifier.notify_admins(f"m{i}"), timeout=0.1)
+    assert bot.sent == [] and queue.pending > 0
+
+    bot.release.set()
+    await queue.join()
+
+    for admin in (1, 2, 3):
+        assert [t for c, t in bot.sent if c == admin] == ["m0", "m1", "m2", "m3"]
+    assert bot.max_active > 1   # чаты шлются параллельно
+    # 4 сообщения в чат при burst=3 — четвёртое ждёт лимит чата
+    assert 1.0 in sleeps
+
+async def test_retry_after_pauses_and_resends(sleeps):
+    bot = FakeBot(flood_once_for=1)
+    queue = TelegramSendQueue(bot)
+
+    fut = queue.send_message(1, "report")
+    assert await fut is True
+
+    assert bot.sent == [(1, "report")]
+    assert any(s >= 7 for s in sleeps)